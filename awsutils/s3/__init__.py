@@ -1,5 +1,26 @@
-from awsutils.s3.s3 import S3
-from awsutils.s3.url import url_validator, url_extract, key_extract
+from importlib import import_module
 
+# Public names and the modules defining them, imported on first access (PEP 562) so that
+# `import awsutils.s3` and `awss3 --help` don't load botocore, asyncio or validators
+_LAZY = {
+    'AsyncS3': 'awsutils.s3.aio',
+    'S3': 'awsutils.s3.s3',
+    'url_validator': 'awsutils.s3.url',
+    'url_extract': 'awsutils.s3.url',
+    'key_extract': 'awsutils.s3.url',
+}
 
-__all__ = ['S3', 'url_validator', 'url_extract', 'key_extract']
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+    value = getattr(import_module(_LAZY[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
+
+
+__all__ = ['AsyncS3', 'S3', 'url_validator', 'url_extract', 'key_extract']
@@ -1,7 +1,7 @@
 import os
 from argparse import ArgumentParser
 
-from awsutils.s3.s3 import S3, bucket_uri
+from awsutils.s3.url import bucket_uri
 
 
 def print_output(event, bucket=None, local_path=None, remote_path=None):
@@ -11,20 +11,45 @@ def print_output(event, bucket=None, local_path=None, remote_path=None):
 
 def upload(bucket=None, local_path=None, remote_path=None):
     """Upload a file or folder to an AWS S3 bucket."""
+    from awsutils.s3.s3 import S3
+
     return S3(str(bucket), quiet=False).upload(local_path=local_path, remote_path=remote_path)
 
 
 def download(bucket=None, local_path=None, remote_path=None, recursive=False):
     """Download a file or folder to an AWS S3 bucket."""
+    from awsutils.s3.s3 import S3
+
     return S3(str(bucket), quiet=False).download(local_path=local_path, remote_path=remote_path, recursive=recursive)
 
 
 def sync(bucket=None, local_path=None, remote_path=None, delete=False, remote_source=False):
     """Sync files or folders to an AWS S3 bucket."""
+    from awsutils.s3.s3 import S3
+
     return S3(str(bucket), quiet=False).sync(local_path=local_path, remote_path=remote_path, delete=delete,
                                              remote_source=remote_source)
 
 
+def du(bucket=None, remote_path='', depth=1, concurrency=None, human_readable=False, detail=False):
+    """Summarize the storage used under an AWS S3 bucket path and its folders."""
+    from awsutils.s3.helpers import human_readable_size
+    from awsutils.s3.s3 import S3
+    from awsutils.s3.usage import size_bucket_labels
+
+    usage = S3(str(bucket), quiet=True).du(remote_path=remote_path, depth=depth, concurrency=concurrency)
+    size = human_readable_size if human_readable else str
+    for prefix in usage:
+        print('{0}\t{1}\t{2}'.format(size(prefix.size), prefix.count, os.path.join(bucket_uri(bucket), prefix.prefix)))
+        if detail:
+            for storage_class, total in sorted(prefix.storage_classes.items()):
+                print('\t{0}: {1}'.format(storage_class, size(total)))
+            for label, count in zip(size_bucket_labels(), prefix.histogram):
+                if count:
+                    print('\t{0}: {1}'.format(label, count))
+    return usage
+
+
 def main():
     # Declare argparse argument descriptions
     usage = 'AWS S3 command-line-interface wrapper.'
@@ -61,6 +86,17 @@ def main():
     parser_sync.add_argument('--remote_source', action='store_true', default=False)
     parser_sync.set_defaults(func=sync)
 
+    # Disk usage
+    parser_du = sub_parser.add_parser('du')
+    parser_du.add_argument('--bucket', help=helpers['bucket'], type=str)
+    parser_du.add_argument('--remote_path', type=str, default='')
+    parser_du.add_argument('--depth', help="Number of folder levels reported below the path.", type=int, default=1)
+    parser_du.add_argument('--concurrency', help="Number of shards listed in parallel.", type=int, default=None)
+    parser_du.add_argument('--human_readable', action='store_true', default=False)
+    parser_du.add_argument('--detail', help="Display bytes per storage class and the object size histogram.",
+                           action='store_true', default=False)
+    parser_du.set_defaults(func=du)
+
     # Parse Arguments
     args = vars(parser.parse_args())
     func = args.pop('func')
@@ -0,0 +1,395 @@
+import asyncio
+import os
+from contextlib import AsyncExitStack
+
+from awsutils.s3.backends.boto import directory_prefix, destination_key, object_uri, walk
+from awsutils.s3.bulk import DELETE_BATCH_SIZE, is_not_found
+from awsutils.s3.copier import COPY_PART_SIZE, MAX_COPY_SIZE, copy_ranges, multipart_copy_args
+from awsutils.s3.helpers import assert_acl, is_recursive_needed, remote_path_root
+from awsutils.s3.listing import PAGE_SIZE, ObjectRecord
+from awsutils.s3.transfer import STREAM_CHUNK_SIZE, DownloadError, RangeWriter, TransferConfig, preallocate
+
+# Default maximum number of requests in flight at once (and size of the connection pool)
+ASYNC_CONCURRENCY = 64
+
+
+class AsyncS3:
+    def __init__(self, bucket, concurrency=ASYNC_CONCURRENCY, accelerate=False, endpoint_url=None, session=None,
+                 transfer_config=None):
+        """
+        asyncio counterpart of the S3 class running on aiobotocore's non-blocking HTTP client.
+
+        Every request is made through one client, and so one shared connection pool,
+        and a semaphore caps the number of requests in flight so that a single event
+        loop can drive thousands of operations without threads.  Requires the `async`
+        extra (pip install awsutils-s3[async]).  Use as an async context manager or
+        await close() once done.
+
+        :param bucket: S3 bucket name
+        :param concurrency: Maximum number of requests in flight at once
+        :param accelerate: Use the bucket's transfer acceleration endpoint
+        :param endpoint_url: Custom S3 endpoint (e.g. an S3 compatible store)
+        :param session: aiobotocore session, defaults to a new session
+        :param transfer_config: TransferConfig (part size, memory cap) used by uploads and downloads
+        """
+        assert concurrency > 0, 'ERROR: concurrency must be at least 1'
+        self.bucket_name = bucket
+        self.concurrency = concurrency
+        self.accelerate = accelerate
+        self.endpoint_url = endpoint_url
+        self.transfer_config = transfer_config or TransferConfig()
+        self._session = session
+        self._client = None
+        self._exit_stack = None
+        self._lock = None
+        self._semaphore = None
+
+    def __repr__(self):
+        return '<AsyncS3 bucket={0} concurrency={1}>'.format(self.bucket_name, self.concurrency)
+
+    async def __aenter__(self):
+        await self.client()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @property
+    def semaphore(self):
+        """Retrieve the semaphore limiting the number of requests in flight (created in the running loop)."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def client(self):
+        """Retrieve the aiobotocore S3 client, creating it (and its connection pool) on first use."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._client is None:
+                try:
+                    from aiobotocore.session import get_session
+                except ImportError:
+                    raise ImportError('AsyncS3 requires aiobotocore, install it with: pip install awsutils-s3[async]')
+                from botocore.config import Config
+
+                config = Config(signature_version='s3v4', max_pool_connections=self.concurrency,
+                                s3={'use_accelerate_endpoint': self.accelerate})
+                session = self._session or get_session()
+                self._exit_stack = AsyncExitStack()
+                self._client = await self._exit_stack.enter_async_context(
+                    session.create_client('s3', config=config, endpoint_url=self.endpoint_url))
+        return self._client
+
+    async def close(self):
+        """Close the client and its connection pool."""
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            self._client, self._exit_stack = None, None
+
+    async def _request(self, operation, **kwargs):
+        """Make a request once a slot is available."""
+        client = await self.client()
+        async with self.semaphore:
+            return await getattr(client, operation)(**kwargs)
+
+    async def _map_files(self, function, arguments):
+        """
+        Run function(*args) for each tuple of arguments with at most `concurrency` files in progress at once.
+
+        Bounds the open file descriptors and buffered bodies of bulk transfers, not only their requests.
+
+        :return: List of results in the order of arguments
+        """
+        files = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(args):
+            async with files:
+                return await function(*args)
+
+        return list(await asyncio.gather(*(bounded(args) for args in arguments)))
+
+    async def iter_list(self, prefix='', recursive=False, delimiter=None, start_after=None):
+        """
+        Lazily list the objects of a S3 bucket path.
+
+        :param prefix: Key prefix (keys are returned in full, not relative to the prefix)
+        :param recursive: List every key under the prefix instead of grouping 'folders' by '/'
+        :param delimiter: Group keys in to common prefixes using a custom delimiter
+        :param start_after: Only list keys that sort after this key
+        :return: Async generator of ObjectRecord
+        """
+        kwargs = {'Bucket': self.bucket_name, 'Prefix': prefix, 'MaxKeys': PAGE_SIZE}
+        delimiter = delimiter or (None if recursive else '/')
+        if delimiter:
+            kwargs['Delimiter'] = delimiter
+        if start_after:
+            kwargs['StartAfter'] = start_after
+        while True:
+            page = await self._request('list_objects_v2', **kwargs)
+            records = [ObjectRecord.from_object(obj) for obj in page.get('Contents', ())]
+            records.extend(ObjectRecord.from_prefix(common) for common in page.get('CommonPrefixes', ()))
+            for record in sorted(records, key=lambda r: r.key):
+                yield record
+            if not page.get('IsTruncated'):
+                return
+            kwargs['ContinuationToken'] = page['NextContinuationToken']
+
+    async def list(self, remote_path='', recursive=False):
+        """
+        List the objects of a S3 bucket path.
+
+        :param remote_path: S3 bucket path
+        :param recursive: Recursively list every object under the path
+        :return: List of names (relative to the path's 'directory' unless recursive)
+        """
+        prefix = remote_path_root(remote_path)
+        start = 0 if recursive else len(prefix) - len(prefix.rsplit('/', 1)[-1])
+        return [record.key[start:] async for record in self.iter_list(prefix, recursive)]
+
+    async def exists(self, remote_path):
+        """
+        Check to see if an S3 key (or prefix) exists.
+
+        :param remote_path: Path to S3 object relative to bucket root
+        :return: Bool
+        """
+        response = await self._request('list_objects_v2', Bucket=self.bucket_name, Prefix=remote_path, Delimiter='/',
+                                       MaxKeys=1)
+        return response.get('KeyCount', 0) > 0
+
+    async def head(self, remote_path):
+        """Retrieve an object's HEAD response, or None if the key does not exist."""
+        from botocore.exceptions import ClientError
+        try:
+            return await self._request('head_object', Bucket=self.bucket_name, Key=remote_path)
+        except ClientError as error:
+            if is_not_found(error):
+                return None
+            raise
+
+    async def _upload_file(self, local_path, key, acl, config, parts):
+        loop = asyncio.get_running_loop()
+        size = os.path.getsize(local_path)
+        if size < config.multipart_threshold:
+            body = await loop.run_in_executor(None, _read, local_path, 0, size)
+            await self._request('put_object', Bucket=self.bucket_name, Key=key, Body=body, ACL=acl)
+            return 'upload: {0} to {1}'.format(local_path, object_uri(self.bucket_name, key))
+
+        part_size = config.part_size_for(size)
+        upload_id = (await self._request('create_multipart_upload', Bucket=self.bucket_name, Key=key,
+                                         ACL=acl))['UploadId']
+
+        async def upload_part(number, offset):
+            async with parts:
+                body = await loop.run_in_executor(None, _read, local_path, offset, min(part_size, size - offset))
+                response = await self._request('upload_part', Bucket=self.bucket_name, Key=key, UploadId=upload_id,
+                                               PartNumber=number, Body=body)
+            return {'PartNumber': number, 'ETag': response['ETag']}
+
+        try:
+            completed = await asyncio.gather(*(upload_part(number, offset) for number, offset in
+                                               enumerate(range(0, size, part_size), 1)))
+            await self._request('complete_multipart_upload', Bucket=self.bucket_name, Key=key, UploadId=upload_id,
+                                MultipartUpload={'Parts': completed})
+        except BaseException:
+            await self._request('abort_multipart_upload', Bucket=self.bucket_name, Key=key, UploadId=upload_id)
+            raise
+        return 'upload: {0} to {1}'.format(local_path, object_uri(self.bucket_name, key))
+
+    async def upload(self, local_path, remote_path=None, acl='private', config=None):
+        """
+        Upload a local file or folder to an S3 bucket.
+
+        :param local_path: Path to file or folder on local disk
+        :param remote_path: S3 key, aka remote path relative to S3 bucket's root
+        :param acl: Access permissions, must be either 'private', 'public-read' or 'public-read-write'
+        :param config: TransferConfig overriding transfer_config for this upload
+        :return: List of output lines
+        """
+        remote_path = os.path.basename(local_path) if not remote_path else remote_path
+        assert_acl(acl)
+        config = config or self.transfer_config
+        if os.path.isdir(local_path):
+            files = [(path, directory_prefix(remote_path) + relative) for path, relative in walk(local_path)]
+        else:
+            files = [(local_path, destination_key(local_path, remote_path))]
+
+        # Parts are read in full before being sent, bound the number held in memory across every file
+        parts = asyncio.Semaphore(config.workers_for(config.part_size))
+        return await self._map_files(self._upload_file, ((path, key, acl, config, parts) for path, key in files))
+
+    async def _download_range(self, key, etag, writer, start, end):
+        loop = asyncio.get_running_loop()
+        kwargs = {'IfMatch': '"{0}"'.format(etag)} if etag else {}
+        response = await self._request('get_object', Bucket=self.bucket_name, Key=key,
+                                       Range='bytes={0}-{1}'.format(start, end), **kwargs)
+        offset = start
+        async with response['Body'] as body:
+            while True:
+                chunk = await body.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                offset += await loop.run_in_executor(None, writer.write, offset, chunk)
+        return offset - start
+
+    async def _download_file(self, key, local_path, config, record=None):
+        if record is None:
+            head = await self._request('head_object', Bucket=self.bucket_name, Key=key)
+            size, etag = head['ContentLength'], head.get('ETag', '').strip('"')
+        else:
+            size, etag = record.size, record.etag
+        directory = os.path.dirname(local_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        temp_path = '{0}.{1}.part'.format(local_path, os.urandom(4).hex())
+        fd = os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            preallocate(fd, size)
+            writer = RangeWriter(fd, size)
+            try:
+                written = sum(await asyncio.gather(*(
+                    self._download_range(key, etag, writer, start, min(start + config.part_size, size) - 1)
+                    for start in range(0, size, config.part_size))))
+            finally:
+                writer.close()
+            if written != size:
+                raise DownloadError('ERROR: {0} downloaded {1} of {2} bytes'.format(key, written, size))
+        except BaseException:
+            os.close(fd)
+            os.remove(temp_path)
+            raise
+        os.close(fd)
+        os.replace(temp_path, local_path)
+        if record is not None:
+            mtime = record.last_modified.timestamp()
+            os.utime(local_path, (mtime, mtime))
+        return 'download: {0} to {1}'.format(object_uri(self.bucket_name, key), local_path)
+
+    async def download(self, remote_path, local_path=None, recursive=False, config=None):
+        """
+        Download a file or folder from an S3 bucket with concurrent ranged requests.
+
+        :param remote_path: S3 key, aka remote path relative to S3 bucket's root
+        :param local_path: Path to file or folder on local disk, defaults to the current directory
+        :param recursive: Recursively download files/folders
+        :param config: TransferConfig (part_size is the size of the ranges) overriding transfer_config
+        :return: List of output lines
+        """
+        local_path = local_path or os.getcwd()
+        config = config or self.transfer_config
+        if recursive:
+            prefix = directory_prefix(remote_path)
+            downloads = [(record.key, os.path.join(local_path, *record.key[len(prefix):].split('/')), config, record)
+                         async for record in self.iter_list(prefix, recursive=True) if not record.key.endswith('/')]
+        else:
+            if os.path.isdir(local_path) or local_path.endswith(os.sep):
+                local_path = os.path.join(local_path, os.path.basename(remote_path))
+            downloads = [(remote_path, local_path, config)]
+        return await self._map_files(self._download_file, downloads)
+
+    async def _copy_object(self, src_key, dst_bucket, dst_key, extra_args, size, threshold, part_size):
+        """Copy an object with CopyObject, or with UploadPartCopy requests (pinned to its ETag) above threshold."""
+        source = {'Bucket': self.bucket_name, 'Key': src_key}
+        head = None
+        if size is None:
+            head = await self._request('head_object', Bucket=self.bucket_name, Key=src_key)
+            size = head['ContentLength']
+        if size <= threshold:
+            await self._request('copy_object', Bucket=dst_bucket, Key=dst_key, CopySource=source, **extra_args)
+            return 'copy: {0} to {1}'.format(object_uri(self.bucket_name, src_key), object_uri(dst_bucket, dst_key))
+
+        head = head or await self._request('head_object', Bucket=self.bucket_name, Key=src_key)
+        upload_id = (await self._request('create_multipart_upload', Bucket=dst_bucket, Key=dst_key,
+                                         **multipart_copy_args(head, extra_args)))['UploadId']
+
+        async def copy_part(number, start, end):
+            response = await self._request('upload_part_copy', Bucket=dst_bucket, Key=dst_key, UploadId=upload_id,
+                                           PartNumber=number, CopySource=source,
+                                           CopySourceRange='bytes={0}-{1}'.format(start, end),
+                                           CopySourceIfMatch=head['ETag'])
+            return {'PartNumber': number, 'ETag': response['CopyPartResult']['ETag']}
+
+        try:
+            completed = await asyncio.gather(*(copy_part(*part) for part in copy_ranges(size, part_size)))
+            await self._request('complete_multipart_upload', Bucket=dst_bucket, Key=dst_key, UploadId=upload_id,
+                                MultipartUpload={'Parts': completed})
+        except BaseException:
+            await self._request('abort_multipart_upload', Bucket=dst_bucket, Key=dst_key, UploadId=upload_id)
+            raise
+        return 'copy: {0} to {1}'.format(object_uri(self.bucket_name, src_key), object_uri(dst_bucket, dst_key))
+
+    async def copy(self, src_path, dst_path, dst_bucket=None, recursive=False, acl='private', threshold=MAX_COPY_SIZE,
+                   part_size=COPY_PART_SIZE):
+        """
+        Copy an S3 file or folder to another server-side.
+
+        Objects larger than threshold are copied with concurrent UploadPartCopy requests.
+
+        :param src_path: Path to source file or folder in S3 bucket
+        :param dst_path: Path to destination file or folder
+        :param dst_bucket: Bucket to copy to, defaults to same bucket
+        :param recursive: Recursively copy all files within the directory
+        :param acl: Access permissions, must be either 'private', 'public-read' or 'public-read-write'
+        :param threshold: Objects larger than this many bytes are copied in parts (at most 5 GB)
+        :param part_size: Size of each part, increased automatically to stay within 10,000 parts
+        :return: List of output lines
+        """
+        assert_acl(acl)
+        dst_bucket = dst_bucket or self.bucket_name
+        if is_recursive_needed(src_path, dst_path, recursive_default=recursive):
+            src_prefix, dst_prefix = directory_prefix(src_path), directory_prefix(dst_path)
+            pairs = [(record.key, dst_prefix + record.key[len(src_prefix):], record.size)
+                     async for record in self.iter_list(src_prefix, recursive=True)]
+        else:
+            pairs = [(src_path, destination_key(src_path, dst_path), None)]
+        return await self._map_files(self._copy_object, ((src_key, dst_bucket, dst_key, {'ACL': acl}, size,
+                                                          threshold, part_size) for src_key, dst_key, size in pairs))
+
+    async def delete(self, remote_path, recursive=False):
+        """
+        Delete an S3 object or every object under a folder (with DeleteObjects batches).
+
+        :param remote_path: Path to S3 object or folder relative to bucket root
+        :param recursive: Recursively delete all objects within the folder
+        :return: List of output lines
+        """
+        if not is_recursive_needed(remote_path, recursive_default=recursive):
+            await self._request('delete_object', Bucket=self.bucket_name, Key=remote_path)
+            return ['delete: {0}'.format(object_uri(self.bucket_name, remote_path))]
+
+        async def delete(keys):
+            response = await self._request('delete_objects', Bucket=self.bucket_name,
+                                           Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True})
+            failed = {error['Key'] for error in response.get('Errors', ())}
+            return (['delete: {0}'.format(object_uri(self.bucket_name, key)) for key in keys if key not in failed] +
+                    ['delete failed: {0}'.format(object_uri(self.bucket_name, key)) for key in sorted(failed)])
+
+        keys = [record.key async for record in self.iter_list(directory_prefix(remote_path), recursive=True)]
+        batches = await asyncio.gather(*(delete(keys[i:i + DELETE_BATCH_SIZE])
+                                         for i in range(0, len(keys), DELETE_BATCH_SIZE)))
+        return [line for batch in batches for line in batch]
+
+    async def pre_sign(self, remote_path, expiration=3600):
+        """
+        Generate a pre-signed URL for an S3 object (signed locally, no request is made).
+
+        :param remote_path: Path to S3 object relative to bucket root
+        :param expiration: Number of seconds until the pre-signed URL expires
+        :return: Pre-signed URL
+        """
+        client = await self.client()
+        return await client.generate_presigned_url('get_object', ExpiresIn=expiration,
+                                                   Params={'Bucket': self.bucket_name, 'Key': remote_path})
+
+    async def pre_sign_many(self, remote_paths, expiration=3600):
+        """Generate pre-signed URLs for many S3 objects, in the same order as remote_paths."""
+        return list(await asyncio.gather(*(self.pre_sign(remote_path, expiration) for remote_path in remote_paths)))
+
+
+def _read(path, offset, size):
+    """Read size bytes of a file from offset (run on the loop's executor)."""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
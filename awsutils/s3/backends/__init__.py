@@ -0,0 +1,24 @@
+from awsutils.s3.backends.base import Backend
+from awsutils.s3.backends.boto import BotocoreBackend
+from awsutils.s3.backends.cli import CLIBackend
+
+BACKENDS = {backend.name: backend for backend in (BotocoreBackend, CLIBackend)}
+DEFAULT_BACKEND = BotocoreBackend.name
+
+
+def load_backend(backend=None):
+    """
+    Resolve a backend name, class or instance in to a Backend instance.
+
+    :param backend: Backend name ('botocore' or 'cli'), Backend subclass or instance, defaults to 'botocore'
+    :return: Backend instance
+    """
+    if backend is None:
+        backend = DEFAULT_BACKEND
+    if isinstance(backend, str):
+        assert backend in BACKENDS, 'ERROR: Invalid backend ({0})'.format(', '.join(sorted(BACKENDS)))
+        backend = BACKENDS[backend]
+    return backend() if isinstance(backend, type) else backend
+
+
+__all__ = ['Backend', 'BotocoreBackend', 'CLIBackend', 'BACKENDS', 'load_backend']
@@ -0,0 +1,229 @@
+from abc import ABC, abstractmethod
+
+from awsutils.s3.bulk import CONCURRENCY, DELETE_CONCURRENCY
+from awsutils.s3.listing import iter_objects, iter_objects_parallel
+from awsutils.s3.reader import BUFFER_SIZE, READ_AHEAD
+
+MAX_POOL_CONNECTIONS = 32
+
+
+class Backend(ABC):
+    """
+    Base class for the engines that carry out the S3 class' operations.
+
+    A backend is bound to exactly one S3 object (see `bind`) and reads the
+    bucket name, acceleration and quiet settings from it.  Subclasses
+    implement every operation of the S3 class using the same signatures
+    (without the bucket, which comes from the bound S3 object), operations a
+    backend can not carry out raise NotImplementedError.
+    """
+    name = None
+
+    def __init__(self, session=None, client=None, max_pool_connections=MAX_POOL_CONNECTIONS):
+        """
+        Base S3 backend.
+
+        :param session: botocore session used to create clients, defaults to a new session
+        :param client: Pre-configured botocore S3 client, used for every request when supplied
+        :param max_pool_connections: Size of the client's HTTP connection pool
+        """
+        self.s3 = None
+        self.max_pool_connections = max_pool_connections
+        self._session = session
+        self._clients = {}
+        if client is not None:
+            self._clients[None] = client
+
+    def bind(self, s3):
+        """Bind the backend to an S3 object and return the backend."""
+        self.s3 = s3
+        if None in self._clients:
+            self._instrument(self._clients[None])
+        return self
+
+    def _instrument(self, client):
+        """Apply the bound S3 object's metrics, retry policy and key index (if enabled) to a client."""
+        metrics = getattr(self.s3, 'metrics', None)
+        if metrics is not None:
+            metrics.instrument_client(client)
+        retry = getattr(self.s3, 'retry', None)
+        if retry is not None:
+            retry.instrument_client(client)
+        index = getattr(self.s3, 'index', None)
+        if index is not None:
+            index.instrument_client(client)
+        return client
+
+    def indexed(self, prefix=''):
+        """Retrieve the bound S3 object's key index if it can answer for a prefix (listed and fresh), or None."""
+        index = getattr(self.s3, 'index', None)
+        return index if index is not None and index.is_fresh(self.s3.bucket_name, prefix) else None
+
+    def _invalidate(self, path, bucket=None):
+        """Mark a path written without an instrumented client (e.g. by the `aws` CLI) as stale in the key index."""
+        index = getattr(self.s3, 'index', None)
+        if index is not None:
+            index.invalidate(bucket or self.s3.bucket_name, path)
+
+    @property
+    def session(self):
+        """Retrieve the botocore session used to create clients."""
+        if self._session is None:
+            import botocore.session
+            self._session = botocore.session.get_session()
+        return self._session
+
+    @property
+    def accelerate(self):
+        """Determine if requests should use the bucket's transfer acceleration endpoint."""
+        return bool(getattr(self.s3, 'accelerate', False))
+
+    @property
+    def client(self):
+        """Retrieve the botocore S3 client (and connection pool) for the bound S3 object."""
+        return self.get_client(self.accelerate)
+
+    def get_client(self, accelerate=False):
+        """
+        Retrieve a botocore S3 client, creating it on first use.
+
+        At most one client is created per endpoint type, so every request made
+        through this backend shares a single connection pool.
+
+        When the bound S3 object has a retry policy botocore's own retries are
+        disabled, the policy decides which requests are retried and when.
+
+        :param accelerate: Use the transfer acceleration endpoint
+        :return: botocore S3 client
+        """
+        if None in self._clients:
+            return self._clients[None]
+        if accelerate not in self._clients:
+            from botocore.config import Config
+            config = Config(signature_version='s3v4',
+                            max_pool_connections=self.max_pool_connections,
+                            s3={'use_accelerate_endpoint': accelerate},
+                            retries={'mode': 'standard', 'total_max_attempts': 1}
+                            if getattr(self.s3, 'retry', None) is not None else None)
+            self._clients[accelerate] = self._instrument(self.session.create_client('s3', config=config))
+        return self._clients[accelerate]
+
+    def iter_list(self, prefix='', delimiter=None, start_after=None, concurrency=None):
+        """
+        Lazily list the bound bucket's objects as ObjectRecords.
+
+        Undelimited listings with a concurrency above 1 are sharded and listed in
+        parallel (see listing.iter_objects_parallel).
+        """
+        if concurrency and concurrency > 1 and not delimiter:
+            return iter_objects_parallel(self.client, self.s3.bucket_name, prefix, concurrency,
+                                         start_after=start_after)
+        return iter_objects(self.client, self.s3.bucket_name, prefix, delimiter, start_after)
+
+    @property
+    @abstractmethod
+    def buckets(self):
+        """List all available S3 buckets."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def list(self, remote_path='', recursive=False, human_readable=False, summarize=False, concurrency=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def build_index(self, prefix='', concurrency=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def refresh_index(self, force=False, concurrency=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def du(self, prefix='', depth=1, concurrency=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def copy(self, src_path, dst_path, dst_bucket=None, recursive=False, include=None, exclude=None, acl='private',
+             quiet=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def move(self, src_path, dst_path, dst_bucket=None, recursive=False, include=None, exclude=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def exists(self, remote_path):
+        raise NotImplementedError
+
+    @abstractmethod
+    def exists_many(self, remote_paths, concurrency=CONCURRENCY, strategy='auto'):
+        raise NotImplementedError
+
+    @abstractmethod
+    def head_many(self, remote_paths, concurrency=CONCURRENCY):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, remote_path, recursive=False, include=None, exclude=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_many(self, remote_paths, concurrency=DELETE_CONCURRENCY, stream=False):
+        raise NotImplementedError
+
+    @abstractmethod
+    def upload(self, local_path, remote_path, acl='private', quiet=None, config=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def upload_stream(self, source, remote_path, acl='private', config=None, size=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def download(self, remote_path, local_path, recursive=False, quiet=None, config=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_range(self, remote_path, start=0, end=None, buffer=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def open(self, remote_path, mode='rb', read_ahead=READ_AHEAD, buffer_size=BUFFER_SIZE, encoding=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_lines(self, remote_path, chunk_size=READ_AHEAD, encoding=None, keepends=False):
+        raise NotImplementedError
+
+    @abstractmethod
+    def sync(self, local_path, remote_path, delete=False, acl='private', quiet=None, remote_source=False,
+             manifest=None, compare='mtime', hash_cache=None, include=None, exclude=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def plan_sync(self, local_path, remote_path, delete=False, remote_source=False, manifest=None, compare='mtime',
+                  hash_cache=None, include=None, exclude=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_bucket(self, region='us-east-1'):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_bucket(self, force=False):
+        raise NotImplementedError
+
+    @abstractmethod
+    def pre_sign(self, remote_path, expiration=3600):
+        raise NotImplementedError
+
+    def pre_sign_many(self, remote_paths, expiration=3600):
+        return [self.pre_sign(remote_path, expiration) for remote_path in remote_paths]
+
+    @abstractmethod
+    def is_acceleration_enabled(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def bucket_region(self):
+        raise NotImplementedError
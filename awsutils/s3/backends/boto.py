@@ -0,0 +1,453 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from awsutils.s3.backends.base import Backend
+from awsutils.s3.bulk import (CONCURRENCY, DELETE_BATCH_SIZE, DELETE_CONCURRENCY, delete_many, exists_many, head_many,
+                              iter_delete)
+from awsutils.s3.copier import iter_copy
+from awsutils.s3.filters import EXCLUDE, INCLUDE, NO_FILTERS, Filters
+from awsutils.s3.helpers import human_readable_size, is_recursive_needed, remote_path_root
+from awsutils.s3.manifest import ManifestEntry, sync_pair
+from awsutils.s3.reader import BUFFER_SIZE, READ_AHEAD, iter_lines, open_object, read_range
+from awsutils.s3.sync import (DELETE, DOWNLOAD, SKIP, UPLOAD, compare_download, compare_manifest_local,
+                              compare_manifest_remote, compare_upload, execute, iter_local_tree, plan)
+from awsutils.s3.transfer import download_file, upload_file, upload_fileobj
+from awsutils.s3.usage import disk_usage
+
+
+def object_uri(bucket, key):
+    """Return the `s3://` URI of an object."""
+    return 's3://{0}/{1}'.format(bucket, key)
+
+
+def directory_prefix(path):
+    """Return a key prefix that refers to the contents of a 'directory'."""
+    return path if not path or path.endswith('/') else '{0}/'.format(path)
+
+
+def destination_key(src_key, dst_path):
+    """Resolve the destination key of a single object copy (a trailing '/' targets a 'directory')."""
+    return dst_path + os.path.basename(src_key) if not dst_path or dst_path.endswith('/') else dst_path
+
+
+class BotocoreBackend(Backend):
+    """
+    Backend that executes each operation in-process with botocore.
+
+    Values returned by the operations mirror those of the CLI backend, transfer
+    operations return the lines the `aws` CLI would have printed.
+    """
+    name = 'botocore'
+
+    def __init__(self, *args, **kwargs):
+        super(BotocoreBackend, self).__init__(*args, **kwargs)
+        self._presigner = None
+
+    @property
+    def bucket(self):
+        return self.s3.bucket_name
+
+    @property
+    def presigner(self):
+        """Retrieve the local presigned URL generator for the current endpoint."""
+        from awsutils.s3.presign import Presigner
+
+        if self._presigner is None or self._presigner.client is not self.client:
+            self._presigner = Presigner(self.client, self.bucket)
+        return self._presigner
+
+    def _quiet(self, quiet):
+        return quiet if quiet else self.s3.quiet
+
+    def _iter_tree(self, prefix, filters=NO_FILTERS):
+        """
+        Iterate over (relative key, ObjectRecord) tuples for every object under a 'directory' prefix.
+
+        Only the prefixes that can hold included keys are listed, in key order.
+        """
+        prefix = directory_prefix(prefix)
+        for sub_prefix in filters.prefixes():
+            for record in self.iter_list(prefix + sub_prefix):
+                relative = record.key[len(prefix):]
+                if filters(relative):
+                    yield relative, record
+
+    def _wait(self, transfers, quiet):
+        """Wait for (future, output line) pairs to complete and return the output lines."""
+        output = []
+        for future, line in transfers:
+            future.result()
+            output.append(line)
+        return [] if quiet else output
+
+    @property
+    def buckets(self):
+        return [bucket['Name'] for bucket in self.client.list_buckets().get('Buckets', ())]
+
+    def list(self, remote_path='', recursive=False, human_readable=False, summarize=False, concurrency=None):
+        prefix = remote_path_root(remote_path)
+
+        # Like the CLI, non-recursive listings return names relative to the prefix's 'directory'
+        start = 0 if recursive else len(prefix) - len(prefix.rsplit('/', 1)[-1])
+
+        index = self.indexed(prefix)
+        if index is not None:
+            records = index.iter_list(self.bucket, prefix, None if recursive else '/')
+        else:
+            records = self.iter_list(prefix, None if recursive else '/', concurrency=concurrency)
+        names, count, size = [], 0, 0
+        for record in records:
+            names.append(record.key[start:])
+            if not record.is_prefix:
+                count += 1
+                size += record.size
+
+        if summarize:
+            names.extend(['', str(count), human_readable_size(size).rsplit(' ', 1)[-1] if human_readable
+                          else str(size)])
+        return names
+
+    def build_index(self, prefix='', concurrency=None):
+        return self.s3.index.build(self.client, self.bucket, prefix, concurrency)
+
+    def refresh_index(self, force=False, concurrency=None):
+        return self.s3.index.refresh(self.client, self.bucket, force, concurrency)
+
+    def du(self, prefix='', depth=1, concurrency=None):
+        return disk_usage(self.client, self.bucket, prefix, depth, concurrency)
+
+    def _copy_pairs(self, src_path, dst_path, recursive, filters):
+        """Resolve the (source key, destination key, size) of a copy or move, size is None when not listed."""
+        if is_recursive_needed(src_path, dst_path, recursive_default=recursive):
+            dst_prefix = directory_prefix(dst_path)
+            for relative, record in self._iter_tree(src_path, filters):
+                yield record.key, dst_prefix + relative, record.size
+        elif filters(os.path.basename(src_path)):
+            yield src_path, destination_key(src_path, dst_path), None
+
+    def copy(self, src_path, dst_path, dst_bucket=None, recursive=False, include=None, exclude=None, acl='private',
+             quiet=None):
+        dst_bucket = dst_bucket or self.bucket
+        output, errors = [], []
+        filters = Filters.from_args((INCLUDE, include), (EXCLUDE, exclude))
+        for result in iter_copy(self.client, self.bucket, self._copy_pairs(src_path, dst_path, recursive, filters),
+                                dst_bucket, {'ACL': acl}):
+            if result.error is None:
+                output.append('copy: {0} to {1}'.format(object_uri(self.bucket, result.src_key),
+                                                        object_uri(dst_bucket, result.dst_key)))
+            else:
+                errors.append(result.error)
+        if errors:
+            raise errors[0]
+        return [] if self._quiet(quiet) else output
+
+    def move(self, src_path, dst_path, dst_bucket=None, recursive=False, include=None, exclude=None):
+        dst_bucket = dst_bucket or self.bucket
+        output, errors, destinations = [], [], {}
+        filters = Filters.from_args((INCLUDE, include), (EXCLUDE, exclude))
+
+        def copied():
+            # Only sources whose copy is confirmed are handed to the (batched) deletes
+            for result in iter_copy(self.client, self.bucket, self._copy_pairs(src_path, dst_path, recursive, filters),
+                                    dst_bucket, {'ACL': 'private'}):
+                if result.error is None:
+                    destinations[result.src_key] = result.dst_key
+                    yield result.src_key
+                else:
+                    errors.append(result.error)
+
+        for batch in iter_delete(self.client, self.bucket, copied()):
+            for key in batch.deleted:
+                output.append('move: {0} to {1}'.format(object_uri(self.bucket, key),
+                                                        object_uri(dst_bucket, destinations.pop(key))))
+            for error in batch.errors:
+                output.append('move failed: {0} to {1} (source not deleted: {2})'.format(
+                    object_uri(self.bucket, error.key), object_uri(dst_bucket, destinations.pop(error.key)),
+                    error.message))
+        if errors:
+            raise errors[0]
+        return output
+
+    def exists(self, remote_path):
+        response = self.client.list_objects_v2(Bucket=self.bucket, Prefix=remote_path, Delimiter='/', MaxKeys=1)
+        return response.get('KeyCount', 0) > 0
+
+    def exists_many(self, remote_paths, concurrency=CONCURRENCY, strategy='auto'):
+        return exists_many(self.client, self.bucket, remote_paths, concurrency, strategy)
+
+    def head_many(self, remote_paths, concurrency=CONCURRENCY):
+        return head_many(self.client, self.bucket, remote_paths, concurrency)
+
+    def _delete_keys(self, keys, deleted=None):
+        """
+        Delete keys with concurrent DeleteObjects requests of up to 1000 keys and return the output lines.
+
+        :param keys: Iterable of keys
+        :param deleted: List the keys that were deleted are appended to
+        """
+        output = []
+        for batch in iter_delete(self.client, self.bucket, keys):
+            if deleted is not None:
+                deleted.extend(batch.deleted)
+            output.extend('delete: {0}'.format(object_uri(self.bucket, key)) for key in batch.deleted)
+            output.extend('delete failed: {0} {1}'.format(object_uri(self.bucket, error.key), error.message)
+                          for error in batch.errors)
+        return output
+
+    def delete(self, remote_path, recursive=False, include=None, exclude=None):
+        filters = Filters.from_args((EXCLUDE, exclude), (INCLUDE, include))
+        if is_recursive_needed(remote_path, recursive_default=recursive):
+            return self._delete_keys(record.key for _, record in self._iter_tree(remote_path, filters))
+        elif filters(os.path.basename(remote_path)):
+            self.client.delete_object(Bucket=self.bucket, Key=remote_path)
+            return ['delete: {0}'.format(object_uri(self.bucket, remote_path))]
+        return []
+
+    def delete_many(self, remote_paths, concurrency=DELETE_CONCURRENCY, stream=False):
+        if stream:
+            return iter_delete(self.client, self.bucket, remote_paths, concurrency)
+        return delete_many(self.client, self.bucket, remote_paths, concurrency)
+
+    def _upload_files(self, files, acl, config=None):
+        """
+        Upload (local path, key) pairs and return the output lines.
+
+        Small files are uploaded concurrently, large files one at a time with parallel parts.
+        """
+        config = config or self.s3.transfer_config
+        extra_args = {'ACL': acl}
+        small, large = [], []
+        for path, key in files:
+            (large if os.path.getsize(path) >= config.multipart_threshold else small).append((path, key))
+
+        with ThreadPoolExecutor(config.concurrency) as executor:
+            for future in [executor.submit(upload_file, self.client, self.bucket, key, path, config, extra_args)
+                           for path, key in small]:
+                future.result()
+        for path, key in large:
+            upload_file(self.client, self.bucket, key, path, config, extra_args)
+        return ['upload: {0} to {1}'.format(path, object_uri(self.bucket, key)) for path, key in files]
+
+    def upload(self, local_path, remote_path, acl='private', quiet=None, config=None):
+        if os.path.isdir(local_path):
+            files = [(path, directory_prefix(remote_path) + relative) for path, relative in walk(local_path)]
+        else:
+            files = [(local_path, destination_key(local_path, remote_path))]
+        output = self._upload_files(files, acl, config)
+        return [] if self._quiet(quiet) else output
+
+    def upload_stream(self, source, remote_path, acl='private', config=None, size=None):
+        return upload_fileobj(self.client, self.bucket, remote_path, source, config, {'ACL': acl}, size)
+
+    def _download_files(self, downloads, config=None):
+        """
+        Download (key, local path, record) triples and return the output lines.
+
+        Small objects are downloaded concurrently, large objects one at a time with parallel ranges.
+        Local files are stamped with the objects' last modified times (like the CLI).
+        """
+        config = config or self.s3.transfer_config
+
+        def download(key, local_path, record):
+            directory = os.path.dirname(local_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if record is None:
+                download_file(self.client, self.bucket, key, local_path, config)
+            else:
+                download_file(self.client, self.bucket, key, local_path, config, record.size, record.etag)
+                mtime = record.last_modified.timestamp()
+                os.utime(local_path, (mtime, mtime))
+
+        small, large = [], []
+        for args in downloads:
+            (small if args[2] is not None and args[2].size < config.multipart_threshold else large).append(args)
+
+        with ThreadPoolExecutor(config.concurrency) as executor:
+            for future in [executor.submit(download, *args) for args in small]:
+                future.result()
+        for args in large:
+            download(*args)
+        return ['download: {0} to {1}'.format(object_uri(self.bucket, key), local_path)
+                for key, local_path, record in downloads]
+
+    def download(self, remote_path, local_path, recursive=False, quiet=None, config=None):
+        if recursive:
+            downloads = [(record.key, os.path.join(local_path, *relative.split('/')), record)
+                         for relative, record in self._iter_tree(remote_path) if not record.key.endswith('/')]
+        else:
+            if os.path.isdir(local_path) or local_path.endswith(os.sep):
+                local_path = os.path.join(local_path, os.path.basename(remote_path))
+            if getattr(self.s3, 'download_cache', None) is not None:
+                directory = os.path.dirname(local_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self.s3.download_cache.download(self.client, self.bucket, remote_path, local_path,
+                                                config or self.s3.transfer_config)
+                return [] if self._quiet(quiet) else ['download: {0} to {1}'.format(
+                    object_uri(self.bucket, remote_path), local_path)]
+            downloads = [(remote_path, local_path, None)]
+        output = self._download_files(downloads, config)
+        return [] if self._quiet(quiet) else output
+
+    def read_range(self, remote_path, start=0, end=None, buffer=None):
+        return read_range(self.client, self.bucket, remote_path, start, end, buffer)
+
+    def open(self, remote_path, mode='rb', read_ahead=READ_AHEAD, buffer_size=BUFFER_SIZE, encoding=None):
+        return open_object(self.client, self.bucket, remote_path, mode, read_ahead, buffer_size, encoding)
+
+    def iter_lines(self, remote_path, chunk_size=READ_AHEAD, encoding=None, keepends=False):
+        return iter_lines(self.client, self.bucket, remote_path, chunk_size, encoding, keepends)
+
+    def _plan(self, local_path, remote_path, delete, remote_source, manifest=None, compare='mtime', hash_cache=None,
+              filters=NO_FILTERS):
+        """Plan a sync, return (generator of SyncAction, whether both sides are compared in full)."""
+        actions, full = self._plan_metadata(local_path, remote_path, delete, remote_source, manifest, filters)
+        if compare == 'content':
+            # Only content compared syncs need the hashing process pool (and multiprocessing)
+            from awsutils.s3.hashing import load_hash_cache, verify_content
+
+            actions = verify_content(actions, self.s3.transfer_config, load_hash_cache(hash_cache))
+        return actions, full
+
+    def _plan_metadata(self, local_path, remote_path, delete, remote_source, manifest=None, filters=NO_FILTERS):
+        """Plan a sync comparing sizes and modification times (or the manifest's state)."""
+        local = iter_local_tree(local_path, filters)
+        # 'Folder' marker objects are not files
+        remote = ((relative, record) for relative, record in self._iter_tree(remote_path, filters)
+                  if not relative.endswith('/'))
+        pair = sync_pair(local_path, self.bucket, remote_path, remote_source)
+        if manifest is None or manifest.needs_reconcile(pair):
+            if remote_source:
+                return plan(remote, local, DOWNLOAD, compare_download, delete), True
+            return plan(local, remote, UPLOAD, compare_upload, delete), True
+
+        # Incremental: only one side is read and compared with its state as of the last sync
+        entries = ((entry.path, entry) for entry in manifest.iter_entries(pair) if filters(entry.path))
+        if remote_source:
+            return plan(remote, entries, DOWNLOAD, compare_manifest_remote, delete), False
+        return plan(local, entries, UPLOAD, compare_manifest_local, delete), False
+
+    def plan_sync(self, local_path, remote_path, delete=False, remote_source=False, manifest=None, compare='mtime',
+                  hash_cache=None, include=None, exclude=None):
+        filters = Filters.from_args((EXCLUDE, exclude), (INCLUDE, include))
+        return self._plan(local_path, remote_path, delete, remote_source, manifest, compare, hash_cache, filters)[0]
+
+    def sync(self, local_path, remote_path, delete=False, acl='private', quiet=None, remote_source=False,
+             manifest=None, compare='mtime', hash_cache=None, include=None, exclude=None):
+        config = self.s3.transfer_config
+        prefix = directory_prefix(remote_path)
+        filters = Filters.from_args((EXCLUDE, exclude), (INCLUDE, include))
+        actions, full = self._plan(local_path, remote_path, delete, remote_source, manifest, compare, hash_cache,
+                                   filters)
+
+        def steps():
+            """Group remote deletes in to DeleteObjects batches and drop the skips that need no manifest entry."""
+            batch = []
+            for action in actions:
+                if action.action == DELETE and not remote_source:
+                    batch.append(prefix + action.path)
+                    if len(batch) == DELETE_BATCH_SIZE:
+                        yield batch
+                        batch = []
+                elif action.action != SKIP or (manifest is not None and full and action.source is not None):
+                    yield action
+            if batch:
+                yield batch
+
+        def run(step):
+            """Execute a step, return (output lines, ManifestEntry of the synced path or None, deleted paths)."""
+            if isinstance(step, list):
+                deleted = []
+                lines = self._delete_keys(step, deleted)
+                return lines, None, [key[len(prefix):] for key in deleted]
+            path = os.path.join(local_path, *step.path.split('/'))
+            if step.action == UPLOAD:
+                key = prefix + step.path
+                upload_file(self.client, self.bucket, key, path, config, {'ACL': acl})
+                return (['upload: {0} to {1}'.format(path, object_uri(self.bucket, key))],
+                        ManifestEntry(step.path, step.source.size, step.source.mtime, None), ())
+            elif step.action == DOWNLOAD:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                download_file(self.client, self.bucket, step.source.key, path, config, step.source.size,
+                              step.source.etag)
+                mtime = step.source.last_modified.timestamp()
+                os.utime(path, (mtime, mtime))
+                stat = os.stat(path)
+                return (['download: {0} to {1}'.format(object_uri(self.bucket, step.source.key), path)],
+                        ManifestEntry(step.path, stat.st_size, stat.st_mtime, step.source.etag), ())
+            elif step.action == DELETE:
+                if not os.path.isfile(path):
+                    return [], None, [step.path]
+                os.remove(path)
+                return ['delete: {0}'.format(path)], None, [step.path]
+            # Unchanged, record the state of both sides
+            local, remote = (step.destination, step.source) if remote_source else (step.source, step.destination)
+            return [], ManifestEntry(step.path, local.size, local.mtime, remote.etag), ()
+
+        def is_large(step):
+            # Transfers large enough to be parallelised on their own are run one at a time
+            return getattr(step, 'action', None) in (UPLOAD, DOWNLOAD) and \
+                step.source.size >= config.multipart_threshold
+
+        output, entries, removed = [], [], []
+        for lines, entry, deleted in execute(steps(), run, config.concurrency, is_large):
+            output.extend(lines)
+            removed.extend(deleted)
+            if entry is not None:
+                entries.append(entry)
+        if manifest is not None:
+            pair = sync_pair(local_path, self.bucket, remote_path, remote_source)
+            # A filtered sync only saw part of the pair, the entries of the other paths are kept
+            if full and not filters:
+                manifest.replace(pair, entries)
+            else:
+                manifest.update(pair, entries, removed)
+        return [] if self._quiet(quiet) else output
+
+    def create_bucket(self, region='us-east-1'):
+        kwargs = {'Bucket': self.bucket}
+        if region and region != 'us-east-1':
+            kwargs['CreateBucketConfiguration'] = {'LocationConstraint': region}
+        self.get_client().create_bucket(**kwargs)
+
+        # Enable transfer acceleration
+        self.get_client().put_bucket_accelerate_configuration(Bucket=self.bucket,
+                                                              AccelerateConfiguration={'Status': 'Enabled'})
+        return ['make_bucket: {0}'.format(self.bucket)]
+
+    def delete_bucket(self, force=False):
+        output = self._delete_keys(record.key for _, record in self._iter_tree('')) if force else []
+        self.get_client().delete_bucket(Bucket=self.bucket)
+        return output + ['remove_bucket: {0}'.format(self.bucket)]
+
+    def pre_sign(self, remote_path, expiration=3600):
+        return self.presigner.pre_sign(remote_path, expiration)
+
+    def pre_sign_many(self, remote_paths, expiration=3600):
+        return self.presigner.pre_sign_many(remote_paths, expiration)
+
+    def is_acceleration_enabled(self):
+        from botocore.exceptions import ClientError
+        try:
+            response = self.get_client().get_bucket_accelerate_configuration(Bucket=self.bucket)
+        except ClientError:
+            return False
+        return response.get('Status', '').lower() == 'enabled'
+
+    def bucket_region(self):
+        # Buckets in us-east-1 have a null location constraint
+        return self.get_client().get_bucket_location(Bucket=self.bucket).get('LocationConstraint') or 'us-east-1'
+
+
+def walk(directory):
+    """
+    Walk a local directory.
+
+    :param directory: Local directory
+    :return: Generator of (path, path relative to directory using '/' separators) tuples
+    """
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            yield path, os.path.relpath(path, directory).replace(os.sep, '/')
@@ -0,0 +1,205 @@
+import os
+
+from awsutils.s3.backends.base import Backend
+from awsutils.s3.bulk import CONCURRENCY, DELETE_CONCURRENCY
+from awsutils.s3.commands import S3Commands
+from awsutils.s3.helpers import remote_path_root, is_recursive_needed
+from awsutils.s3.reader import BUFFER_SIZE, READ_AHEAD
+from awsutils.s3.url import bucket_uri
+
+
+def system_command(command):
+    """Run an `aws` command, dirutility (and its dependencies) are only imported once a command is run."""
+    from dirutility import SystemCommand
+
+    return SystemCommand(command)
+
+
+def unsupported(operation):
+    """Raise the error of an operation the `aws` CLI can not carry out, rather than running it another way."""
+    raise NotImplementedError('ERROR: {0} is not supported by the cli backend, use the botocore backend'
+                              .format(operation))
+
+
+class CLIBackend(Backend):
+    """Backend that executes each operation as an `aws` CLI subprocess."""
+    name = 'cli'
+
+    def __init__(self, *args, **kwargs):
+        super(CLIBackend, self).__init__(*args, **kwargs)
+        self.cmd = S3Commands()
+
+    @property
+    def bucket_uri(self):
+        return self.s3.bucket_uri
+
+    def _quiet(self, quiet):
+        return quiet if quiet else self.s3.quiet
+
+    @property
+    def buckets(self):
+        return [out.rsplit(' ', 1)[-1] for out in system_command(self.cmd.list())]
+
+    def list(self, remote_path='', recursive=False, human_readable=False, summarize=False, concurrency=None):
+        return [out.rsplit(' ', 1)[-1] for out in
+                system_command(self.cmd.list(uri='{0}/{1}'.format(self.bucket_uri, remote_path_root(remote_path)),
+                                            recursive=recursive, human_readable=human_readable, summarize=summarize))]
+
+    def copy(self, src_path, dst_path, dst_bucket=None, recursive=False, include=None, exclude=None, acl='private',
+             quiet=None):
+        uri1 = '{uri}/{src}'.format(uri=self.bucket_uri, src=src_path)
+        uri2 = '{uri}/{dst}'.format(uri=bucket_uri(dst_bucket) if dst_bucket else self.bucket_uri, dst=dst_path)
+
+        # Copy recursively if both URI's are directories and NOT files
+        try:
+            return system_command(
+                self.cmd.copy(object1=uri1,
+                              object2=uri2,
+                              recursive=is_recursive_needed(uri1, uri2, recursive_default=recursive),
+                              include=include,
+                              exclude=exclude,
+                              acl=acl,
+                              quiet=self._quiet(quiet))
+            )
+        finally:
+            self._invalidate(dst_path, dst_bucket)
+
+    def move(self, src_path, dst_path, dst_bucket=None, recursive=False, include=None, exclude=None):
+        uri1 = '{uri}/{src}'.format(uri=self.bucket_uri, src=src_path)
+        uri2 = '{uri}/{dst}'.format(uri=bucket_uri(dst_bucket) if dst_bucket else self.bucket_uri, dst=dst_path)
+
+        # Move recursively if both URI's are directories and NOT files
+        try:
+            return system_command(
+                self.cmd.move(object1=uri1,
+                              object2=uri2,
+                              recursive=is_recursive_needed(uri1, uri2, recursive_default=recursive),
+                              include=include,
+                              exclude=exclude)
+            )
+        finally:
+            self._invalidate(src_path)
+            self._invalidate(dst_path, dst_bucket)
+
+    def exists(self, remote_path):
+        # Check to see if a result was returned, if not then key does not exist
+        return True if len(system_command(self.cmd.list('{0}/{1}'.format(self.bucket_uri, remote_path)))) > 0 else False
+
+    def delete(self, remote_path, recursive=False, include=None, exclude=None):
+        # Delete recursively if both URI's are directories and NOT files
+        try:
+            return system_command(
+                self.cmd.remove(uri='{uri}/{src}'.format(uri=self.bucket_uri, src=remote_path),
+                                recursive=is_recursive_needed(remote_path, recursive_default=recursive),
+                                include=include,
+                                exclude=exclude)
+            )
+        finally:
+            self._invalidate(remote_path)
+
+    def upload(self, local_path, remote_path, acl='private', quiet=None, config=None):
+        try:
+            return system_command(
+                self.cmd.copy(object1=local_path,
+                              object2='{0}/{1}'.format(self.bucket_uri, remote_path),
+                              recursive=True if os.path.isdir(local_path) else False,
+                              acl=acl, quiet=self._quiet(quiet))
+            )
+        finally:
+            self._invalidate(remote_path)
+
+    def download(self, remote_path, local_path, recursive=False, quiet=None, config=None):
+        return system_command(
+            self.cmd.copy(object1='{0}/{1}'.format(self.bucket_uri, remote_path),
+                          object2=local_path,
+                          recursive=recursive,
+                          quiet=self._quiet(quiet))
+        )
+
+    def sync(self, local_path, remote_path, delete=False, acl='private', quiet=None, remote_source=False,
+             manifest=None, compare='mtime', hash_cache=None, include=None, exclude=None):
+        uri = '{0}/{1}'.format(self.bucket_uri, remote_path)
+
+        # Sync from the S3 bucket
+        destination, source = (local_path, uri) if remote_source else (uri, local_path)
+
+        try:
+            return system_command(
+                self.cmd.sync(
+                    source=source,
+                    destination=destination,
+                    delete=delete,
+                    acl=acl,
+                    quiet=self._quiet(quiet),
+                    include=include,
+                    exclude=exclude)
+            )
+        finally:
+            if not remote_source:
+                self._invalidate(remote_path)
+
+    def create_bucket(self, region='us-east-1'):
+        # Create the bucket
+        create = system_command(self.cmd.make_bucket(self.bucket_uri, region))
+
+        # Enable transfer acceleration
+        system_command(self.cmd.enable_transfer_acceleration(self.s3.bucket_name))
+
+        return create
+
+    def delete_bucket(self, force=False):
+        return system_command(self.cmd.remove_bucket(self.bucket_uri, force))
+
+    def pre_sign(self, remote_path, expiration=3600):
+        return system_command(self.cmd.pre_sign('{uri}/{src}'.format(uri=self.bucket_uri, src=remote_path),
+                                               expiration))[0]
+
+    def is_acceleration_enabled(self):
+        output = system_command(self.cmd.acceleration_enabled_status(self.s3.bucket_name)).output
+
+        if len(output) > 0:
+            return output[0].strip('"').lower() == 'enabled'
+        else:
+            return False
+
+    def bucket_region(self):
+        output = system_command(self.cmd.bucket_location(self.s3.bucket_name)).output
+
+        # Buckets in us-east-1 have a null location constraint
+        region = output[0].strip('"') if len(output) > 0 else ''
+        return region if region and region != 'null' else 'us-east-1'
+
+    def build_index(self, prefix='', concurrency=None):
+        unsupported('build_index')
+
+    def refresh_index(self, force=False, concurrency=None):
+        unsupported('refresh_index')
+
+    def du(self, prefix='', depth=1, concurrency=None):
+        unsupported('du')
+
+    def exists_many(self, remote_paths, concurrency=CONCURRENCY, strategy='auto'):
+        unsupported('exists_many')
+
+    def head_many(self, remote_paths, concurrency=CONCURRENCY):
+        unsupported('head_many')
+
+    def delete_many(self, remote_paths, concurrency=DELETE_CONCURRENCY, stream=False):
+        unsupported('delete_many')
+
+    def upload_stream(self, source, remote_path, acl='private', config=None, size=None):
+        unsupported('upload_stream')
+
+    def read_range(self, remote_path, start=0, end=None, buffer=None):
+        unsupported('read_range')
+
+    def open(self, remote_path, mode='rb', read_ahead=READ_AHEAD, buffer_size=BUFFER_SIZE, encoding=None):
+        unsupported('open')
+
+    def iter_lines(self, remote_path, chunk_size=READ_AHEAD, encoding=None, keepends=False):
+        unsupported('iter_lines')
+
+    def plan_sync(self, local_path, remote_path, delete=False, remote_source=False, manifest=None, compare='mtime',
+                  hash_cache=None, include=None, exclude=None):
+        # `aws s3 sync --dryrun` only prints the transfers, not the SyncActions (and skips) of a plan
+        unsupported('plan_sync')
@@ -0,0 +1,224 @@
+import os
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from awsutils.s3.listing import PAGE_SIZE, iter_pages
+
+# Default number of concurrent requests made by bulk operations
+CONCURRENCY = 16
+
+# Minimum number of keys before exists_many considers listing instead of HEAD requests
+LIST_MIN_KEYS = 100
+
+# exists_many gives up listing once it scans more than this many keys per requested key
+LIST_MAX_SCAN_RATIO = 10
+
+# Maximum number of keys accepted by a single DeleteObjects request
+DELETE_BATCH_SIZE = 1000
+
+# Default number of concurrent DeleteObjects requests
+DELETE_CONCURRENCY = 8
+
+
+class ObjectHead(namedtuple('ObjectHead', ('size', 'etag', 'content_type', 'last_modified'))):
+    """Metadata of an S3 object returned by a HEAD request."""
+    __slots__ = ()
+
+
+def is_not_found(error):
+    """Determine if a botocore ClientError is a 404 (missing key) error."""
+    response = getattr(error, 'response', {})
+    return (response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound') or
+            response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 404)
+
+
+def head_object(client, bucket, key):
+    """
+    Retrieve an object's metadata.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param key: Object key
+    :return: ObjectHead or None if the key does not exist
+    """
+    from botocore.exceptions import ClientError
+    try:
+        response = client.head_object(Bucket=bucket, Key=key)
+    except ClientError as error:
+        if is_not_found(error):
+            return None
+        raise
+    return ObjectHead(response['ContentLength'], response.get('ETag', '').strip('"'), response.get('ContentType'),
+                      response.get('LastModified'))
+
+
+def head_many(client, bucket, keys, concurrency=CONCURRENCY):
+    """
+    Retrieve the metadata of many objects with concurrent HEAD requests.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param keys: Iterable of object keys
+    :param concurrency: Maximum number of concurrent requests
+    :return: Dictionary of key: ObjectHead (None for keys that do not exist), in the order of keys
+    """
+    keys = list(dict.fromkeys(keys))
+    with ThreadPoolExecutor(max(1, min(concurrency, len(keys)))) as executor:
+        return dict(zip(keys, executor.map(lambda key: head_object(client, bucket, key), keys)))
+
+
+def _exists_by_listing(client, bucket, keys, max_pages=None, page_size=PAGE_SIZE):
+    """
+    Resolve the existence of sorted, unique keys by listing their common prefix.
+
+    :return: (Dictionary of resolved key: bool, list of keys left unresolved once max_pages was exceeded)
+    """
+    prefix = os.path.commonprefix(keys)
+    results, index = {}, 0
+
+    # Start listing just before the first key (any key sorting between the two is harmlessly skipped)
+    pages = iter_pages(client, bucket, prefix, start_after=keys[0][:-1] or None, page_size=page_size)
+    for count, page in enumerate(pages, 1):
+        for obj in page.get('Contents', ()):
+            while index < len(keys) and keys[index] < obj['Key']:
+                results[keys[index]] = False
+                index += 1
+            if index == len(keys):
+                break
+            if keys[index] == obj['Key']:
+                results[keys[index]] = True
+                index += 1
+        if index == len(keys) or (max_pages is not None and count >= max_pages and page.get('IsTruncated')):
+            break
+    else:
+        # The listing is exhausted, every remaining key sorts after the last object
+        results.update((key, False) for key in keys[index:])
+        index = len(keys)
+    return results, keys[index:]
+
+
+def exists_many(client, bucket, keys, concurrency=CONCURRENCY, strategy='auto'):
+    """
+    Check whether many keys exist (exact key matches, not prefixes).
+
+    Keys that are dense under a common prefix are resolved with a single listing of
+    the prefix and set lookups, scattered keys with concurrent HEAD requests.  The
+    'auto' strategy lists when there are enough keys and switches to HEAD requests
+    for the remaining keys as soon as the listing scans more than
+    LIST_MAX_SCAN_RATIO keys per requested key.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param keys: Iterable of object keys
+    :param concurrency: Maximum number of concurrent HEAD requests
+    :param strategy: 'auto', 'list' or 'head'
+    :return: Dictionary of key: bool, in the order of keys
+    """
+    assert strategy in ('auto', 'list', 'head'), 'ERROR: Invalid strategy ({0})'.format(strategy)
+    keys = list(dict.fromkeys(keys))
+    results, remaining = {}, sorted(keys)
+    if remaining and (strategy == 'list' or (strategy == 'auto' and len(remaining) >= LIST_MIN_KEYS)):
+        max_pages = None if strategy == 'list' else max(1, len(remaining) * LIST_MAX_SCAN_RATIO // PAGE_SIZE)
+        results, remaining = _exists_by_listing(client, bucket, remaining, max_pages)
+    if remaining:
+        results.update((key, head is not None) for key, head in head_many(client, bucket, remaining,
+                                                                          concurrency).items())
+    return {key: results[key] for key in keys}
+
+
+class DeleteError(namedtuple('DeleteError', ('key', 'code', 'message'))):
+    """A key that a DeleteObjects request failed to delete."""
+    __slots__ = ()
+
+
+class DeleteBatch(namedtuple('DeleteBatch', ('deleted', 'errors'))):
+    """Outcome of one DeleteObjects request: the deleted keys and a DeleteError per failed key."""
+    __slots__ = ()
+
+
+class DeleteResult:
+    def __init__(self):
+        """Aggregated outcome of a delete_many call."""
+        self.deleted = 0
+        self.errors = []
+
+    def __repr__(self):
+        return '<DeleteResult deleted={0} errors={1}>'.format(self.deleted, len(self.errors))
+
+    @property
+    def success(self):
+        """Return a boolean stating weather every key was deleted."""
+        return not self.errors
+
+    def add(self, batch):
+        self.deleted += len(batch.deleted)
+        self.errors.extend(batch.errors)
+        return self
+
+
+def _delete_batch(client, bucket, keys):
+    """Delete up to 1000 keys with a single (quiet) DeleteObjects request, a failed request fails each key."""
+    from botocore.exceptions import BotoCoreError, ClientError
+    try:
+        response = client.delete_objects(Bucket=bucket, Delete={'Objects': [{'Key': key} for key in keys],
+                                                                'Quiet': True})
+    except ClientError as error:
+        code, message = error.response.get('Error', {}).get('Code'), error.response.get('Error', {}).get('Message')
+        return DeleteBatch([], [DeleteError(key, code, message) for key in keys])
+    except BotoCoreError as error:
+        return DeleteBatch([], [DeleteError(key, type(error).__name__, str(error)) for key in keys])
+    errors = [DeleteError(error['Key'], error.get('Code'), error.get('Message'))
+              for error in response.get('Errors', ())]
+    failed = {error.key for error in errors}
+    return DeleteBatch([key for key in keys if key not in failed], errors)
+
+
+def iter_delete(client, bucket, keys, concurrency=DELETE_CONCURRENCY, batch_size=DELETE_BATCH_SIZE):
+    """
+    Delete keys with concurrent, multi-object DeleteObjects requests as they are generated.
+
+    keys is consumed lazily, so deletes start before a generator (such as a listing)
+    is exhausted.  At most 2 * concurrency batches are held in memory at once.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param keys: Iterable of keys or ObjectRecords (common prefixes are skipped)
+    :param concurrency: Maximum number of concurrent DeleteObjects requests
+    :param batch_size: Number of keys per request (at most 1000)
+    :return: Generator of DeleteBatch, in order of completion
+    """
+    assert 0 < batch_size <= DELETE_BATCH_SIZE, 'ERROR: batch_size must be between 1 and 1000'
+    keys = (getattr(key, 'key', key) for key in keys if not getattr(key, 'is_prefix', False))
+    pending, exhausted = set(), False
+    with ThreadPoolExecutor(concurrency) as executor:
+        while True:
+            while not exhausted and len(pending) < 2 * concurrency:
+                batch = list(islice(keys, batch_size))
+                if batch:
+                    pending.add(executor.submit(_delete_batch, client, bucket, batch))
+                exhausted = len(batch) < batch_size
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def delete_many(client, bucket, keys, concurrency=DELETE_CONCURRENCY, batch_size=DELETE_BATCH_SIZE):
+    """
+    Delete many keys with concurrent, multi-object DeleteObjects requests.
+
+    See iter_delete for a variant reporting each request's outcome as it completes.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param keys: Iterable of keys or ObjectRecords, e.g. a listing generator
+    :param concurrency: Maximum number of concurrent DeleteObjects requests
+    :param batch_size: Number of keys per request (at most 1000)
+    :return: DeleteResult with the number of deleted keys and a DeleteError per failed key
+    """
+    result = DeleteResult()
+    for batch in iter_delete(client, bucket, keys, concurrency, batch_size):
+        result.add(batch)
+    return result
@@ -0,0 +1,98 @@
+import time
+from threading import Lock
+
+from awsutils.s3.helpers import resolve_option
+
+# Default number of seconds cached bucket metadata is considered fresh
+DEFAULT_TTL = 300
+
+
+class MetadataCache:
+    def __init__(self, ttl=DEFAULT_TTL, clock=time.monotonic):
+        """
+        Thread-safe cache of bucket metadata with a time-to-live.
+
+        Used by S3 objects to avoid re-fetching acceleration status, the bucket
+        list and bucket regions every time a (short-lived) S3 object is built.
+        Keys are tuples such as ('accelerate', bucket), ('buckets',) and ('region', bucket).
+
+        :param ttl: Number of seconds an entry is fresh for
+        :param clock: Function returning the current time in seconds
+        """
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = {}
+        self._lock = Lock()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key, default=None):
+        """Retrieve a fresh cached value, or default if the key is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= self._clock():
+                del self._entries[key]
+                return default
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """Cache a value for ttl seconds (defaults to the cache's ttl)."""
+        with self._lock:
+            self._entries[key] = (self._clock() + (self.ttl if ttl is None else ttl), value)
+        return value
+
+    def get_or_set(self, key, factory):
+        """
+        Retrieve a cached value, computing and caching it with factory() when missing or expired.
+
+        The factory is called outside of the lock, so slow requests do not block other keys.
+        """
+        value = self.get(key, _MISSING)
+        return self.set(key, factory()) if value is _MISSING else value
+
+    def invalidate(self, key=None, bucket=None):
+        """
+        Remove entries from the cache.
+
+        :param key: Remove a single key
+        :param bucket: Remove every key relating to a bucket (as well as the bucket list)
+        :return: Number of entries removed
+        """
+        with self._lock:
+            if key is None and bucket is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+            keys = [k for k in self._entries if k == key or
+                    (bucket is not None and (k == ('buckets',) or (len(k) > 1 and k[1] == bucket)))]
+            for k in keys:
+                del self._entries[k]
+            return len(keys)
+
+
+class _Missing:
+    def __repr__(self):
+        return '<missing>'
+
+
+_MISSING = _Missing()
+
+# Cache shared by every S3 object in the process (unless disabled or replaced)
+default_cache = MetadataCache()
+
+
+def load_cache(cache=True):
+    """
+    Resolve the `cache` argument of an S3 object.
+
+    :param cache: True for the shared default cache, False/None to disable caching or a MetadataCache
+    :return: MetadataCache or None
+    """
+    return resolve_option(cache, lambda: default_cache)
@@ -1,8 +1,16 @@
+from awsutils.s3.filters import as_patterns
+
+
 def clean_path(path):
     """Return a path string with double quote wrappers if the path contains a space."""
     return '"{0}"'.format(path) if path and '"' not in path else "'{0}'".format(path)
 
 
+def filter_flags(flag, patterns):
+    """Return the --include/--exclude flags of one or more patterns."""
+    return ''.join(' --{0} "{1}"'.format(flag, pattern) for pattern in as_patterns(patterns))
+
+
 def move_or_copy(command, object1, object2, recursive=False, include=None, exclude=None, acl='private', quiet=True):
     """
     Copy file(s)/folder(s) from one S3 bucket location to another
@@ -11,8 +19,8 @@ def move_or_copy(command, object1, object2, recursive=False, include=None, exclu
     :param object1: S3 uri or file path #1
     :param object2: S3 uri or file path #2
     :param recursive: Recursively copy all files within the directory
-    :param include: Don't exclude files or objects in the command that match the specified pattern
-    :param exclude: Exclude all files or objects from the command that matches the specified pattern
+    :param include: Don't exclude files or objects in the command that match the specified pattern(s)
+    :param exclude: Exclude all files or objects from the command that matches the specified pattern(s)
     :param acl: Access permissions, must be either 'private', 'public-read' or 'public-read-write'
     :param quiet: When true, does not display the operations performed from the specified command
     :return: Command string
@@ -25,8 +33,8 @@ def move_or_copy(command, object1, object2, recursive=False, include=None, exclu
     cmd += ' --quiet' if quiet else ''
     cmd += ' --acl {acl}'
     cmd += ' --recursive' if recursive else ''
-    cmd += ' --include "{0}"'.format(include) if include else ''
-    cmd += ' --exclude "{0}"'.format(exclude) if exclude else ''
+    cmd += filter_flags('include', include)
+    cmd += filter_flags('exclude', exclude)
     return cmd.format(command=command, uri1=clean_path(object1), uri2=clean_path(object2), acl=acl)
 
 
@@ -65,18 +73,18 @@ class S3Commands:
 
         :param uri: S3 object uri
         :param recursive: Recursively copy all files within the directory
-        :param include: Don't exclude files or objects in the command that match the specified pattern
-        :param exclude: Exclude all files or objects from the command that matches the specified pattern
+        :param include: Don't exclude files or objects in the command that match the specified pattern(s)
+        :param exclude: Exclude all files or objects from the command that matches the specified pattern(s)
         :return: Command string
         """
         cmd = 'aws s3 rm {uri}'
         cmd += ' --recursive' if recursive else ''
-        cmd += ' --exclude "{0}"'.format(exclude) if exclude else ''
-        cmd += ' --include "{0}"'.format(include) if include else ''
+        cmd += filter_flags('exclude', exclude)
+        cmd += filter_flags('include', include)
         return cmd.format(uri=clean_path(uri))
 
     @staticmethod
-    def sync(source, destination, delete=False, acl='private', quiet=False):
+    def sync(source, destination, delete=False, acl='private', quiet=False, include=None, exclude=None):
         """
         Synchronize local files with an S3 bucket.
 
@@ -85,12 +93,16 @@ class S3Commands:
         :param delete: Sync with deletion, disabled by default
         :param acl: Access permissions, must be either 'private', 'public-read' or 'public-read-write'
         :param quiet: When true, does not display the operations performed from the specified command
+        :param include: Don't exclude files or objects in the command that match the specified pattern(s)
+        :param exclude: Exclude all files or objects from the command that matches the specified pattern(s)
         :return: Command string
         """
         cmd = 'aws s3 sync {source_path} {destination_uri}'
         cmd += ' --acl {acl}'
         cmd += ' --quiet' if quiet else ''
         cmd += ' --delete' if delete else ''
+        cmd += filter_flags('exclude', exclude)
+        cmd += filter_flags('include', include)
         return cmd.format(source_path=clean_path(source), destination_uri=clean_path(destination), acl=acl)
 
     @staticmethod
@@ -142,6 +154,15 @@ class S3Commands:
         """
         return 'aws s3api get-bucket-accelerate-configuration --bucket {bucket} --query "Status"'.format(bucket=bucket)
 
+    @staticmethod
+    def bucket_location(bucket):
+        """
+        Retrieve the region an S3 bucket resides in
+
+        :param bucket: Name of the bucket to locate
+        """
+        return 'aws s3api get-bucket-location --bucket {bucket} --query "LocationConstraint"'.format(bucket=bucket)
+
     @staticmethod
     def enable_transfer_acceleration(bucket):
         """
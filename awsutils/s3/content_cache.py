@@ -0,0 +1,273 @@
+import hashlib
+import os
+import shutil
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from threading import Lock
+
+from awsutils.s3.helpers import resolve_option
+from awsutils.s3.manifest import DEFAULT_MANIFEST
+from awsutils.s3.transfer import download_file_if_changed
+
+try:
+    import fcntl
+except ImportError:  # Windows, fills are only serialised between the threads of a process
+    fcntl = None
+
+# Default location of the download cache
+DEFAULT_CONTENT_CACHE = os.path.join(os.path.dirname(DEFAULT_MANIFEST), 'objects')
+
+# Default maximum number of bytes of cached objects
+DEFAULT_MAX_SIZE = 10 * 1024 ** 3
+
+# Default number of seconds a cached object is served without revalidating it (0 always revalidates)
+DEFAULT_FRESHNESS = 0
+
+# Number of lock files the cached objects are spread over
+LOCK_STRIPES = 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    etag TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    validated REAL NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (bucket, key)
+);
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+"""
+
+
+class ContentCacheStats(namedtuple('ContentCacheStats', ('hits', 'revalidated', 'misses', 'bypassed', 'evictions',
+                                                         'bytes_downloaded', 'bytes_served'))):
+    """
+    Download cache counters of a process.
+
+    hits were served without a request, revalidated with a 304 Not Modified response,
+    misses were (re-)downloaded in to the cache and bypassed (larger than the cache)
+    were downloaded directly.
+    """
+    __slots__ = ()
+
+    @property
+    def hit_ratio(self):
+        """Return the share of the downloads served from the cache."""
+        total = self.hits + self.revalidated + self.misses + self.bypassed
+        return (self.hits + self.revalidated) / total if total else 0.0
+
+
+class ContentCache:
+    def __init__(self, directory=DEFAULT_CONTENT_CACHE, max_size=DEFAULT_MAX_SIZE, freshness=DEFAULT_FRESHNESS,
+                 clock=time.time):
+        """
+        Read-through local disk cache of downloaded objects with LRU eviction, shareable by the processes of a host.
+
+        Cached objects are revalidated with a conditional GET (If-None-Match) once `freshness` seconds old.
+
+        :param directory: Cache directory
+        :param max_size: Maximum number of bytes of cached objects, larger objects are not cached
+        :param freshness: Number of seconds a cached object is served without revalidating it
+        :param clock: Function returning the current time in seconds
+        """
+        import sqlite3
+
+        self.directory = directory
+        self.max_size = max_size
+        self.freshness = freshness
+        self._clock = clock
+        for name in ('data', 'locks'):
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(directory, 'cache.sqlite'), timeout=60,
+                                           check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(_SCHEMA)
+        self._lock = Lock()
+        self._counts = dict.fromkeys(ContentCacheStats._fields, 0)
+
+    def __repr__(self):
+        return '<ContentCache {0}>'.format(self.directory)
+
+    def close(self):
+        self._connection.close()
+
+    def _count(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self._counts[name] += value
+
+    def stats(self):
+        """Retrieve this process' ContentCacheStats."""
+        with self._lock:
+            return ContentCacheStats(**self._counts)
+
+    def size(self):
+        """Return the number of bytes of cached objects."""
+        with self._lock:
+            return self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def _paths(self, bucket, key):
+        """Return the (data, lock) paths of an object, objects share one of LOCK_STRIPES lock files."""
+        name = hashlib.sha256('{0}/{1}'.format(bucket, key).encode('utf-8')).hexdigest()
+        return (os.path.join(self.directory, 'data', name[:2], name),
+                os.path.join(self.directory, 'locks', '{0:03x}.lock'.format(int(name[:8], 16) % LOCK_STRIPES)))
+
+    @contextmanager
+    def _locked(self, path, exclusive=True, blocking=True):
+        """Hold a file lock, yield whether it was acquired (always True when blocking)."""
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(fd, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) |
+                                (0 if blocking else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield False
+                    return
+            yield True
+        finally:
+            os.close(fd)
+
+    def _entry(self, bucket, key):
+        with self._lock:
+            return self._connection.execute('SELECT etag, size, validated FROM entries WHERE bucket = ? AND key = ?',
+                                            (bucket, key)).fetchone()
+
+    def _fresh(self, entry, data):
+        return entry is not None and entry[2] + self.freshness > self._clock() and os.path.isfile(data)
+
+    def _deliver(self, bucket, key, data, local_path):
+        """Copy a cached object to local_path (through a temporary file) and mark it as used."""
+        _copy(data, local_path)
+        with self._lock, self._connection:
+            self._connection.execute('UPDATE entries SET used = ? WHERE bucket = ? AND key = ?',
+                                     (self._clock(), bucket, key))
+        size = os.path.getsize(local_path)
+        self._count(bytes_served=size)
+        return size
+
+    def download(self, client, bucket, key, local_path, config=None):
+        """
+        Download an object through the cache.
+
+        :param client: botocore S3 client
+        :param bucket: Bucket name
+        :param key: Object key
+        :param local_path: Path of the destination file
+        :param config: TransferConfig of the (ranged) downloads
+        :return: Number of bytes written to local_path
+        """
+        data, lock = self._paths(bucket, key)
+        with self._locked(lock, exclusive=False):
+            if self._fresh(self._entry(bucket, key), data):
+                self._count(hits=1)
+                return self._deliver(bucket, key, data, local_path)
+
+        with self._locked(lock):
+            # Another process may have filled or revalidated the object while we waited
+            entry = self._entry(bucket, key)
+            if self._fresh(entry, data):
+                self._count(hits=1)
+                return self._deliver(bucket, key, data, local_path)
+
+            os.makedirs(os.path.dirname(data), exist_ok=True)
+            cached = entry is not None and os.path.isfile(data)
+            # The first range gives the object's size, objects too large to be cached go straight to local_path
+            result = download_file_if_changed(client, bucket, key,
+                                              lambda size: local_path if size > self.max_size else data, config,
+                                              entry[0] if cached else None)
+            now = self._clock()
+            if result is None:
+                self._count(revalidated=1)
+                with self._lock, self._connection:
+                    self._connection.execute('UPDATE entries SET validated = ? WHERE bucket = ? AND key = ?',
+                                             (now, bucket, key))
+                return self._deliver(bucket, key, data, local_path)
+
+            size, etag = result
+            if size > self.max_size:
+                # A cached copy of the object's previous version is stale
+                self._forget(bucket, key)
+                if os.path.exists(data):
+                    os.remove(data)
+                self._count(bypassed=1, bytes_downloaded=size)
+                return size
+            self._count(misses=1, bytes_downloaded=size)
+            with self._lock, self._connection:
+                self._connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                                         (bucket, key, etag, size, now, now))
+            delivered = self._deliver(bucket, key, data, local_path)
+        self.evict()
+        return delivered
+
+    def _forget(self, bucket, key):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM entries WHERE bucket = ? AND key = ?', (bucket, key))
+
+    def evict(self, max_size=None):
+        """
+        Remove the least recently used objects until the cache holds at most max_size bytes.
+
+        Objects being read or filled by another thread or process are skipped.
+
+        :param max_size: Target size in bytes, defaults to the cache's max_size
+        :return: Number of objects evicted
+        """
+        max_size = self.max_size if max_size is None else max_size
+        excess = self.size() - max_size
+        if excess <= 0:
+            return 0
+        with self._lock:
+            candidates = self._connection.execute('SELECT bucket, key, size FROM entries ORDER BY used').fetchall()
+        evicted = 0
+        for bucket, key, size in candidates:
+            if excess <= 0:
+                break
+            data, lock = self._paths(bucket, key)
+            with self._locked(lock, blocking=False) as acquired:
+                if not acquired:
+                    continue
+                if os.path.exists(data):
+                    os.remove(data)
+                self._forget(bucket, key)
+            excess -= size
+            evicted += 1
+        self._count(evictions=evicted)
+        return evicted
+
+    def invalidate(self, bucket, key):
+        """Remove an object from the cache."""
+        data, lock = self._paths(bucket, key)
+        with self._locked(lock):
+            if os.path.exists(data):
+                os.remove(data)
+            self._forget(bucket, key)
+
+    def clear(self):
+        """Remove every object from the cache."""
+        return self.evict(0)
+
+
+def _copy(source, destination):
+    """Copy a file through a temporary file next to the destination, so that it is replaced atomically."""
+    temp_path = '{0}.{1}.part'.format(destination, os.urandom(4).hex())
+    try:
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, destination)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def load_download_cache(download_cache=None):
+    """
+    Resolve the `download_cache` argument of an S3 object.
+
+    :param download_cache: None/False to disable the cache, True for the default directory, a directory or a
+        ContentCache
+    :return: ContentCache or None
+    """
+    return resolve_option(download_cache, ContentCache, ContentCache)
@@ -0,0 +1,132 @@
+import math
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from awsutils.s3.transfer import MAX_PART_SIZE, MAX_PARTS, MB, MultipartUpload
+
+# Largest object a single CopyObject request can copy
+MAX_COPY_SIZE = MAX_PART_SIZE
+
+# Default size of the parts of a multipart (UploadPartCopy) copy
+COPY_PART_SIZE = 512 * MB
+
+# Default number of objects (or parts of a large object) copied at the same time
+COPY_CONCURRENCY = 16
+
+# Object metadata that CreateMultipartUpload does not copy from the source on its own
+_COPIED_HEADERS = ('ContentType', 'ContentEncoding', 'ContentDisposition', 'ContentLanguage', 'CacheControl',
+                   'Metadata')
+
+
+class CopyResult(namedtuple('CopyResult', ('src_key', 'dst_key', 'size', 'error'))):
+    """Outcome of copying one object, error is None when the copy succeeded."""
+    __slots__ = ()
+
+
+def copy_object(client, bucket, key, dst_bucket, dst_key, extra_args=None, size=None, concurrency=COPY_CONCURRENCY,
+                threshold=MAX_COPY_SIZE, part_size=COPY_PART_SIZE):
+    """
+    Copy an object server-side, the bytes never pass through this host.
+
+    Objects up to 5 GB are copied with a single CopyObject request, larger objects
+    with concurrent UploadPartCopy requests (each pinned to the source's ETag) and
+    the multipart upload is aborted if any part fails.
+
+    :param client: botocore S3 client
+    :param bucket: Source bucket name
+    :param key: Source object key
+    :param dst_bucket: Destination bucket name
+    :param dst_key: Destination object key
+    :param extra_args: Additional CopyObject/CreateMultipartUpload parameters, e.g. {'ACL': 'private'}
+    :param size: Source object size in bytes if known (e.g. from a listing), saves a HEAD request for small objects
+    :param concurrency: Maximum number of parts copied at the same time
+    :param threshold: Objects larger than this many bytes are copied in parts (at most 5 GB)
+    :param part_size: Size of each part, increased automatically to stay within 10,000 parts
+    :return: Number of bytes copied
+    """
+    extra_args = extra_args or {}
+    source = {'Bucket': bucket, 'Key': key}
+    head = None
+    if size is None:
+        head = client.head_object(Bucket=bucket, Key=key)
+        size = head['ContentLength']
+    if size <= threshold:
+        client.copy_object(Bucket=dst_bucket, Key=dst_key, CopySource=source, **extra_args)
+        return size
+
+    head = head or client.head_object(Bucket=bucket, Key=key)
+    ranges = copy_ranges(size, part_size)
+    # Fail instead of mixing parts of two versions if the source is overwritten during the copy
+    pinned = {'CopySourceIfMatch': head['ETag']}
+
+    upload = MultipartUpload(client, dst_bucket, dst_key, multipart_copy_args(head, extra_args))
+    try:
+        with ThreadPoolExecutor(max(1, min(concurrency, len(ranges)))) as executor:
+            for _ in executor.map(lambda part: upload.upload_part_copy(part[0], source, part[1], part[2], pinned),
+                                  ranges):
+                pass
+        upload.complete()
+    except BaseException:
+        upload.abort()
+        raise
+    return size
+
+
+def multipart_copy_args(head, extra_args=None):
+    """Return the CreateMultipartUpload parameters of a copy, with the metadata of the source's HEAD response."""
+    create_args = {header: head[header] for header in _COPIED_HEADERS if head.get(header)}
+    create_args.update(extra_args or {})
+    return create_args
+
+
+def copy_ranges(size, part_size=COPY_PART_SIZE):
+    """Return the (part number, first byte, last byte) of the parts of a copy, within 10,000 parts."""
+    part_size = max(part_size, int(math.ceil(size / MAX_PARTS / MB)) * MB)
+    return [(number, start, min(start + part_size, size) - 1)
+            for number, start in enumerate(range(0, size, part_size), 1)]
+
+
+def _copy(client, bucket, dst_bucket, src_key, dst_key, size, extra_args, threshold):
+    try:
+        return CopyResult(src_key, dst_key, copy_object(client, bucket, src_key, dst_bucket, dst_key, extra_args, size,
+                                                        threshold=threshold), None)
+    except Exception as error:
+        return CopyResult(src_key, dst_key, size, error)
+
+
+def iter_copy(client, bucket, pairs, dst_bucket=None, extra_args=None, concurrency=COPY_CONCURRENCY,
+              threshold=MAX_COPY_SIZE):
+    """
+    Copy many objects server-side with concurrent requests as the pairs are generated.
+
+    pairs is consumed lazily (e.g. from a prefix listing), at most 2 * concurrency
+    copies are pending at once.  Failed copies are reported, not raised, so that
+    the caller can act on every confirmed copy (e.g. delete the sources of a move).
+
+    :param client: botocore S3 client
+    :param bucket: Source bucket name
+    :param pairs: Iterable of (source key, destination key) or (source key, destination key, size) tuples
+    :param dst_bucket: Destination bucket name, defaults to the source bucket
+    :param extra_args: Additional CopyObject parameters, e.g. {'ACL': 'private'}
+    :param concurrency: Maximum number of objects copied at the same time
+    :param threshold: Objects larger than this many bytes are copied in parts
+    :return: Generator of CopyResult, in order of completion
+    """
+    dst_bucket = dst_bucket or bucket
+    pairs = iter(pairs)
+    pending, exhausted = set(), False
+    with ThreadPoolExecutor(concurrency) as executor:
+        while True:
+            while not exhausted and len(pending) < 2 * concurrency:
+                pair = next(pairs, None)
+                if pair is None:
+                    exhausted = True
+                    break
+                src_key, dst_key, size = (tuple(pair) + (None,))[:3]
+                pending.add(executor.submit(_copy, client, bucket, dst_bucket, src_key, dst_key, size, extra_args,
+                                            threshold))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
@@ -0,0 +1,116 @@
+import re
+from fnmatch import translate
+from functools import lru_cache
+
+INCLUDE = 'include'
+EXCLUDE = 'exclude'
+
+_WILDCARD = re.compile(r'[*?\[]')
+
+
+def as_patterns(value):
+    """Normalise an `include`/`exclude` argument (None, a pattern or a sequence of patterns) to a tuple."""
+    if not value:
+        return ()
+    return (value,) if isinstance(value, str) else tuple(pattern for pattern in value if pattern)
+
+
+def literal_prefix(pattern):
+    """Return the part of a glob pattern before its first wildcard."""
+    match = _WILDCARD.search(pattern)
+    return pattern if match is None else pattern[:match.start()]
+
+
+class Filters:
+    def __init__(self, rules=()):
+        """
+        Ordered `aws s3` style include/exclude filters compiled in to a single regular expression.
+
+        Every path is included by default and the last matching rule wins, as with
+        the CLI's --include/--exclude flags.  The rules are combined in reverse
+        order in to one alternation so a path is tested with a single regex match.
+        Paths are relative to the operation's source directory, '*' matches '/'.
+
+        :param rules: Iterable of ('include' or 'exclude', pattern) tuples
+        """
+        self.rules = tuple((kind, pattern) for kind, pattern in rules if pattern)
+        for kind, _ in self.rules:
+            assert kind in (INCLUDE, EXCLUDE), 'ERROR: Invalid filter type ({0})'.format(kind)
+        self._regex = re.compile('|'.join('(?P<r{0}>{1})'.format(index, translate(pattern))
+                                          for index, (_, pattern) in reversed(list(enumerate(self.rules)))))
+        self._prefixes = self._listing_prefixes()
+
+    @classmethod
+    def from_args(cls, *groups):
+        """
+        Build filters from `include`/`exclude` arguments.
+
+        :param groups: ('include' or 'exclude', None, a pattern or a sequence of patterns) tuples, in order
+        :return: Filters
+        """
+        return _compile(tuple((kind, pattern) for kind, value in groups for pattern in as_patterns(value)))
+
+    def __repr__(self):
+        return '<Filters {0}>'.format(' '.join('--{0} "{1}"'.format(kind, pattern) for kind, pattern in self.rules))
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def __call__(self, path):
+        """Determine if a path is included."""
+        if not self.rules:
+            return True
+        match = self._regex.match(path)
+        if match is None:
+            return True
+        groups = match.groupdict()
+        return next(kind for index, (kind, _) in enumerate(self.rules) if groups['r{0}'.format(index)] is not None) \
+            == INCLUDE
+
+    def prunes(self, directory):
+        """
+        Determine if no path under a directory can be included, so that it need not be walked.
+
+        :param directory: Directory relative to the operation's source directory, ending with '/'
+        :return: Bool
+        """
+        for kind, pattern in reversed(self.rules):
+            prefix = literal_prefix(pattern)
+            if kind == INCLUDE:
+                if prefix.startswith(directory) or (prefix != pattern and directory.startswith(prefix)):
+                    return False
+            elif pattern == prefix + '*' and directory.startswith(prefix):
+                return True
+        return False
+
+    def prefixes(self):
+        """
+        Return the (sorted, non overlapping) key prefixes that can contain included paths.
+
+        With an exclude of everything followed by includes (e.g. --exclude "*" --include "logs/2024/*")
+        only the includes' literal prefixes need to be listed, otherwise the whole tree does.
+        """
+        return self._prefixes
+
+    def _listing_prefixes(self):
+        candidates = []
+        for kind, pattern in reversed(self.rules):
+            if kind == INCLUDE:
+                candidates.append(literal_prefix(pattern))
+            elif pattern == '*':
+                break
+        else:
+            return ('',)
+        prefixes = []
+        for prefix in sorted(candidates):
+            if not prefixes or not prefix.startswith(prefixes[-1]):
+                prefixes.append(prefix)
+        return tuple(prefixes)
+
+
+@lru_cache(maxsize=128)
+def _compile(rules):
+    return Filters(rules)
+
+
+NO_FILTERS = Filters()
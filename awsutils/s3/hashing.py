@@ -0,0 +1,176 @@
+import hashlib
+import math
+import mmap
+import os
+import re
+import sqlite3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from awsutils.s3.helpers import resolve_option
+from awsutils.s3.listing import ObjectRecord
+from awsutils.s3.manifest import DEFAULT_MANIFEST
+from awsutils.s3.sync import SKIP, LocalFile, SyncAction
+from awsutils.s3.transfer import MB
+
+# Default location of the hash cache database
+DEFAULT_HASH_CACHE = os.path.join(os.path.dirname(DEFAULT_MANIFEST), 'hash-cache.sqlite')
+
+_MULTIPART_ETAG = re.compile(r'^[0-9a-f]{32}-(\d+)$')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    part_size INTEGER NOT NULL,
+    etag TEXT NOT NULL,
+    PRIMARY KEY (inode, size, mtime, part_size)
+) WITHOUT ROWID;
+"""
+
+
+def file_etag(path, part_size=0):
+    """
+    Compute the ETag S3 gives a file uploaded with parts of part_size bytes.
+
+    The file is memory-mapped, so hashing never copies it in to Python buffers.
+
+    :param path: Path to the file
+    :param part_size: Size of the parts, 0 for the MD5 of a single request upload
+    :return: MD5 hex digest, or the hex MD5 of the parts' MD5 digests followed by '-<number of parts>'
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return hashlib.md5(b'').hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if not part_size:
+                return hashlib.md5(data).hexdigest()
+            view = memoryview(data)
+            try:
+                digests = [hashlib.md5(view[start:start + part_size]).digest() for start in range(0, size, part_size)]
+            finally:
+                view.release()
+    return '{0}-{1}'.format(hashlib.md5(b''.join(digests)).hexdigest(), len(digests))
+
+
+def etag_part_size(size, etag, config):
+    """
+    Determine the part size needed to reproduce an object's ETag locally.
+
+    :param size: Object size in bytes
+    :param etag: Object ETag
+    :param config: TransferConfig the object would have been uploaded with
+    :return: Part size, 0 for a single request upload, None when the ETag is not MD5 based (e.g. SSE-KMS)
+    """
+    match = _MULTIPART_ETAG.match(etag or '')
+    if match is None:
+        return 0 if re.match(r'^[0-9a-f]{32}$', etag or '') else None
+    parts = int(match.group(1))
+    part_size = config.part_size_for(size)
+    if int(math.ceil(size / part_size)) == parts:
+        return part_size
+    # Uploaded with another tool or part size: assume whole MiB parts (the common convention)
+    return int(math.ceil(size / parts / MB)) * MB
+
+
+class HashCache:
+    def __init__(self, path=DEFAULT_HASH_CACHE):
+        """
+        Persistent (SQLite) cache of local file ETags keyed by inode, size, modification time and part size.
+
+        A file is only rehashed once it is replaced or modified.
+
+        :param path: Path of the SQLite database (':memory:' for a throwaway cache)
+        """
+        self.path = path
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+        self._lock = Lock()
+
+    def __repr__(self):
+        return '<HashCache {0}>'.format(self.path)
+
+    def close(self):
+        self._connection.close()
+
+    def get(self, local, part_size):
+        """Retrieve the cached ETag of a LocalFile, or None."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT etag FROM hashes WHERE inode = ? AND size = ? AND mtime = ? AND part_size = ?',
+                (local.inode, local.size, local.mtime, part_size)).fetchone()
+        return row[0] if row else None
+
+    def set(self, local, part_size, etag):
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)',
+                                     (local.inode, local.size, local.mtime, part_size, etag))
+        return etag
+
+
+def load_hash_cache(hash_cache=True):
+    """
+    Resolve the `hash_cache` argument of a content compared sync.
+
+    :param hash_cache: True for the default cache, False/None to hash every time, a database path or a HashCache
+    :return: HashCache
+    """
+    return resolve_option(hash_cache, HashCache, HashCache) or HashCache(':memory:')
+
+
+def verify_content(actions, config, hash_cache, workers=None, window=None):
+    """
+    Turn the transfers of a sync plan whose content is in fact identical in to skips.
+
+    Transfers planned only because of a newer modification time (same size) are
+    checked by computing the local file's S3 ETag, on a thread pool, and comparing
+    it with the object's.  hashlib releases the GIL while hashing the memory-mapped
+    files, and threads avoid forking a process whose sync and botocore threads may
+    hold locks.  The plan's order is preserved: at most `window` actions are held
+    while their hashes are computed.
+
+    :param actions: Iterable of SyncAction
+    :param config: TransferConfig, used to reproduce multipart ETags
+    :param hash_cache: HashCache
+    :param workers: Number of hashing threads, defaults to the number of CPUs
+    :param window: Maximum number of actions held back, defaults to 4 * workers
+    :return: Generator of SyncAction
+    """
+    workers = workers or os.cpu_count() or 1
+    pending = deque()
+    with ThreadPoolExecutor(workers) as executor:
+        for action in actions:
+            local, remote = (action.source, action.destination) if isinstance(action.source, LocalFile) else \
+                (action.destination, action.source)
+            part_size = None
+            if action.action != SKIP and isinstance(local, LocalFile) and isinstance(remote, ObjectRecord) and \
+                    local.size == remote.size:
+                part_size = etag_part_size(remote.size, remote.etag, config)
+
+            if part_size is None:
+                pending.append((action, None, None, None, None))
+            else:
+                etag = hash_cache.get(local, part_size)
+                future = executor.submit(file_etag, local.path, part_size) if etag is None else None
+                pending.append((action, local, part_size, etag, future))
+
+            while pending and (len(pending) > (window or 4 * workers) or pending[0][4] is None or
+                               pending[0][4].done()):
+                yield _resolve(pending.popleft(), hash_cache)
+        while pending:
+            yield _resolve(pending.popleft(), hash_cache)
+
+
+def _resolve(item, hash_cache):
+    action, local, part_size, etag, future = item
+    if future is not None:
+        etag = hash_cache.set(local, part_size, future.result())
+    remote = action.destination if action.source is local else action.source
+    if etag is not None and etag == remote.etag:
+        return SyncAction(SKIP, action.path, 'same content', action.source, action.destination)
+    return action
@@ -0,0 +1,57 @@
+import os
+
+ACL = ('public-read', 'private', 'public-read-write')
+
+
+def assert_acl(acl):
+    """Validate an ACL value by confirming it is in the list of ACL options."""
+    assert acl in ACL, "ERROR: Invalid ACL parameter ({0})".format(', '.join("'{0}'".format(i) for i in ACL))
+    return True
+
+
+def remote_path_root(remote_path):
+    """Return a remote_path referring to the S3 bucket's root if not specified."""
+    if len(remote_path) > 0 and '.' not in os.path.basename(remote_path) and not remote_path.endswith('/'):
+        return '{0}/'.format(remote_path)
+    else:
+        return remote_path
+
+
+def is_recursive_needed(*uris, recursive_default):
+    """
+    Checks to see if a recursive flag is needed for a `copy` or `move` command.
+
+    If both URI's are not directories, original recursive value is returned.
+
+    :param uris: S3 URI's
+    :param recursive_default: Default value for recursive flag
+    :return: Bool, true if both are directories
+    """
+    return True if all('.' not in os.path.basename(uri) for uri in uris) else recursive_default
+
+
+def human_readable_size(size):
+    """Format a byte count the same way as `aws s3 ls --human-readable`."""
+    if size == 1:
+        return '1 Byte'
+    elif size < 1024:
+        return '{0} Bytes'.format(size)
+    for exponent, suffix in enumerate(('KiB', 'MiB', 'GiB', 'TiB', 'PiB', 'EiB'), 1):
+        if size < 1024 ** (exponent + 1) or suffix == 'EiB':
+            return '{0:.1f} {1}'.format(size / 1024 ** exponent, suffix)
+
+
+def resolve_option(value, default, factory=None):
+    """
+    Resolve an optional feature argument of an S3 object (e.g. `metrics` or `index`).
+
+    :param value: None/False to disable the feature, True for the default, a path or an instance
+    :param default: Function returning the default instance, e.g. a shared registry or a new instance
+    :param factory: Function creating an instance from a path, for features backed by a file or directory
+    :return: Instance or None
+    """
+    if value is None or value is False:
+        return None
+    if value is True:
+        return default()
+    return factory(value) if factory is not None and isinstance(value, str) else value
@@ -0,0 +1,408 @@
+import os
+import re
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from fnmatch import translate
+from threading import Lock
+
+from awsutils.s3.filters import literal_prefix
+from awsutils.s3.helpers import resolve_option
+from awsutils.s3.listing import ObjectRecord, iter_objects, iter_objects_parallel
+from awsutils.s3.manifest import DEFAULT_MANIFEST
+from awsutils.s3.metrics import _body_size
+
+# Default location of the key index database
+DEFAULT_INDEX = os.path.join(os.path.dirname(DEFAULT_MANIFEST), 'key-index.sqlite')
+
+# Default number of seconds a listed prefix is trusted for, writes made outside of this library are only seen
+# once the prefix is refreshed
+DEFAULT_MAX_AGE = 300
+
+# Number of rows written to the index per transaction while (re-)listing
+WRITE_BATCH_SIZE = 10000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots (
+    bucket TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    listed REAL NOT NULL,
+    PRIMARY KEY (bucket, prefix)
+);
+CREATE TABLE IF NOT EXISTS stale (
+    bucket TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    PRIMARY KEY (bucket, prefix)
+);
+CREATE TABLE IF NOT EXISTS objects (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    mtime REAL NOT NULL,
+    storage_class TEXT,
+    PRIMARY KEY (bucket, key)
+) WITHOUT ROWID;
+"""
+
+_PARAMS = 'awsutils_s3_index_params'
+_SIZE = 'awsutils_s3_index_size'
+
+
+class RefreshResult(namedtuple('RefreshResult', ('prefixes', 'upserted', 'removed'))):
+    """Outcome of a (re-)listing: the prefixes listed and the number of keys added or changed and removed."""
+    __slots__ = ()
+
+
+def prefix_end(prefix):
+    """Return the smallest string greater than every string starting with prefix (None for the empty prefix)."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1) if prefix else None
+
+
+def _record(row):
+    key, size, etag, mtime, storage_class = row
+    return ObjectRecord(key, size, datetime.fromtimestamp(mtime, timezone.utc), etag, storage_class)
+
+
+def _row(bucket, record):
+    return bucket, record.key, record.size, record.etag, record.last_modified.timestamp(), record.storage_class
+
+
+class KeyIndex:
+    def __init__(self, path=DEFAULT_INDEX, max_age=DEFAULT_MAX_AGE, clock=time.time):
+        """
+        Persistent (SQLite) index of the keys, sizes, ETags and modification times of bucket prefixes.
+
+        Prefixes are added with `build` and kept current by the writes of instrumented clients,
+        reads are only answered for prefixes listed less than max_age seconds ago and not marked stale.
+
+        :param path: Path of the SQLite database (':memory:' for a throwaway index)
+        :param max_age: Number of seconds a listed prefix is trusted for
+        :param clock: Function returning the current time in seconds
+        """
+        import sqlite3
+
+        self.path = path
+        self.max_age = max_age
+        self._clock = clock
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        if path != ':memory:':
+            # Let other processes read the index while it is being written
+            self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(_SCHEMA)
+        self._lock = Lock()
+        self._parts = {}
+
+    def __repr__(self):
+        return '<KeyIndex {0}>'.format(self.path)
+
+    def close(self):
+        self._connection.close()
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def roots(self, bucket):
+        """Retrieve a dictionary of listed prefix: time listed of a bucket."""
+        return dict(self._query('SELECT prefix, listed FROM roots WHERE bucket = ?', (bucket,)))
+
+    def stale_prefixes(self, bucket):
+        """Retrieve the prefixes of a bucket that were marked stale since they were listed."""
+        return [row[0] for row in self._query('SELECT prefix FROM stale WHERE bucket = ? ORDER BY prefix', (bucket,))]
+
+    def covers(self, bucket, prefix=''):
+        """Determine if every key under a prefix is in the index (however old)."""
+        return any(prefix.startswith(root) for root in self.roots(bucket))
+
+    def is_fresh(self, bucket, prefix=''):
+        """Determine if the index can answer for every key under a prefix (listed within max_age, not stale)."""
+        now = self._clock()
+        if not any(prefix.startswith(root) and listed + self.max_age > now
+                   for root, listed in self.roots(bucket).items()):
+            return False
+        return not any(stale.startswith(prefix) or prefix.startswith(stale) for stale in self.stale_prefixes(bucket))
+
+    def invalidate(self, bucket, prefix=''):
+        """Mark a prefix as stale, so that it is answered by S3 until it is refreshed (ignored if not indexed)."""
+        if any(prefix.startswith(root) or root.startswith(prefix) for root in self.roots(bucket)):
+            with self._lock, self._connection:
+                self._connection.execute('INSERT OR IGNORE INTO stale VALUES (?, ?)', (bucket, prefix))
+
+    def forget(self, bucket, prefix=''):
+        """Remove a prefix (and its keys) from the index."""
+        end = prefix_end(prefix)
+        with self._lock, self._connection:
+            for table, column in (('roots', 'prefix'), ('stale', 'prefix'), ('objects', 'key')):
+                self._connection.execute(
+                    'DELETE FROM {0} WHERE bucket = ? AND {1} >= ?{2}'.format(
+                        table, column, ' AND {0} < ?'.format(column) if end else ''),
+                    (bucket, prefix) + ((end,) if end else ()))
+
+    # Queries
+
+    def get(self, bucket, key):
+        """Retrieve the ObjectRecord of a key, or None."""
+        rows = self._query('SELECT key, size, etag, mtime, storage_class FROM objects WHERE bucket = ? AND key = ?',
+                           (bucket, key))
+        return _record(rows[0]) if rows else None
+
+    def exists(self, bucket, prefix):
+        """Determine if any key starts with prefix (like S3.exists)."""
+        end = prefix_end(prefix)
+        return bool(self._query('SELECT 1 FROM objects WHERE bucket = ? AND key >= ?{0} LIMIT 1'.format(
+            ' AND key < ?' if end else ''), (bucket, prefix) + ((end,) if end else ())))
+
+    def _range(self, bucket, low, high, inclusive, batch_size):
+        """Generate the records of the keys from low (inclusive or not) up to high (exclusive), in key order."""
+        while True:
+            rows = self._query('SELECT key, size, etag, mtime, storage_class FROM objects WHERE bucket = ? AND '
+                               'key {0} ?{1} ORDER BY key LIMIT ?'.format('>=' if inclusive else '>',
+                                                                          ' AND key < ?' if high else ''),
+                               (bucket, low) + ((high,) if high else ()) + (batch_size,))
+            for row in rows:
+                yield _record(row)
+            if len(rows) < batch_size:
+                return
+            low, inclusive = rows[-1][0], False
+
+    def iter_list(self, bucket, prefix='', delimiter=None, start_after=None, batch_size=1000):
+        """
+        Generate the ObjectRecords (and common prefixes) of a prefix in key order, like iter_objects.
+
+        Delimited listings skip over each common prefix with a single index seek, so
+        listing a 'folder' costs the same whatever the number of keys below it.
+        """
+        low, inclusive = (start_after, False) if start_after and start_after >= prefix else (prefix, True)
+        end = prefix_end(prefix)
+        # Smaller batches for delimited listings, the rest of a batch is dropped at each common prefix
+        batch_size = min(batch_size, 64) if delimiter else batch_size
+        while True:
+            for record in self._range(bucket, low, end, inclusive, batch_size):
+                if delimiter:
+                    position = record.key.find(delimiter, len(prefix))
+                    if position >= 0:
+                        common = record.key[:position + len(delimiter)]
+                        if not start_after or common > start_after:
+                            yield ObjectRecord(common, None, None, None, None)
+                        low, inclusive = prefix_end(common), True
+                        break
+                yield record
+            else:
+                return
+
+    def glob(self, bucket, pattern):
+        """
+        Generate the ObjectRecords whose key matches a glob pattern ('*' matches '/'), in key order.
+
+        Only the keys starting with the pattern's literal prefix are scanned.
+        """
+        match = re.compile(translate(pattern)).match
+        prefix = literal_prefix(pattern)
+        if prefix == pattern:
+            record = self.get(bucket, pattern)
+            return iter(() if record is None else (record,))
+        return (record for record in self._range(bucket, prefix, prefix_end(prefix), True, 1000)
+                if match(record.key))
+
+    # (Re-)listing
+
+    def build(self, client, bucket, prefix='', concurrency=None):
+        """
+        Add a prefix to the index with a full listing (re-listing it if already indexed).
+
+        :param client: botocore S3 client
+        :param bucket: Bucket name
+        :param prefix: Key prefix, '' for the whole bucket
+        :param concurrency: List in parallel shards with up to this many requests at once
+        :return: RefreshResult
+        """
+        listed = self._clock()
+        upserted, removed = self._relist(client, bucket, prefix, concurrency)
+        end = prefix_end(prefix)
+        with self._lock, self._connection:
+            # Roots and stale prefixes within the new root are superseded by it
+            for table in ('roots', 'stale'):
+                self._connection.execute('DELETE FROM {0} WHERE bucket = ? AND prefix >= ?{1}'.format(
+                    table, ' AND prefix < ?' if end else ''), (bucket, prefix) + ((end,) if end else ()))
+            self._connection.execute('INSERT INTO roots VALUES (?, ?, ?)', (bucket, prefix, listed))
+        return RefreshResult([prefix], upserted, removed)
+
+    def refresh(self, client, bucket, force=False, concurrency=None):
+        """
+        Re-list the prefixes of a bucket that expired (listed more than max_age ago) or were marked stale.
+
+        :param client: botocore S3 client
+        :param bucket: Bucket name
+        :param force: Re-list every indexed prefix
+        :param concurrency: List in parallel shards with up to this many requests at once
+        :return: RefreshResult
+        """
+        now = self._clock()
+        prefixes, upserted, removed = [], 0, 0
+        expired = [root for root, listed in sorted(self.roots(bucket).items())
+                   if force or listed + self.max_age <= now]
+        for root in expired:
+            result = self.build(client, bucket, root, concurrency)
+            prefixes.extend(result.prefixes)
+            upserted, removed = upserted + result.upserted, removed + result.removed
+        for stale in self.stale_prefixes(bucket):
+            changes = self._relist(client, bucket, stale, concurrency)
+            with self._lock, self._connection:
+                self._connection.execute('DELETE FROM stale WHERE bucket = ? AND prefix = ?', (bucket, stale))
+            prefixes.append(stale)
+            upserted, removed = upserted + changes[0], removed + changes[1]
+        return RefreshResult(prefixes, upserted, removed)
+
+    def _relist(self, client, bucket, prefix, concurrency=None):
+        """List a prefix and merge the listing in to the index, return the number of keys (upserted, removed)."""
+        if concurrency and concurrency > 1:
+            listing = iter_objects_parallel(client, bucket, prefix, concurrency)
+        else:
+            listing = iter_objects(client, bucket, prefix)
+        indexed = self._range(bucket, prefix, prefix_end(prefix), True, WRITE_BATCH_SIZE)
+        upserts, removes, counts = [], [], [0, 0]
+
+        def flush(force=False):
+            if force or len(upserts) + len(removes) >= WRITE_BATCH_SIZE:
+                with self._lock, self._connection:
+                    self._connection.executemany('INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?)', upserts)
+                    self._connection.executemany('DELETE FROM objects WHERE bucket = ? AND key = ?', removes)
+                counts[0], counts[1] = counts[0] + len(upserts), counts[1] + len(removes)
+                del upserts[:], removes[:]
+
+        # Merge-join of two key ordered streams, only the differences are written
+        current = next(indexed, None)
+        for record in listing:
+            while current is not None and current.key < record.key:
+                removes.append((bucket, current.key))
+                current = next(indexed, None)
+            if current is not None and current.key == record.key:
+                if _row(bucket, current) != _row(bucket, record):
+                    upserts.append(_row(bucket, record))
+                current = next(indexed, None)
+            else:
+                upserts.append(_row(bucket, record))
+            flush()
+        while current is not None:
+            removes.append((bucket, current.key))
+            current = next(indexed, None)
+        flush(force=True)
+        return tuple(counts)
+
+    # Incremental updates
+
+    def _covered(self, bucket, key):
+        return any(key.startswith(root) for root in self.roots(bucket))
+
+    def put(self, bucket, key, size, etag, mtime=None, storage_class='STANDARD'):
+        """Record an object written by this process (ignored outside of the indexed prefixes)."""
+        if self._covered(bucket, key):
+            with self._lock, self._connection:
+                self._connection.execute('INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?)',
+                                         (bucket, key, size, etag, self._clock() if mtime is None else mtime,
+                                          storage_class))
+
+    def remove(self, bucket, keys):
+        """Remove deleted keys."""
+        with self._lock, self._connection:
+            self._connection.executemany('DELETE FROM objects WHERE bucket = ? AND key = ?',
+                                         ((bucket, key) for key in keys))
+
+    def _mark(self, bucket, key):
+        """Mark the 'directory' of a key whose new state is unknown as stale."""
+        self.remove(bucket, [key])
+        self.invalidate(bucket, key[:key.rfind('/') + 1])
+
+    def instrument_client(self, client):
+        """
+        Keep the index up to date with the writes made by a botocore client.
+
+        PutObject, multipart uploads, CopyObject, DeleteObject and DeleteObjects
+        requests update the index once they succeed, registering the same index
+        twice is a no-op.
+
+        :param client: botocore S3 client
+        :return: client
+        """
+        events = client.meta.events
+        unique = 'awsutils-s3-index-{0}-'.format(id(self))
+        events.register('before-parameter-build.s3', self._before_parameter_build,
+                        unique_id=unique + 'before-parameter-build')
+        for operation in ('PutObject', 'UploadPart'):
+            events.register('before-send.s3.' + operation, self._before_send, unique_id=unique + operation)
+        events.register('after-call.s3', self._after_call, unique_id=unique + 'after-call')
+        return client
+
+    def _before_parameter_build(self, params, context, **kwargs):
+        context[_PARAMS] = params
+
+    def _before_send(self, request, **kwargs):
+        request.context[_SIZE] = _body_size(request)
+
+    def _after_call(self, model, context, parsed=None, http_response=None, **kwargs):
+        # after-call also fires for error responses, which must not change the index
+        if (http_response is not None and http_response.status_code >= 300) or 'Error' in (parsed or {}):
+            return
+        params = context.get(_PARAMS)
+        if params is None or 'Bucket' not in params:
+            return
+        operation, bucket = model.name, params['Bucket']
+        if operation == 'DeleteObject':
+            self.remove(bucket, [params['Key']])
+        elif operation == 'DeleteObjects':
+            failed = {error['Key'] for error in parsed.get('Errors', ())}
+            self.remove(bucket, [item['Key'] for item in params['Delete']['Objects'] if item['Key'] not in failed])
+        elif operation in ('UploadPart', 'UploadPartCopy'):
+            if operation == 'UploadPart':
+                size = context.get(_SIZE, 0)
+            else:
+                start, end = params['CopySourceRange'].split('=', 1)[1].split('-')
+                size = int(end) - int(start) + 1
+            with self._lock:
+                self._parts.setdefault(params['UploadId'], {})[params['PartNumber']] = size
+        elif operation == 'AbortMultipartUpload':
+            with self._lock:
+                self._parts.pop(params['UploadId'], None)
+        elif operation in ('PutObject', 'CompleteMultipartUpload', 'CopyObject'):
+            key, storage_class = params['Key'], params.get('StorageClass', 'STANDARD')
+            if operation == 'PutObject':
+                size, etag = context.get(_SIZE), parsed.get('ETag')
+            elif operation == 'CompleteMultipartUpload':
+                with self._lock:
+                    parts = self._parts.pop(params['UploadId'], None)
+                size, etag = sum(parts.values()) if parts else None, parsed.get('ETag')
+            else:
+                source = params['CopySource']
+                if isinstance(source, str):
+                    source = dict(zip(('Bucket', 'Key'), source.lstrip('/').split('/', 1)))
+                copied = self.get(source['Bucket'], source['Key'])
+                size, etag = copied.size if copied else None, parsed.get('CopyObjectResult', {}).get('ETag')
+            if size is None or etag is None:
+                self._mark(bucket, key)
+            else:
+                self.put(bucket, key, size, etag.strip('"'), _response_time(http_response, self._clock),
+                         storage_class)
+
+
+def _response_time(http_response, clock):
+    """Return the time of a response (its Date header), or the current time."""
+    from email.utils import parsedate_to_datetime
+
+    date = http_response.headers.get('Date') if http_response is not None else None
+    try:
+        return parsedate_to_datetime(date).timestamp() if date else clock()
+    except (TypeError, ValueError):
+        return clock()
+
+
+def load_index(index=None):
+    """
+    Resolve the `index` argument of an S3 object.
+
+    :param index: None/False to disable the index, True for the default location, a database path or a KeyIndex
+    :return: KeyIndex or None
+    """
+    return resolve_option(index, KeyIndex, KeyIndex)
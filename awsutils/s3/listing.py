@@ -0,0 +1,244 @@
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from heapq import merge
+from itertools import chain
+from queue import Full, Queue
+from threading import Event
+
+# Maximum number of keys returned by a ListObjectsV2 request
+PAGE_SIZE = 1000
+
+
+class ObjectRecord(namedtuple('ObjectRecord', ('key', 'size', 'last_modified', 'etag', 'storage_class'))):
+    """
+    Compact, immutable description of a listed S3 object.
+
+    Common prefixes ('directories') returned by delimited listings are records with
+    only a key (ending with the delimiter) and None for every other field.
+    """
+    __slots__ = ()
+
+    @property
+    def is_prefix(self):
+        """Determine if the record is a common prefix rather than an object."""
+        return self.size is None
+
+    @classmethod
+    def from_object(cls, obj):
+        """Create a record from a ListObjectsV2 'Contents' entry."""
+        return cls(obj['Key'], obj['Size'], obj['LastModified'], obj.get('ETag', '').strip('"'),
+                   obj.get('StorageClass'))
+
+    @classmethod
+    def from_prefix(cls, prefix):
+        """Create a record from a ListObjectsV2 'CommonPrefixes' entry."""
+        return cls(prefix['Prefix'], None, None, None, None)
+
+
+def iter_pages(client, bucket, prefix='', delimiter=None, start_after=None, page_size=PAGE_SIZE):
+    """
+    Lazily iterate over the ListObjectsV2 response pages of a prefix.
+
+    Only one page is requested at a time, the next page is requested once the
+    previous one has been consumed.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param prefix: Key prefix
+    :param delimiter: Group keys sharing a prefix up to the delimiter in to common prefixes
+    :param start_after: Only list keys that sort after this key
+    :param page_size: Maximum number of keys per request
+    :return: Generator of response dictionaries
+    """
+    kwargs = {'Bucket': bucket, 'Prefix': prefix, 'MaxKeys': page_size}
+    if delimiter:
+        kwargs['Delimiter'] = delimiter
+    if start_after:
+        kwargs['StartAfter'] = start_after
+    while True:
+        page = client.list_objects_v2(**kwargs)
+        yield page
+        if not page.get('IsTruncated'):
+            return
+        kwargs['ContinuationToken'] = page['NextContinuationToken']
+
+
+def iter_objects_page(page):
+    """Yield the ObjectRecords of a ListObjectsV2 response page in key order."""
+    objects = (ObjectRecord.from_object(obj) for obj in page.get('Contents', ()))
+    if 'CommonPrefixes' in page:
+        prefixes = (ObjectRecord.from_prefix(common) for common in page['CommonPrefixes'])
+        return merge(objects, prefixes, key=lambda record: record.key)
+    return objects
+
+
+def iter_objects(client, bucket, prefix='', delimiter=None, start_after=None, page_size=PAGE_SIZE):
+    """
+    Lazily iterate over the objects (and common prefixes) of a prefix in key order.
+
+    Memory use is bounded by a single page regardless of the number of keys.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param prefix: Key prefix
+    :param delimiter: Group keys sharing a prefix up to the delimiter in to common prefixes
+    :param start_after: Only list keys that sort after this key
+    :param page_size: Maximum number of keys per request
+    :return: Generator of ObjectRecord
+    """
+    for page in iter_pages(client, bucket, prefix, delimiter, start_after, page_size):
+        yield from iter_objects_page(page)
+
+# Split points used to shard a flat key space in to key ranges (in S3's UTF-8 byte order)
+RANGE_BOUNDARIES = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+_DONE = object()
+
+
+class Shard(namedtuple('Shard', ('prefix', 'start_after', 'last'))):
+    """A contiguous key range listed by one worker: keys under prefix, after start_after and up to last."""
+    __slots__ = ()
+
+
+def range_shards(prefix='', shards=16, start_after=None, boundaries=RANGE_BOUNDARIES):
+    """
+    Split the keys under a prefix in to contiguous key ranges.
+
+    Ranges are (boundary[i], boundary[i + 1]] so that every key belongs to exactly one
+    range, whatever characters the keys contain.
+
+    :param prefix: Key prefix
+    :param shards: Number of ranges to create (capped by the number of boundaries + 1)
+    :param start_after: Only cover keys that sort after this key
+    :param boundaries: Characters, appended to the prefix, that ranges are split at
+    :return: List of Shard
+    """
+    step = max(1, len(boundaries) / max(1, shards - 1))
+    splits = sorted({prefix + boundaries[int(i * step)] for i in range(min(shards - 1, len(boundaries)))})
+    if start_after:
+        splits = [split for split in splits if split > start_after]
+    lows = [start_after] + splits
+    return [Shard(prefix, low, high) for low, high in zip(lows, splits + [None])]
+
+
+def discover_shards(client, bucket, prefix='', strategy='auto', start_after=None, page_size=PAGE_SIZE, shards=16,
+                    delimiter='/'):
+    """
+    Split the listing of a prefix in to Shards that can be listed independently.
+
+    Keys directly under the prefix, found while looking for its 'folders', are
+    generated as ObjectRecords in between the Shards.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param prefix: Key prefix
+    :param strategy: 'auto', 'prefix' or 'range' (see iter_objects_parallel)
+    :param start_after: Only cover keys that sort after this key
+    :param page_size: Maximum number of keys per request
+    :param shards: Number of key ranges used by the 'range' strategy
+    :param delimiter: Delimiter of the 'folders' used by the 'prefix' strategy
+    :return: Generator of ObjectRecord and Shard, in key order
+    """
+    assert strategy in ('auto', 'prefix', 'range'), 'ERROR: Invalid listing strategy ({0})'.format(strategy)
+    if strategy in ('auto', 'prefix'):
+        pages = iter_pages(client, bucket, prefix, delimiter, None, page_size)
+        page = next(pages)
+        if strategy == 'prefix' or len(page.get('CommonPrefixes', ())) > 1:
+            for page in chain([page], pages):
+                for record in iter_objects_page(page):
+                    if record.is_prefix:
+                        # Skip 'folders' whose keys all sort before start_after
+                        if not start_after or start_after.startswith(record.key) or start_after < record.key:
+                            yield Shard(record.key, start_after, None)
+                    elif not start_after or record.key > start_after:
+                        yield record
+            return
+    yield from range_shards(prefix, shards, start_after)
+
+
+def _put(queue, item, stop):
+    """Put an item on a bounded queue, giving up if the listing was stopped."""
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def _list_shard(client, bucket, shard, page_size, queue, stop):
+    """Worker: list a shard and put its pages of records on a queue, followed by _DONE or an exception."""
+    try:
+        for page in iter_pages(client, bucket, shard.prefix, None, shard.start_after, page_size):
+            records = [ObjectRecord.from_object(obj) for obj in page.get('Contents', ())]
+            finished = shard.last is not None and records and records[-1].key > shard.last
+            if finished:
+                records = [record for record in records if record.key <= shard.last]
+            if not _put(queue, records, stop) or finished:
+                break
+        _put(queue, _DONE, stop)
+    except Exception as error:
+        _put(queue, error, stop)
+
+
+def iter_objects_parallel(client, bucket, prefix='', concurrency=8, strategy='auto', start_after=None,
+                          page_size=PAGE_SIZE, buffer_pages=16, shards=None):
+    """
+    List every object under a prefix with concurrent, sharded ListObjectsV2 requests.
+
+    The key space is sharded either by the 'folders' found with a delimiter query
+    (strategy='prefix') or in to key ranges listed with StartAfter (strategy='range').
+    'auto' uses the folders when the prefix fans out and key ranges otherwise.
+    Shards are listed on a thread pool, at most `concurrency` at a time, and their
+    records are streamed back in key order.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param prefix: Key prefix
+    :param concurrency: Maximum number of shards listed at the same time
+    :param strategy: 'auto', 'prefix' or 'range'
+    :param start_after: Only list keys that sort after this key
+    :param page_size: Maximum number of keys per request
+    :param buffer_pages: Maximum number of pages buffered per shard ahead of the consumer
+    :param shards: Number of key ranges used by the 'range' strategy, defaults to 4 * concurrency
+    :return: Generator of ObjectRecord
+    """
+    assert strategy in ('auto', 'prefix', 'range'), 'ERROR: Invalid listing strategy ({0})'.format(strategy)
+    segments = discover_shards(client, bucket, prefix, strategy, start_after, page_size, shards or 4 * concurrency)
+    stop = Event()
+    window = deque()
+    executor = ThreadPoolExecutor(concurrency)
+
+    def fill():
+        # Keep `concurrency` shards in flight ahead of the shard being consumed
+        in_flight = sum(1 for segment in window if not isinstance(segment, ObjectRecord))
+        while in_flight < concurrency and len(window) < page_size:
+            segment = next(segments, None)
+            if segment is None:
+                return
+            if isinstance(segment, Shard):
+                queue = Queue(buffer_pages)
+                executor.submit(_list_shard, client, bucket, segment, page_size, queue, stop)
+                segment = queue
+                in_flight += 1
+            window.append(segment)
+
+    try:
+        fill()
+        while window:
+            segment = window.popleft()
+            if isinstance(segment, ObjectRecord):
+                yield segment
+            else:
+                while True:
+                    item = segment.get()
+                    if item is _DONE:
+                        break
+                    elif isinstance(item, Exception):
+                        raise item
+                    yield from item
+            fill()
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
@@ -0,0 +1,136 @@
+import os
+import time
+from collections import namedtuple
+from threading import Lock
+
+from awsutils.s3.helpers import resolve_option
+
+# Number of seconds after which a sync pair is fully reconciled (both sides listed) again
+RECONCILE_INTERVAL = 24 * 60 * 60
+
+# Default location of the manifest database
+DEFAULT_MANIFEST = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                                'awsutils-s3', 'sync-manifest.sqlite')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pairs (
+    pair TEXT PRIMARY KEY,
+    reconciled REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    pair TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    etag TEXT,
+    PRIMARY KEY (pair, path)
+) WITHOUT ROWID;
+"""
+
+
+class ManifestEntry(namedtuple('ManifestEntry', ('path', 'size', 'mtime', 'etag'))):
+    """
+    State of a file when it was last synced.
+
+    path is relative to the sync pair's directory ('/' separated), size and mtime are
+    those of the local file and etag that of the object (None when unknown).
+    """
+    __slots__ = ()
+
+
+def sync_pair(local_path, bucket, remote_path, remote_source=False):
+    """Build the identifier of a sync pair (a local directory, a bucket path and a direction)."""
+    return '{0} {1} s3://{2}/{3}'.format(os.path.abspath(local_path), '<-' if remote_source else '->', bucket,
+                                         remote_path)
+
+
+class SyncManifest:
+    def __init__(self, path=DEFAULT_MANIFEST, reconcile_interval=RECONCILE_INTERVAL, clock=time.time):
+        """
+        Persistent (SQLite) record of the files of each sync pair as of their last sync.
+
+        Incremental syncs diff one side against the manifest instead of listing
+        (or walking) both sides, the manifest is rebuilt from a full comparison
+        every reconcile_interval seconds to catch changes made outside of sync.
+
+        :param path: Path of the SQLite database (':memory:' for a throwaway manifest)
+        :param reconcile_interval: Number of seconds after which a pair is fully reconciled again
+        :param clock: Function returning the current time in seconds
+        """
+        import sqlite3
+
+        self.path = path
+        self.reconcile_interval = reconcile_interval
+        self._clock = clock
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+        self._lock = Lock()
+
+    def __repr__(self):
+        return '<SyncManifest {0}>'.format(self.path)
+
+    def close(self):
+        self._connection.close()
+
+    def needs_reconcile(self, pair):
+        """Determine if a pair has never been synced or was last reconciled more than reconcile_interval ago."""
+        with self._lock:
+            row = self._connection.execute('SELECT reconciled FROM pairs WHERE pair = ?', (pair,)).fetchone()
+        return row is None or row[0] + self.reconcile_interval <= self._clock()
+
+    def iter_entries(self, pair, batch_size=1000):
+        """Lazily generate a pair's entries in path order (SQLite's binary collation matches S3's key order)."""
+        with self._lock:
+            cursor = self._connection.execute(
+                'SELECT path, size, mtime, etag FROM entries WHERE pair = ? ORDER BY path', (pair,))
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield ManifestEntry(*row)
+
+    def entries(self, pair):
+        """Retrieve a dictionary of path: ManifestEntry of a pair."""
+        return {entry.path: entry for entry in self.iter_entries(pair)}
+
+    def update(self, pair, entries=(), removed=()):
+        """
+        Record the outcome of a sync.
+
+        :param pair: Sync pair identifier
+        :param entries: Iterable of ManifestEntry for files that were transferred (or found in sync)
+        :param removed: Iterable of paths that no longer exist on either side
+        """
+        with self._lock, self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                                         ((pair,) + tuple(entry) for entry in entries))
+            self._connection.executemany('DELETE FROM entries WHERE pair = ? AND path = ?',
+                                         ((pair, path) for path in removed))
+
+    def replace(self, pair, entries):
+        """Replace every entry of a pair after a full reconcile and reset its reconcile timer."""
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM entries WHERE pair = ?', (pair,))
+            self._connection.executemany('INSERT INTO entries VALUES (?, ?, ?, ?, ?)',
+                                         ((pair,) + tuple(entry) for entry in entries))
+            self._connection.execute('INSERT OR REPLACE INTO pairs VALUES (?, ?)', (pair, self._clock()))
+
+    def forget(self, pair):
+        """Remove a pair so that its next sync is a full reconcile."""
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM entries WHERE pair = ?', (pair,))
+            self._connection.execute('DELETE FROM pairs WHERE pair = ?', (pair,))
+
+
+def load_manifest(manifest=None):
+    """
+    Resolve the `manifest` argument of a sync.
+
+    :param manifest: None/False for a stateless sync, True for the default manifest, a database path or a SyncManifest
+    :return: SyncManifest or None
+    """
+    return resolve_option(manifest, SyncManifest, SyncManifest)
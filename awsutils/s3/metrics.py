@@ -0,0 +1,331 @@
+import time
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock
+from types import GeneratorType
+
+from awsutils.s3.helpers import resolve_option
+
+# Upper bounds (seconds) of the operation latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# Error codes S3 uses to ask clients to slow down
+THROTTLE_CODES = ('SlowDown', 'Throttling', 'ThrottlingException', 'RequestLimitExceeded', 'TooManyRequests',
+                  'RequestThrottled', 'ServiceUnavailable')
+
+# S3 methods timed by Metrics.instrument
+INSTRUMENTED_METHODS = ('list', 'iter_list', 'glob', 'copy', 'move', 'exists', 'exists_many', 'head_many', 'delete',
+                        'delete_many', 'upload', 'upload_stream', 'download', 'read_range', 'open', 'iter_lines',
+                        'sync', 'plan_sync', 'create_bucket', 'delete_bucket', 'pre_sign', 'pre_sign_many',
+                        'is_acceleration_enabled', 'build_index', 'refresh_index', 'du')
+
+
+class OperationEvent(namedtuple('OperationEvent', ('method', 'seconds', 'error'))):
+    """A completed S3 method call: its name, duration and the exception it raised (or None)."""
+    __slots__ = ()
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Histogram of observed values with fixed bucket upper bounds.
+
+        :param buckets: Sorted bucket upper bounds, an implicit +Inf bucket is added
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Return (upper bound, cumulative count) tuples, the last bound being float('inf')."""
+        total, counts = 0, []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            counts.append((bound, total))
+        return counts
+
+
+class Metrics:
+    def __init__(self, buckets=LATENCY_BUCKETS, clock=time.perf_counter):
+        """
+        Registry of the method latencies and request, retry, throttle and byte counts of S3 objects.
+
+        Listeners (see `add_listener`) receive an OperationEvent per method call.
+
+        :param buckets: Latency histogram bucket upper bounds in seconds
+        :param clock: Function returning a monotonic time in seconds
+        """
+        self._buckets = buckets
+        self._clock = clock
+        self._lock = Lock()
+        self.latency = defaultdict(lambda: Histogram(self._buckets))
+        self.errors = defaultdict(int)
+        self.in_flight = defaultdict(int)
+        self.requests = defaultdict(int)
+        self.retries = defaultdict(int)
+        self.throttles = defaultdict(int)
+        self.bytes_sent = defaultdict(int)
+        self.bytes_received = defaultdict(int)
+        self.requests_in_flight = 0
+        self.listeners = []
+        # Request context flag of the requests counted in requests_in_flight
+        self._key = 'awsutils-s3-metrics-{0}'.format(id(self))
+
+    def __repr__(self):
+        return '<Metrics {0} operations, {1} requests>'.format(
+            sum(histogram.count for histogram in self.latency.values()), sum(self.requests.values()))
+
+    def add_listener(self, listener):
+        """Call listener(OperationEvent) after every instrumented method call."""
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def reset(self):
+        """Clear every recorded value (listeners are kept)."""
+        with self._lock:
+            for values in (self.latency, self.errors, self.in_flight, self.requests, self.retries, self.throttles,
+                           self.bytes_sent, self.bytes_received):
+                values.clear()
+            self.requests_in_flight = 0
+
+    def record(self, method, seconds, error=None):
+        """Record a completed method call and notify the listeners."""
+        with self._lock:
+            self.latency[method].observe(seconds)
+            if error is not None:
+                self.errors[method] += 1
+        if self.listeners:
+            event = OperationEvent(method, seconds, error)
+            for listener in self.listeners:
+                listener(event)
+
+    def instrument(self, s3, methods=INSTRUMENTED_METHODS):
+        """
+        Time the methods of an S3 object.
+
+        The timed methods are set on the instance, so S3 objects that are not
+        instrumented run the class' methods without any overhead.  Generators
+        (e.g. iter_list) are timed until they are exhausted or closed.
+
+        :param s3: S3 object
+        :param methods: Names of the methods to time
+        :return: s3
+        """
+        for name in methods:
+            setattr(s3, name, self.timed(name, getattr(s3, name)))
+        return s3
+
+    def timed(self, name, function):
+        """Wrap a function so that its calls are recorded under name."""
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with self._lock:
+                self.in_flight[name] += 1
+            start = self._clock()
+            try:
+                result = function(*args, **kwargs)
+            except BaseException as e:
+                self.record(name, self._clock() - start, e)
+                raise
+            finally:
+                with self._lock:
+                    # Calls started before a reset are not counted below zero
+                    if self.in_flight[name] > 0:
+                        self.in_flight[name] -= 1
+            if isinstance(result, GeneratorType):
+                return self._timed_generator(name, result, start)
+            self.record(name, self._clock() - start)
+            return result
+        return wrapper
+
+    def _timed_generator(self, name, generator, start):
+        error = None
+        try:
+            yield from generator
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.record(name, self._clock() - start, error)
+
+    def instrument_client(self, client):
+        """Count the requests sent by a botocore client (registering the same Metrics twice is a no-op)."""
+        events = client.meta.events
+        unique = self._key + '-'
+        events.register('before-send.s3', self._before_send, unique_id=unique + 'before-send')
+        events.register('response-received.s3', self._response_received, unique_id=unique + 'response-received')
+        events.register('after-call-error.s3', self._after_call_error, unique_id=unique + 'after-call-error')
+        return client
+
+    def _before_send(self, request, event_name, **kwargs):
+        operation = event_name.rsplit('.', 1)[-1]
+        attempt = request.context.get('retries', {}).get('attempt', 1)
+        with self._lock:
+            self.requests[operation] += 1
+            self.requests_in_flight += 1
+            request.context[self._key] = True
+            if attempt > 1:
+                self.retries[operation] += 1
+            self.bytes_sent[operation] += _body_size(request)
+
+    def _response_received(self, event_name, response_dict=None, parsed_response=None, context=None, **kwargs):
+        operation = event_name.rsplit('.', 1)[-1]
+        error = (parsed_response or {}).get('Error', {}).get('Code')
+        status = (response_dict or {}).get('status_code')
+        with self._lock:
+            self._answered(context)
+            if error in THROTTLE_CODES or status in (429, 503):
+                self.throttles[operation] += 1
+            elif response_dict is not None:
+                self.bytes_received[operation] += int(response_dict['headers'].get('Content-Length') or 0)
+
+    def _after_call_error(self, context=None, **kwargs):
+        # Requests that failed without a response-received event (e.g. connection errors of older botocore releases)
+        with self._lock:
+            self._answered(context)
+
+    def _answered(self, context):
+        """Remove the request of a context from requests_in_flight, once (callers hold the lock)."""
+        if context is not None and context.pop(self._key, False):
+            # Requests sent before a reset are not counted below zero
+            self.requests_in_flight = max(0, self.requests_in_flight - 1)
+
+    def to_prometheus(self, namespace='awsutils_s3'):
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        :param namespace: Prefix of the metric names
+        :return: String
+        """
+        lines = []
+
+        def family(name, kind, description, samples):
+            lines.append('# HELP {0}_{1} {2}'.format(namespace, name, description))
+            lines.append('# TYPE {0}_{1} {2}'.format(namespace, name, kind))
+            for suffix, labels, value in samples:
+                label = ','.join('{0}="{1}"'.format(key, text) for key, text in labels)
+                lines.append('{0}_{1}{2}{3} {4}'.format(namespace, name, suffix, '{' + label + '}' if label else '',
+                                                        _number(value)))
+
+        with self._lock:
+            histograms = sorted(self.latency.items())
+            family('operation_seconds', 'histogram', 'Duration of S3 method calls.', [
+                sample for method, histogram in histograms for sample in
+                [('_bucket', (('method', method), ('le', _number(bound))), count)
+                 for bound, count in histogram.cumulative()] +
+                [('_sum', (('method', method),), histogram.sum), ('_count', (('method', method),), histogram.count)]])
+            for name, kind, description, values, label in (
+                    ('operation_errors_total', 'counter', 'S3 method calls that raised.', self.errors, 'method'),
+                    ('operations_in_flight', 'gauge', 'S3 method calls in progress.', self.in_flight, 'method'),
+                    ('requests_total', 'counter', 'HTTP requests sent.', self.requests, 'operation'),
+                    ('retries_total', 'counter', 'HTTP requests that were retries.', self.retries, 'operation'),
+                    ('throttles_total', 'counter', 'Throttled (SlowDown, 503) responses.', self.throttles,
+                     'operation'),
+                    ('sent_bytes_total', 'counter', 'Request body bytes sent.', self.bytes_sent, 'operation'),
+                    ('received_bytes_total', 'counter', 'Response body bytes received.', self.bytes_received,
+                     'operation')):
+                family(name, kind, description, [('', ((label, key),), value) for key, value in sorted(values.items())])
+            family('requests_in_flight', 'gauge', 'HTTP requests in progress.', [('', (), self.requests_in_flight)])
+        return '\n'.join(lines) + '\n'
+
+
+def _body_size(request):
+    """Return the size of a request's payload (aws-chunked bodies carry it in a separate header)."""
+    size = request.headers.get('X-Amz-Decoded-Content-Length') or request.headers.get('Content-Length')
+    if size is None and isinstance(request.body, (bytes, bytearray)):
+        return len(request.body)
+    return int(size or 0)
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def serve_prometheus(metrics, port=9108, address=''):
+    """
+    Serve the metrics for Prometheus to scrape from a daemon thread.
+
+    :param metrics: Metrics
+    :param port: Port to listen on
+    :param address: Address to bind, all interfaces by default
+    :return: HTTPServer (call shutdown() to stop it)
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from threading import Thread
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((address, port), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class ProfileResult:
+    """Holder of the pstats.Stats of a `profiled` block, available once the block exits."""
+    stats = None
+
+
+@contextmanager
+def profiled(sort='cumulative', limit=None, stream=None):
+    """
+    Profile the S3 operations run in a block with cProfile.
+
+    Usage:
+        with profiled(limit=20, stream=sys.stderr) as profile:
+            s3.sync('local', 'remote')
+        profile.stats.dump_stats('sync.prof')
+
+    :param sort: pstats sort key
+    :param limit: Number of entries printed to stream when the block exits
+    :param stream: Stream the statistics are printed to, nothing is printed by default
+    :return: ProfileResult
+    """
+    import cProfile
+    import pstats
+
+    result = ProfileResult()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        result.stats = pstats.Stats(profiler, stream=stream).sort_stats(sort)
+        if stream is not None:
+            result.stats.print_stats(*([limit] if limit else []))
+
+
+# Registry shared by the S3 objects created with metrics=True
+default_metrics = Metrics()
+
+
+def load_metrics(metrics=None):
+    """
+    Resolve the `metrics` argument of an S3 object.
+
+    :param metrics: None/False to disable instrumentation, True for the shared default registry or a Metrics
+    :return: Metrics or None
+    """
+    return resolve_option(metrics, lambda: default_metrics)
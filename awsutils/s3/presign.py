@@ -0,0 +1,113 @@
+import hashlib
+import hmac
+from datetime import datetime, timezone
+from threading import Lock
+from urllib.parse import parse_qs, quote, urlsplit
+
+SIGV4_TIMESTAMP = '%Y%m%dT%H%M%SZ'
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+
+
+def _sign(key, msg):
+    return hmac.new(key, msg.encode('utf-8'), hashlib.sha256).digest()
+
+
+class Presigner:
+    def __init__(self, client, bucket, credentials=None):
+        """
+        Local SigV4 presigned URL generator.
+
+        Produces the same URLs as botocore's `generate_presigned_url('get_object', ...)`
+        with signature_version='s3v4', without a request/event pipeline per URL.  The
+        bucket's endpoint and signing scope are resolved once through botocore and
+        the derived signing key is cached per day/region/service.
+
+        :param client: botocore S3 client configured with signature_version='s3v4'
+        :param bucket: S3 bucket name
+        :param credentials: botocore Credentials, defaults to the client's credentials
+        """
+        self.client = client
+        self.bucket = bucket
+        self._credentials = credentials
+        self._endpoint = None
+        self._signing_keys = {}
+        self._lock = Lock()
+
+    @property
+    def credentials(self):
+        """Retrieve the credentials used to sign, refreshed by botocore when they expire."""
+        if self._credentials is None:
+            self._credentials = self.client._request_signer._credentials
+        return self._credentials
+
+    @property
+    def endpoint(self):
+        """Retrieve the (scheme://host, path prefix, region, service) of the bucket's presigned URLs."""
+        if self._endpoint is None:
+            url = urlsplit(self.client.generate_presigned_url('get_object', Params={'Bucket': self.bucket, 'Key': 'k'}))
+            scope = parse_qs(url.query)['X-Amz-Credential'][0].split('/')
+            self._endpoint = ('{0}://{1}'.format(url.scheme, url.netloc), url.netloc, url.path[:-1], scope[2], scope[3])
+        return self._endpoint
+
+    def signing_key(self, secret_key, date, region, service):
+        """Retrieve the SigV4 signing key derived from a secret key for a day, region and service."""
+        cache_key = (secret_key, date, region, service)
+        key = self._signing_keys.get(cache_key)
+        if key is None:
+            key = _sign(_sign(_sign(_sign(('AWS4' + secret_key).encode('utf-8'), date), region), service),
+                        'aws4_request')
+            with self._lock:
+                # Keys for previous days are never needed again
+                self._signing_keys = {k: v for k, v in self._signing_keys.items() if k[1] == date}
+                self._signing_keys[cache_key] = key
+        return key
+
+    def pre_sign(self, remote_path, expiration=3600, now=None):
+        """
+        Generate a pre-signed GET URL for an S3 object.
+
+        :param remote_path: Path to S3 object relative to bucket root
+        :param expiration: Number of seconds until the pre-signed URL expires
+        :param now: Signing time (UTC datetime), defaults to the current time
+        :return: Pre-signed URL
+        """
+        return self.pre_sign_many([remote_path], expiration, now)[0]
+
+    def pre_sign_many(self, remote_paths, expiration=3600, now=None):
+        """
+        Generate pre-signed GET URLs for many S3 objects.
+
+        Credentials are frozen and the signing key is derived once for the whole batch.
+
+        :param remote_paths: Iterable of paths to S3 objects relative to bucket root
+        :param expiration: Number of seconds until the pre-signed URLs expire
+        :param now: Signing time (UTC datetime), defaults to the current time
+        :return: List of pre-signed URLs, in the same order as remote_paths
+        """
+        base, host, path_prefix, region, service = self.endpoint
+        credentials = self.credentials.get_frozen_credentials()
+        timestamp = (now or datetime.now(timezone.utc)).strftime(SIGV4_TIMESTAMP)
+        scope = '{0}/{1}/{2}/aws4_request'.format(timestamp[:8], region, service)
+        signing_key = self.signing_key(credentials.secret_key, timestamp[:8], region, service)
+
+        # Every URL of the batch shares the same query string, only the path and signature differ
+        query = [('X-Amz-Algorithm', 'AWS4-HMAC-SHA256'),
+                 ('X-Amz-Credential', '{0}/{1}'.format(credentials.access_key, scope)),
+                 ('X-Amz-Date', timestamp),
+                 ('X-Amz-Expires', str(expiration)),
+                 ('X-Amz-SignedHeaders', 'host')]
+        if credentials.token is not None:
+            query.append(('X-Amz-Security-Token', credentials.token))
+        query = ['{0}={1}'.format(name, quote(value, safe='-_.~')) for name, value in query]
+        query_string = '&'.join(query)
+        canonical_tail = '\n{0}\nhost:{1}\n\nhost\n{2}'.format('&'.join(sorted(query)), host, UNSIGNED_PAYLOAD)
+        string_to_sign = 'AWS4-HMAC-SHA256\n{0}\n{1}\n'.format(timestamp, scope)
+
+        urls = []
+        for remote_path in remote_paths:
+            path = path_prefix + quote(remote_path, safe='/~')
+            canonical_request = 'GET\n' + path + canonical_tail
+            signature = hmac.new(signing_key, (string_to_sign + hashlib.sha256(
+                canonical_request.encode('utf-8')).hexdigest()).encode('utf-8'), hashlib.sha256).hexdigest()
+            urls.append('{0}{1}?{2}&X-Amz-Signature={3}'.format(base, path, query_string, signature))
+        return urls
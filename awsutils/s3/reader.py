@@ -0,0 +1,216 @@
+import io
+
+from awsutils.s3.transfer import MB, STREAM_CHUNK_SIZE, as_readable, read_into
+
+# Minimum number of bytes requested by each ranged GET of an open object
+READ_AHEAD = MB
+
+# Size of the buffer of small reads (and readline) in front of an open object
+BUFFER_SIZE = 64 * 1024
+
+
+def range_header(start=0, end=None):
+    """
+    Build an HTTP Range header from Python slice style offsets.
+
+    :param start: First byte, a negative start selects the last -start bytes
+    :param end: Byte after the last one (exclusive), defaults to the end of the object
+    :return: Range header value, e.g. 'bytes=0-99'
+    """
+    if start < 0:
+        assert end is None, 'ERROR: end can not be combined with a negative start'
+        return 'bytes={0}'.format(start)
+    return 'bytes={0}-{1}'.format(start, '' if end is None else end - 1)
+
+
+def _get_range(client, bucket, key, start, end, etag=None):
+    """Request a byte range of an object and return its streaming body, or None if the range is empty."""
+    from botocore.exceptions import ClientError
+    kwargs = {'Bucket': bucket, 'Key': key, 'Range': range_header(start, end)}
+    if etag:
+        kwargs['IfMatch'] = '"{0}"'.format(etag)
+    try:
+        return client.get_object(**kwargs)['Body']
+    except ClientError as error:
+        # The range starts at or after the end of the object
+        if error.response.get('Error', {}).get('Code') == 'InvalidRange':
+            return None
+        raise
+
+
+def read_range(client, bucket, key, start=0, end=None, buffer=None):
+    """
+    Read a byte range of an object without downloading the rest of it.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param key: Object key
+    :param start: First byte, a negative start reads the last -start bytes (e.g. the tail of a log)
+    :param end: Byte after the last one (exclusive), defaults to the end of the object
+    :param buffer: Writable buffer (e.g. a bytearray) to read in to instead of returning bytes,
+        at most len(buffer) bytes are read (with a negative start it must hold the -start bytes)
+    :return: Bytes read, or the number of bytes read in to buffer
+    """
+    assert buffer is None or start >= 0 or len(buffer) >= -start, \
+        'ERROR: buffer of {0} bytes can not hold the last {1} bytes'.format(len(buffer or ()), -start)
+    if buffer is not None and start >= 0:
+        end = start + len(buffer) if end is None else min(end, start + len(buffer))
+    if end is not None and end <= start:
+        return b'' if buffer is None else 0
+
+    body = _get_range(client, bucket, key, start, end)
+    if body is None:
+        return b'' if buffer is None else 0
+    try:
+        if buffer is None:
+            return body.read()
+        return read_into(as_readable(body), memoryview(buffer).cast('B'))
+    finally:
+        body.close()
+
+
+class ObjectReader(io.RawIOBase):
+    def __init__(self, client, bucket, key, read_ahead=READ_AHEAD):
+        """
+        Seekable, read-only raw file object over an S3 object.
+
+        Reads are served from a ranged GET of at least read_ahead bytes that is
+        kept open, so consecutive reads (and short forward seeks) are coalesced
+        in to the same request instead of one request per read.  Every request is
+        made with If-Match on the ETag found when the object was opened.
+
+        :param client: botocore S3 client
+        :param bucket: Bucket name
+        :param key: Object key
+        :param read_ahead: Minimum number of bytes requested at a time
+        """
+        super(ObjectReader, self).__init__()
+        head = client.head_object(Bucket=bucket, Key=key)
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.size = head['ContentLength']
+        self.etag = head.get('ETag', '').strip('"')
+        self.read_ahead = read_ahead
+        self.requests = 0
+        self._position = 0
+        self._body = None
+        self._body_position = 0
+        self._body_end = 0
+
+    def __repr__(self):
+        return '<ObjectReader s3://{0}/{1} size={2}>'.format(self.bucket, self.key, self.size)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        position = (0, self._position, self.size)[whence] + offset
+        if position < 0:
+            raise ValueError('negative seek position {0}'.format(position))
+        self._position = position
+        return position
+
+    def _close_body(self):
+        if self._body is not None:
+            self._body.close()
+            self._body = None
+
+    def _skip(self, size):
+        """Discard bytes of the open request, cheaper than a new request for short forward seeks."""
+        while size:
+            data = self._body.read(min(size, STREAM_CHUNK_SIZE))
+            if not data:
+                raise IOError('ERROR: s3://{0}/{1} ended early'.format(self.bucket, self.key))
+            self._body_position += len(data)
+            size -= len(data)
+
+    def readinto(self, buffer):
+        if self._position >= self.size:
+            return 0
+        if self._body is not None and self._body_position < self._position < self._body_end and \
+                self._position - self._body_position <= self.read_ahead:
+            self._skip(self._position - self._body_position)
+        if self._body is None or self._body_position != self._position or self._body_position >= self._body_end:
+            self._close_body()
+            end = min(self.size, self._position + max(len(buffer), self.read_ahead))
+            self._body = _get_range(self.client, self.bucket, self.key, self._position, end, self.etag)
+            self.requests += 1
+            if self._body is None:
+                raise IOError('ERROR: s3://{0}/{1} ended early'.format(self.bucket, self.key))
+            self._body_position, self._body_end = self._position, end
+
+        view = memoryview(buffer).cast('B')
+        size = min(len(view), self._body_end - self._body_position)
+        data = self._body.read(size)
+        if not data and size:
+            raise IOError('ERROR: s3://{0}/{1} ended early'.format(self.bucket, self.key))
+        view[:len(data)] = data
+        self._body_position += len(data)
+        self._position += len(data)
+        if self._body_position >= self._body_end:
+            self._close_body()
+        return len(data)
+
+    def close(self):
+        self._close_body()
+        super(ObjectReader, self).close()
+
+
+def open_object(client, bucket, key, mode='rb', read_ahead=READ_AHEAD, buffer_size=BUFFER_SIZE, encoding=None):
+    """
+    Open an S3 object as a seekable, read-only file object.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param key: Object key
+    :param mode: 'rb' for a binary file object or 'r' for a text file object
+    :param read_ahead: Minimum number of bytes requested at a time
+    :param buffer_size: Size of the buffer of small reads
+    :param encoding: Text encoding of mode 'r', defaults to UTF-8
+    :return: io.BufferedReader (or io.TextIOWrapper for mode 'r')
+    """
+    assert mode in ('rb', 'r'), 'ERROR: Invalid mode ({0}), objects can only be opened with "rb" or "r"'.format(mode)
+    reader = io.BufferedReader(ObjectReader(client, bucket, key, read_ahead), buffer_size)
+    return reader if mode == 'rb' else io.TextIOWrapper(reader, encoding=encoding or 'utf-8')
+
+
+def iter_lines(client, bucket, key, chunk_size=MB, encoding=None, keepends=False):
+    """
+    Stream the lines of a newline-delimited object (e.g. JSON lines or a log) with a single request.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param key: Object key
+    :param chunk_size: Number of bytes read from the response at a time
+    :param encoding: Decode lines to str with this encoding, yields bytes when None
+    :param keepends: Keep the line endings
+    :return: Generator of lines
+    """
+    body = client.get_object(Bucket=bucket, Key=key)['Body']
+    try:
+        pending = b''
+        for chunk in iter(lambda: body.read(chunk_size), b''):
+            lines = (pending + chunk).splitlines(True)
+            pending = lines.pop() if not lines[-1].endswith((b'\n', b'\r')) else b''
+            # A '\r\n' may be split between two chunks
+            if lines and lines[-1].endswith(b'\r') and not pending:
+                pending = lines.pop()
+            for line in lines:
+                yield _line(line, encoding, keepends)
+        if pending:
+            yield _line(pending, encoding, keepends)
+    finally:
+        body.close()
+
+
+def _line(line, encoding, keepends):
+    if not keepends:
+        line = line.rstrip(b'\r\n')
+    return line if encoding is None else line.decode(encoding)
@@ -1,56 +1,75 @@
 import os
-from dirutility import SystemCommand
+import re
+from fnmatch import translate
 
+from awsutils.s3.backends import load_backend
+from awsutils.s3.bulk import CONCURRENCY, DELETE_CONCURRENCY
+from awsutils.s3.cache import load_cache
 from awsutils.s3.commands import S3Commands
-from awsutils.s3.url import url_validator, bucket_name, bucket_uri, bucket_url
-
-ACL = ('public-read', 'private', 'public-read-write')
-
-
-def assert_acl(acl):
-    """Validate an ACL value by confirming it is in the list of ACL options."""
-    assert acl in ACL, "ERROR: Invalid ACL parameter ({0})".format(', '.join("'{0}'".format(i) for i in ACL))
-    return True
-
-
-def remote_path_root(remote_path):
-    """Return a remote_path referring to the S3 bucket's root if not specified."""
-    if len(remote_path) > 0 and '.' not in os.path.basename(remote_path) and not remote_path.endswith('/'):
-        return '{0}/'.format(remote_path)
-    else:
-        return remote_path
-
-
-def is_recursive_needed(*uris, recursive_default):
-    """
-    Checks to see if a recursive flag is needed for a `copy` or `move` command.
-
-    If both URI's are not directories, original recursive value is returned.
-
-    :param uris: S3 URI's
-    :param recursive_default: Default value for recursive flag
-    :return: Bool, true if both are directories
-    """
-    return True if all('.' not in os.path.basename(uri) for uri in uris) else recursive_default
+from awsutils.s3.content_cache import load_download_cache
+from awsutils.s3.filters import literal_prefix
+from awsutils.s3.helpers import ACL, assert_acl, remote_path_root, is_recursive_needed
+from awsutils.s3.index import load_index
+from awsutils.s3.manifest import load_manifest
+from awsutils.s3.metrics import load_metrics
+from awsutils.s3.reader import BUFFER_SIZE, READ_AHEAD
+from awsutils.s3.throttle import load_retry
+from awsutils.s3.transfer import TransferConfig
+from awsutils.s3.usage import UsageAggregator
+from awsutils.s3.url import bucket_name, bucket_uri, bucket_url
+
+# Ways sync can decide whether a file changed
+SYNC_COMPARE = ('mtime', 'content')
 
 
 class S3:
-    def __init__(self, bucket, accelerate=False, quiet=False):
+    def __init__(self, bucket, accelerate=False, quiet=False, backend=None, cache=True, transfer_config=None,
+                 metrics=None, retry=None, index=None, download_cache=None):
         """
         AWS CLI S3 wrapper.
 
         https://docs.aws.amazon.com/cli/latest/reference/s3/
 
+        Operations are executed in-process with botocore by default, the `aws`
+        CLI subprocess implementation remains available with backend='cli'.
+
         :param bucket: S3 bucket name or S3 bucket url
         :param accelerate: Enable transfer acceleration
         :param quiet: When true, does not display the operations performed from the specified command
+        :param backend: Backend name ('botocore' or 'cli'), Backend subclass or instance
+        :param cache: Cache bucket metadata in the process-wide MetadataCache (True), a custom
+            MetadataCache instance or disable caching (False)
+        :param transfer_config: TransferConfig (part size, concurrency, memory cap) used by transfers
+        :param metrics: Record method latencies and request, retry, throttle and byte counts in a Metrics
+            registry (True for the shared default registry), disabled (and without overhead) by default
+        :param retry: Retry throttled and failed requests with an AdaptiveRetry policy that also rate limits
+            requests per bucket prefix (True for the policy shared by the process' S3 objects), botocore's
+            retries are used by default.  Only applies to the botocore backend.
+        :param index: Answer `list`, `iter_list`, `exists` and `glob` from a persistent KeyIndex of the prefixes
+            added with `build_index` (True for the default location, a database path or a KeyIndex), disabled
+            by default
+        :param download_cache: Serve single object downloads through a local ContentCache with LRU eviction and
+            ETag revalidation (True for the default directory, a directory or a ContentCache), disabled by default.
+            Not supported by the cli backend.
         """
         self.cmd = S3Commands()
 
         # Extract the bucket name from the url if bucket var is a url
-        self.bucket_name = bucket if not url_validator(bucket) else bucket_name(bucket)
-        self.accelerate = accelerate if accelerate and self.is_acceleration_enabled() else False
+        self.bucket_name = bucket if '://' not in bucket else bucket_name(bucket)
         self.quiet = quiet
+        self.cache = load_cache(cache)
+        self.transfer_config = transfer_config or TransferConfig()
+        self.metrics = load_metrics(metrics)
+        if self.metrics is not None:
+            self.metrics.instrument(self)
+        self.retry = load_retry(retry)
+        self.index = load_index(index)
+        self.accelerate = False
+        self.backend = load_backend(backend).bind(self)
+        assert download_cache is None or download_cache is False or self.backend.name != 'cli', \
+            'ERROR: download_cache is not supported by the cli backend'
+        self.download_cache = load_download_cache(download_cache)
+        self.accelerate = accelerate if accelerate and self.is_acceleration_enabled() else False
 
     @property
     def bucket_uri(self):
@@ -62,16 +81,36 @@ class S3:
         """Retrieve a url endpoint for a S3 bucket."""
         return bucket_url(self.bucket_name, self.accelerate)
 
+    @property
+    def client(self):
+        """Retrieve the botocore S3 client shared by this object's requests."""
+        return self.backend.client
+
+    def _cached(self, key, factory):
+        """Retrieve bucket metadata through the metadata cache (if enabled)."""
+        return self.cache.get_or_set(key, factory) if self.cache is not None else factory()
+
     @property
     def buckets(self):
-        """
-        List all available S3 buckets.
+        """List all available S3 buckets."""
+        return self._cached(('buckets',), lambda: self.backend.buckets)
 
-        Execute the `aws s3 ls` command and decode the output
-        """
-        return [out.rsplit(' ', 1)[-1] for out in SystemCommand(self.cmd.list())]
+    @property
+    def bucket_exists(self):
+        """Determine if the S3 bucket exists (and is visible to the account)."""
+        return self.bucket_name in self.buckets
+
+    @property
+    def region(self):
+        """Retrieve the region the S3 bucket resides in."""
+        return self._cached(('region', self.bucket_name), self.backend.bucket_region)
+
+    def invalidate_cache(self):
+        """Remove this bucket's metadata (and the bucket list) from the metadata cache."""
+        if self.cache is not None:
+            self.cache.invalidate(bucket=self.bucket_name)
 
-    def list(self, remote_path='', recursive=False, human_readable=False, summarize=False):
+    def list(self, remote_path='', recursive=False, human_readable=False, summarize=False, concurrency=None):
         """
         List files/folders in a S3 bucket path.
 
@@ -82,11 +121,90 @@ class S3:
         :param recursive: Recursively list files/folders
         :param human_readable: Displays file sizes in human readable format
         :param summarize: Displays summary information (number of objects, total size)
+        :param concurrency: List recursive listings in parallel shards with up to this many requests at once
         :return:
         """
-        return [out.rsplit(' ', 1)[-1] for out in
-                SystemCommand(self.cmd.list(uri='{0}/{1}'.format(self.bucket_uri, remote_path_root(remote_path)),
-                                            recursive=recursive, human_readable=human_readable, summarize=summarize))]
+        return self.backend.list(remote_path, recursive, human_readable, summarize, concurrency)
+
+    def iter_list(self, prefix='', recursive=False, delimiter=None, start_after=None, concurrency=None):
+        """
+        Lazily list the objects of a S3 bucket path.
+
+        Pages of up to 1000 keys are requested as the generator is consumed, so
+        memory use stays flat regardless of the number of keys under the prefix.
+
+        :param prefix: Key prefix (keys are returned in full, not relative to the prefix)
+        :param recursive: List every key under the prefix instead of grouping 'folders' by '/'
+        :param delimiter: Group keys in to common prefixes using a custom delimiter
+        :param start_after: Only list keys that sort after this key
+        :param concurrency: List recursive listings in parallel shards with up to this many requests at once,
+            records are still returned in key order
+        :return: Generator of ObjectRecord (key, size, last_modified, etag, storage_class) tuples
+        """
+        delimiter = delimiter or (None if recursive else '/')
+        index = self.backend.indexed(prefix)
+        if index is not None:
+            return index.iter_list(self.bucket_name, prefix, delimiter, start_after)
+        return self.backend.iter_list(prefix, delimiter, start_after, concurrency)
+
+    def glob(self, pattern):
+        """
+        Find the objects whose key matches a glob pattern, e.g. 'logs/2024-*/*.gz' ('*' also matches '/').
+
+        Only the keys under the pattern's literal prefix are listed, or scanned in the
+        key index when it is fresh for that prefix.
+
+        :param pattern: Glob pattern of keys relative to the bucket root
+        :return: Generator of ObjectRecord in key order
+        """
+        prefix = literal_prefix(pattern)
+        index = self.backend.indexed(prefix)
+        if index is not None:
+            return index.glob(self.bucket_name, pattern)
+        match = re.compile(translate(pattern)).match
+        return (record for record in self.backend.iter_list(prefix) if match(record.key))
+
+    def build_index(self, prefix='', concurrency=None):
+        """
+        Add a prefix (the whole bucket by default) to the key index with a full listing.
+
+        :param prefix: Key prefix
+        :param concurrency: List in parallel shards with up to this many requests at once
+        :return: RefreshResult (prefixes listed, keys upserted, keys removed)
+        """
+        assert self.index is not None, 'ERROR: S3 object was created without a key index'
+        return self.backend.build_index(prefix, concurrency)
+
+    def refresh_index(self, force=False, concurrency=None):
+        """
+        Re-list the indexed prefixes that expired (listed more than the index's max_age ago) or were marked stale.
+
+        :param force: Re-list every indexed prefix of the bucket
+        :param concurrency: List in parallel shards with up to this many requests at once
+        :return: RefreshResult (prefixes listed, keys upserted, keys removed)
+        """
+        assert self.index is not None, 'ERROR: S3 object was created without a key index'
+        return self.backend.refresh_index(force, concurrency)
+
+    def du(self, remote_path='', depth=1, concurrency=None):
+        """
+        Summarize the storage used under a S3 bucket path and its folders, like `du --max-depth`.
+
+        The listing is streamed in to running aggregates (object count, bytes, size
+        histogram and bytes per storage class) per folder, so memory use depends on
+        the number of folders reported, not on the number of keys.  A fresh key
+        index answers without listing.
+
+        :param remote_path: Path to object root in S3 bucket
+        :param depth: Number of folder levels below the path reported separately (0 for the total only)
+        :param concurrency: Aggregate parallel shards of the listing with up to this many requests at once
+        :return: List of PrefixUsage (prefix, count, size, histogram, storage_classes), the first one is the total
+        """
+        prefix = remote_path_root(remote_path)
+        index = self.backend.indexed(prefix)
+        if index is not None:
+            return UsageAggregator(prefix, depth).add_records(index.iter_list(self.bucket_name, prefix)).results()
+        return self.backend.du(prefix, depth, concurrency)
 
     def copy(self, src_path, dst_path, dst_bucket=None, recursive=False, include=None, exclude=None, acl='private',
              quiet=None):
@@ -97,27 +215,15 @@ class S3:
         :param dst_path: Path to destination file or folder
         :param dst_bucket: Bucket to copy to, defaults to same bucket
         :param recursive: Recursively copy all files within the directory
-        :param include: Don't exclude files or objects in the command that match the specified pattern
-        :param exclude: Exclude all files or objects from the command that matches the specified pattern
+        :param include: Don't exclude files or objects in the command that match the specified pattern(s)
+        :param exclude: Exclude all files or objects from the command that matches the specified pattern(s)
         :param acl: Access permissions, must be either 'private', 'public-read' or 'public-read-write'
         :param quiet: When true, does not display the operations performed from the specified command
 
         More on inclusion and exclusion parameters...
         http://docs.aws.amazon.com/cli/latest/reference/s3/index.html#use-of-exclude-and-include-filters
         """
-        uri1 = '{uri}/{src}'.format(uri=self.bucket_uri, src=src_path)
-        uri2 = '{uri}/{dst}'.format(uri=bucket_uri(dst_bucket) if dst_bucket else self.bucket_uri, dst=dst_path)
-
-        # Copy recursively if both URI's are directories and NOT files
-        return SystemCommand(
-            self.cmd.copy(object1=uri1,
-                          object2=uri2,
-                          recursive=is_recursive_needed(uri1, uri2, recursive_default=recursive),
-                          include=include,
-                          exclude=exclude,
-                          acl=acl,
-                          quiet=quiet if quiet else self.quiet)
-        )
+        return self.backend.copy(src_path, dst_path, dst_bucket, recursive, include, exclude, acl, quiet)
 
     def move(self, src_path, dst_path, dst_bucket=None, recursive=False, include=None, exclude=None):
         """
@@ -127,31 +233,50 @@ class S3:
         :param dst_path: Path to destination file or folder
         :param dst_bucket: Bucket to copy to, defaults to same bucket
         :param recursive: Recursively copy all files within the directory
-        :param include: Don't exclude files or objects in the command that match the specified pattern
-        :param exclude: Exclude all files or objects from the command that matches the specified pattern
+        :param include: Don't exclude files or objects in the command that match the specified pattern(s)
+        :param exclude: Exclude all files or objects from the command that matches the specified pattern(s)
 
         More on inclusion and exclusion parameters...
         http://docs.aws.amazon.com/cli/latest/reference/s3/index.html#use-of-exclude-and-include-filters
         """
-        uri1 = '{uri}/{src}'.format(uri=self.bucket_uri, src=src_path)
-        uri2 = '{uri}/{dst}'.format(uri=bucket_uri(dst_bucket) if dst_bucket else self.bucket_uri, dst=dst_path)
-
-        # Move recursively if both URI's are directories and NOT files
-        return SystemCommand(
-            self.cmd.move(object1=uri1,
-                          object2=uri2,
-                          recursive=is_recursive_needed(uri1, uri2, recursive_default=recursive),
-                          include=include,
-                          exclude=exclude)
-        )
+        return self.backend.move(src_path, dst_path, dst_bucket, recursive, include, exclude)
 
     def exists(self, remote_path):
         """
         Check to see if an S3 key (file or directory) exists
         :return: Bool
         """
+        index = self.backend.indexed(remote_path)
+        if index is not None:
+            return index.exists(self.bucket_name, remote_path)
+
         # Check to see if a result was returned, if not then key does not exist
-        return True if len(SystemCommand(self.cmd.list('{0}/{1}'.format(self.bucket_uri, remote_path)))) > 0 else False
+        return self.backend.exists(remote_path)
+
+    def exists_many(self, remote_paths, concurrency=CONCURRENCY, strategy='auto'):
+        """
+        Check to see if many S3 keys exist.
+
+        Unlike `exists`, keys must match exactly (`foo.txt` does not match `foo.txt.bak`).
+        Keys dense under a common prefix are checked with one listing, scattered keys
+        with concurrent HEAD requests.
+
+        :param remote_paths: Iterable of paths to S3 objects relative to bucket root
+        :param concurrency: Maximum number of concurrent HEAD requests
+        :param strategy: 'auto', 'list' (always list the common prefix) or 'head' (always HEAD each key)
+        :return: Dictionary of remote_path: bool
+        """
+        return self.backend.exists_many(remote_paths, concurrency, strategy)
+
+    def head_many(self, remote_paths, concurrency=CONCURRENCY):
+        """
+        Retrieve the metadata of many S3 objects with concurrent HEAD requests.
+
+        :param remote_paths: Iterable of paths to S3 objects relative to bucket root
+        :param concurrency: Maximum number of concurrent HEAD requests
+        :return: Dictionary of remote_path: ObjectHead (size, etag, content_type, last_modified) or None
+        """
+        return self.backend.head_many(remote_paths, concurrency)
 
     def delete(self, remote_path, recursive=False, include=None, exclude=None):
         """
@@ -159,19 +284,28 @@ class S3:
 
         :param remote_path: Path to S3 object relative to bucket root
         :param recursive: Recursively copy all files within the directory
-        :param include: Don't exclude files or objects in the command that match the specified pattern
-        :param exclude: Exclude all files or objects from the command that matches the specified pattern
+        :param include: Don't exclude files or objects in the command that match the specified pattern(s)
+        :param exclude: Exclude all files or objects from the command that matches the specified pattern(s)
         :return: Command string
         """
-        # Delete recursively if both URI's are directories and NOT files
-        return SystemCommand(
-            self.cmd.remove(uri='{uri}/{src}'.format(uri=self.bucket_uri, src=remote_path),
-                            recursive=is_recursive_needed(remote_path, recursive_default=recursive),
-                            include=include,
-                            exclude=exclude)
-        )
+        return self.backend.delete(remote_path, recursive, include, exclude)
+
+    def delete_many(self, remote_paths, concurrency=DELETE_CONCURRENCY, stream=False):
+        """
+        Delete many S3 objects with batched, concurrent multi-object delete requests.
+
+        Keys are sent in DeleteObjects requests of up to 1000 keys.  remote_paths is
+        consumed lazily, so the output of a listing can be passed directly and deletes
+        start before the listing finishes.
 
-    def upload(self, local_path, remote_path=None, acl='private', quiet=None):
+        :param remote_paths: Iterable of paths to S3 objects relative to bucket root, or ObjectRecords
+        :param concurrency: Maximum number of concurrent DeleteObjects requests
+        :param stream: Return a generator of each request's DeleteBatch (deleted keys, errors) as they complete
+        :return: DeleteResult (deleted count, errors) or a generator of DeleteBatch if stream is True
+        """
+        return self.backend.delete_many(remote_paths, concurrency, stream)
+
+    def upload(self, local_path, remote_path=None, acl='private', quiet=None, config=None):
         """
         Upload a local file to an S3 bucket.
 
@@ -179,42 +313,91 @@ class S3:
         :param remote_path: S3 key, aka remote path relative to S3 bucket's root
         :param acl: Access permissions, must be either 'private', 'public-read' or 'public-read-write'
         :param quiet: When true, does not display the operations performed from the specified command
+        :param config: TransferConfig overriding the S3 object's transfer_config for this upload
         """
         # Recursively upload files if the local target is a folder
         # Use local_path file/folder name as remote_path if none is specified
         remote_path = os.path.basename(local_path) if not remote_path else remote_path
         assert_acl(acl)
-        return SystemCommand(
-            self.cmd.copy(object1=local_path,
-                          object2='{0}/{1}'.format(self.bucket_uri, remote_path),
-                          recursive=True if os.path.isdir(local_path) else False,
-                          acl=acl, quiet=quiet if quiet else self.quiet)
-        )
+        return self.backend.upload(local_path, remote_path, acl, quiet, config or self.transfer_config)
 
-    def download(self, remote_path, local_path=os.getcwd(), recursive=False, quiet=None):
+    def upload_stream(self, source, remote_path, acl='private', config=None, size=None):
+        """
+        Upload data generated on the fly (a file object or an iterable of bytes) without a local file.
+
+        The data is uploaded in parts as it is produced, peak memory use is
+        part_size * concurrency bytes regardless of the size of the object.
+
+        :param source: Readable file object or iterable of bytes/str chunks (e.g. a generator)
+        :param remote_path: S3 key, aka remote path relative to S3 bucket's root
+        :param acl: Access permissions, must be either 'private', 'public-read' or 'public-read-write'
+        :param config: TransferConfig overriding the S3 object's transfer_config for this upload
+        :param size: Expected size in bytes if known, allows objects larger than 10,000 parts of part_size
+        :return: Number of bytes uploaded
+        """
+        assert_acl(acl)
+        return self.backend.upload_stream(source, remote_path, acl, config or self.transfer_config, size)
+
+    def download(self, remote_path, local_path=os.getcwd(), recursive=False, quiet=None, config=None):
         """
         Download a file or folder from an S3 bucket.
 
+        Single objects are served through the download cache when the S3 object has one.
+
         :param remote_path: S3 key, aka remote path relative to S3 bucket's root
         :param local_path: Path to file on local disk
         :param recursive: Recursively download files/folders
         :param quiet: When true, does not display the operations performed from the specified command
+        :param config: TransferConfig overriding the S3 object's transfer_config for this download
+        """
+        return self.backend.download(remote_path, local_path, recursive, quiet, config or self.transfer_config)
+
+    def read_range(self, remote_path, start=0, end=None, buffer=None):
+        """
+        Read part of an S3 object (e.g. the header of a Parquet file or the tail of a log) without downloading it.
+
+        :param remote_path: Path to S3 object relative to bucket root
+        :param start: First byte, a negative start reads the last -start bytes
+        :param end: Byte after the last one (exclusive), defaults to the end of the object
+        :param buffer: Writable buffer (e.g. a bytearray) to read in to instead of returning bytes
+        :return: Bytes read, or the number of bytes read in to buffer
+        """
+        return self.backend.read_range(remote_path, start, end, buffer)
+
+    def open(self, remote_path, mode='rb', read_ahead=READ_AHEAD, buffer_size=BUFFER_SIZE, encoding=None):
         """
-        return SystemCommand(
-            self.cmd.copy(object1='{0}/{1}'.format(self.bucket_uri, remote_path),
-                          object2=local_path,
-                          recursive=recursive,
-                          quiet=quiet if quiet else self.quiet)
-        )
+        Open an S3 object as a seekable, read-only file object streamed with ranged requests.
 
-    def sync(self, local_path, remote_path=None, delete=False, acl='private', quiet=None, remote_source=False):
+        :param remote_path: Path to S3 object relative to bucket root
+        :param mode: 'rb' (binary) or 'r' (text)
+        :param read_ahead: Minimum number of bytes requested at a time, consecutive reads share a request
+        :param buffer_size: Size of the buffer of small reads
+        :param encoding: Text encoding of mode 'r', defaults to UTF-8
+        :return: File object
+        """
+        return self.backend.open(remote_path, mode, read_ahead, buffer_size, encoding)
+
+    def iter_lines(self, remote_path, chunk_size=READ_AHEAD, encoding=None, keepends=False):
+        """
+        Stream the lines of a newline-delimited S3 object without writing it to disk.
+
+        :param remote_path: Path to S3 object relative to bucket root
+        :param chunk_size: Number of bytes read at a time
+        :param encoding: Decode lines to str with this encoding, yields bytes when None
+        :param keepends: Keep the line endings
+        :return: Generator of lines
+        """
+        return self.backend.iter_lines(remote_path, chunk_size, encoding, keepends)
+
+    def sync(self, local_path, remote_path=None, delete=False, acl='private', quiet=None, remote_source=False,
+             manifest=None, compare='mtime', hash_cache=True, include=None, exclude=None):
         """
         Synchronize local files with an S3 bucket.
 
         S3 sync only copies missing or outdated files or objects between
         the source and target.  However, you can also supply the --delete
         option to remove files or objects from the target that are not
-        present in the source.
+        present in the source.  See `plan_sync` for a dry run.
 
         :param local_path: Local source directory
         :param remote_path: Destination directory (relative to bucket root)
@@ -222,21 +405,51 @@ class S3:
         :param acl: Access permissions, must be either 'private', 'public-read' or 'public-read-write'
         :param quiet: When true, does not display the operations performed from the specified command
         :param remote_source: When true, remote_path is used as the source instead of destination
+        :param manifest: Persist the synced state (True for the default location, a database path or a SyncManifest)
+            so that later syncs only compare one side against it, both sides are still fully compared every
+            reconcile_interval (a day by default) to catch changes made outside of sync
+        :param compare: 'mtime' transfers files that differ in size or are newer at the source, 'content'
+            additionally compares the S3 ETag of same size files (computed locally) so that touched but
+            unchanged files are not transferred
+        :param hash_cache: Cache of local file ETags keyed by inode, size and mtime (True for the default location,
+            a database path or a HashCache)
+        :param include: Don't exclude files or objects that match the specified pattern(s)
+        :param exclude: Exclude files or objects that match the specified pattern(s), excludes are applied before
+            includes so that exclude='*', include='logs/2024/*' only syncs (and only walks or lists) logs/2024/
+
+        More on inclusion and exclusion parameters...
+        http://docs.aws.amazon.com/cli/latest/reference/s3/index.html#use-of-exclude-and-include-filters
         """
         assert_acl(acl)
-        uri = '{0}/{1}'.format(self.bucket_uri, os.path.basename(local_path) if not remote_path else remote_path)
+        assert compare in SYNC_COMPARE, 'ERROR: Invalid compare parameter ({0})'.format(compare)
+        remote_path = os.path.basename(local_path) if not remote_path else remote_path
+        return self.backend.sync(local_path, remote_path, delete, acl, quiet, remote_source, load_manifest(manifest),
+                                 compare, hash_cache, include, exclude)
 
-        # Sync from the S3 bucket
-        destination, source = (local_path, uri) if remote_source else (uri, local_path)
+    def plan_sync(self, local_path, remote_path=None, delete=False, remote_source=False, manifest=None,
+                  compare='mtime', hash_cache=True, include=None, exclude=None):
+        """
+        Plan a sync without transferring anything (a dry run).
 
-        return SystemCommand(
-            self.cmd.sync(
-                source=source,
-                destination=destination,
-                delete=delete,
-                acl=acl,
-                quiet=quiet if quiet else self.quiet)
-        )
+        The sorted local walk and the (sorted) bucket listing are merge-joined as they
+        are read, so planning uses constant memory whatever the number of files.
+
+        :param local_path: Local directory
+        :param remote_path: Remote directory (relative to bucket root)
+        :param delete: Plan the deletion of files or objects from the target that are not at the source
+        :param remote_source: When true, remote_path is used as the source instead of destination
+        :param manifest: Plan against the state recorded by a previous sync (see `sync`)
+        :param compare: 'mtime' or 'content' (see `sync`)
+        :param hash_cache: Cache of local file hashes used by compare='content' (see `sync`)
+        :param include: Don't exclude files or objects that match the specified pattern(s) (see `sync`)
+        :param exclude: Exclude files or objects that match the specified pattern(s) (see `sync`)
+        :return: Generator of SyncAction (action, path, reason, source, destination) in path order,
+            actions are 'upload', 'download', 'delete' or 'skip'
+        """
+        assert compare in SYNC_COMPARE, 'ERROR: Invalid compare parameter ({0})'.format(compare)
+        remote_path = os.path.basename(local_path) if not remote_path else remote_path
+        return self.backend.plan_sync(local_path, remote_path, delete, remote_source, load_manifest(manifest), compare,
+                                      hash_cache, include, exclude)
 
     def create_bucket(self, region='us-east-1'):
         """
@@ -245,15 +458,13 @@ class S3:
         :param region: Bucket's hosting region
         """
         # Validate that the bucket does not already exist
-        assert self.bucket_name not in self.buckets, 'ERROR: Bucket `{0}` already exists.'.format(self.bucket_name)
-
-        # Create the bucket
-        create = SystemCommand(self.cmd.make_bucket(self.bucket_uri, region))
-
-        # Enable transfer acceleration
-        SystemCommand(self.cmd.enable_transfer_acceleration(self.bucket_name))
+        assert not self.bucket_exists, 'ERROR: Bucket `{0}` already exists.'.format(self.bucket_name)
 
-        return create
+        # Create the bucket and enable transfer acceleration
+        try:
+            return self.backend.create_bucket(region)
+        finally:
+            self.invalidate_cache()
 
     def delete_bucket(self, force=False):
         """
@@ -264,8 +475,11 @@ class S3:
         :param force: Deletes all objects in the bucket including the bucket itself
         """
         # Validate that the bucket does exist
-        assert self.bucket_name in self.buckets, 'ERROR: Bucket `{0}` does not exists.'.format(self.bucket_name)
-        return SystemCommand(self.cmd.remove_bucket(self.bucket_uri, force))
+        assert self.bucket_exists, 'ERROR: Bucket `{0}` does not exists.'.format(self.bucket_name)
+        try:
+            return self.backend.delete_bucket(force)
+        finally:
+            self.invalidate_cache()
 
     def pre_sign(self, remote_path, expiration=3600):
         """
@@ -278,8 +492,19 @@ class S3:
         :param expiration: Number of seconds until the pre-signed URL expires
         :return:
         """
-        return SystemCommand(self.cmd.pre_sign('{uri}/{src}'.format(uri=self.bucket_uri, src=remote_path),
-                                               expiration))[0]
+        return self.backend.pre_sign(remote_path, expiration)
+
+    def pre_sign_many(self, remote_paths, expiration=3600):
+        """
+        Generate pre-signed URLs for many Amazon S3 objects.
+
+        URLs are signed locally, so thousands of keys can be signed in milliseconds.
+
+        :param remote_paths: Iterable of paths to S3 objects relative to bucket root
+        :param expiration: Number of seconds until the pre-signed URLs expire
+        :return: List of pre-signed URLs, in the same order as remote_paths
+        """
+        return self.backend.pre_sign_many(remote_paths, expiration)
 
     def url(self, remote_path):
         """Retrieve a S3 bucket URL for a S3 object."""
@@ -287,9 +512,4 @@ class S3:
 
     def is_acceleration_enabled(self):
         """Determine if transfer acceleration is enabled for an AWS S3 bucket."""
-        output = SystemCommand(self.cmd.acceleration_enabled_status(self.bucket_name)).output
-
-        if len(output) > 0:
-            return output[0].strip('"').lower() == 'enabled'
-        else:
-            return False
+        return self._cached(('accelerate', self.bucket_name), self.backend.is_acceleration_enabled)
@@ -0,0 +1,165 @@
+import os
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+from awsutils.s3.filters import NO_FILTERS
+
+# Sync plan actions
+UPLOAD = 'upload'
+DOWNLOAD = 'download'
+DELETE = 'delete'
+SKIP = 'skip'
+
+
+class LocalFile(namedtuple('LocalFile', ('path', 'size', 'mtime', 'inode'))):
+    """A file found by a local walk: its full path, size, modification time and inode number."""
+    __slots__ = ()
+
+    @classmethod
+    def from_stat(cls, path, stat):
+        return cls(path, stat.st_size, stat.st_mtime, stat.st_ino)
+
+
+class SyncAction(namedtuple('SyncAction', ('action', 'path', 'reason', 'source', 'destination'))):
+    """
+    A step of a sync plan.
+
+    action is 'upload', 'download', 'delete' (from the destination) or 'skip', path
+    is relative to the synced directories ('/' separated) and source/destination
+    are the entries (LocalFile, ObjectRecord or ManifestEntry) found on each side.
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return '{0}: {1} ({2})'.format(self.action, self.path, self.reason)
+
+
+def iter_local_tree(directory, filters=NO_FILTERS):
+    """
+    Walk a local directory in S3 key order.
+
+    Entries are sorted per directory with sub-directories sorting as 'name/', so
+    paths are generated in the same (code point) order as a bucket listing while
+    only one directory's entries are held in memory per level.
+
+    :param directory: Local directory
+    :param filters: Filters applied to the relative paths, directories none of whose files can be included are
+        not walked
+    :return: Generator of (path relative to directory using '/' separators, LocalFile) tuples
+    """
+    if os.path.isdir(directory):
+        yield from _iter_sorted(directory, '', filters)
+
+
+def _iter_sorted(root, relative, filters):
+    with os.scandir(root) as scan:
+        # Like os.walk, symbolic links to directories are not followed
+        entries = sorted((entry.name + '/' if entry.is_dir(follow_symlinks=False) else entry.name, entry)
+                         for entry in scan)
+    for name, entry in entries:
+        if name.endswith('/'):
+            if not filters.prunes(relative + name):
+                yield from _iter_sorted(entry.path, relative + name, filters)
+        elif entry.is_file() and filters(relative + name):
+            yield relative + name, LocalFile.from_stat(entry.path, entry.stat())
+
+
+def merge_join(source, destination):
+    """
+    Join two iterables of (path, entry) tuples sorted by path in a single pass.
+
+    :return: Generator of (path, source entry or None, destination entry or None) tuples in path order
+    """
+    source, destination = iter(source), iter(destination)
+    src, dst = next(source, None), next(destination, None)
+    while src is not None or dst is not None:
+        if dst is None or (src is not None and src[0] < dst[0]):
+            yield src[0], src[1], None
+            src = next(source, None)
+        elif src is None or dst[0] < src[0]:
+            yield dst[0], None, dst[1]
+            dst = next(destination, None)
+        else:
+            yield src[0], src[1], dst[1]
+            src, dst = next(source, None), next(destination, None)
+
+
+def compare_upload(local, remote):
+    """Return why a local file should be uploaded over an object (size or newer, S3 has 1 second resolution)."""
+    if local.size != remote.size:
+        return 'size differs'
+    if int(local.mtime) > remote.last_modified.timestamp():
+        return 'source is newer'
+    return None
+
+
+def compare_download(remote, local):
+    """Return why an object should be downloaded over a local file."""
+    if remote.size != local.size:
+        return 'size differs'
+    if remote.last_modified.timestamp() > int(local.mtime):
+        return 'source is newer'
+    return None
+
+
+def compare_manifest_local(local, entry):
+    """Return why a local file should be uploaded, given its ManifestEntry from the last sync."""
+    return None if (local.size, local.mtime) == (entry.size, entry.mtime) else 'changed since last sync'
+
+
+def compare_manifest_remote(remote, entry):
+    """Return why an object should be downloaded, given its ManifestEntry from the last sync."""
+    return None if (remote.size, remote.etag) == (entry.size, entry.etag) else 'changed since last sync'
+
+
+def plan(source, destination, transfer, compare, delete=False):
+    """
+    Plan a sync by merge-joining the sorted source and destination entries.
+
+    Memory use is constant, every path is planned as soon as both sides have
+    been read past it.
+
+    :param source: Iterable of (path, entry) tuples sorted by path
+    :param destination: Iterable of (path, entry) tuples sorted by path
+    :param transfer: Action of paths to transfer, 'upload' or 'download'
+    :param compare: Function of (source entry, destination entry) returning why the path should be
+        transferred or None when it is in sync
+    :param delete: Delete paths from the destination that are not at the source
+    :return: Generator of SyncAction
+    """
+    for path, src, dst in merge_join(source, destination):
+        if src is None:
+            yield SyncAction(DELETE if delete else SKIP, path, 'not at source', None, dst)
+        else:
+            reason = 'missing at destination' if dst is None else compare(src, dst)
+            yield SyncAction(transfer if reason else SKIP, path, reason or 'unchanged', src, dst)
+
+
+def execute(actions, run, concurrency, inline=None):
+    """
+    Execute plan actions on a thread pool as they are generated.
+
+    At most 2 * concurrency actions are pending at once, so executing a plan of
+    any size uses bounded memory.  Actions selected by `inline` (e.g. transfers
+    large enough to be parallelised on their own) are run on the calling thread.
+
+    :param actions: Iterable of actions
+    :param run: Function executing an action and returning its result
+    :param concurrency: Maximum number of actions executed at the same time
+    :param inline: Function of an action, true when it should be run on the calling thread
+    :return: Generator of results, in order of completion
+    """
+    pending = set()
+    actions = iter(actions)
+    with ThreadPoolExecutor(concurrency) as executor:
+        for action in actions:
+            if inline is not None and inline(action):
+                yield run(action)
+            else:
+                pending.add(executor.submit(run, action))
+            if len(pending) >= 2 * concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
@@ -0,0 +1,219 @@
+import random
+import time
+from threading import Lock
+
+from awsutils.s3.helpers import resolve_option
+from awsutils.s3.metrics import THROTTLE_CODES
+
+# Request rate S3 supports per prefix before it starts to scale out (PUT/COPY/POST/DELETE, GET is 5500)
+PREFIX_REQUEST_RATE = 3500
+
+# Error codes of transient failures that are retried like throttles, without slowing down
+TRANSIENT_CODES = ('InternalError', 'RequestTimeout', 'RequestTimeoutException', 'PriorRequestNotComplete')
+
+_CONTEXT_KEY = 'awsutils_s3_rate_limiter'
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        """
+        Thread-safe token bucket, each request takes one token.
+
+        Tokens are reserved ahead of time (the count can go negative) so that
+        waiting requests are served in order without busy loops.
+
+        :param rate: Tokens added per second
+        :param burst: Maximum number of tokens, defaults to one second worth
+        :param clock: Function returning a monotonic time in seconds
+        :param sleep: Function sleeping a number of seconds
+        """
+        self.rate = float(rate)
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = Lock()
+
+    @property
+    def capacity(self):
+        return self.burst if self.burst is not None else max(self.rate, 1.0)
+
+    def acquire(self):
+        """Take a token, sleeping until one is available, and return the number of seconds waited."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            self._sleep(wait)
+        return wait
+
+
+class RateLimiter:
+    def __init__(self, rate=PREFIX_REQUEST_RATE, min_rate=1.0, max_rate=10 * PREFIX_REQUEST_RATE, increase=1.0,
+                 decrease=0.5, cooldown=1.0, clock=time.monotonic, sleep=time.sleep):
+        """
+        Token bucket whose rate adapts to throttling with additive increase, multiplicative decrease (AIMD).
+
+        Throttles divide the rate at most once per cooldown, successes grow it by `increase` per second.
+
+        :param rate: Initial requests per second
+        :param min_rate: Lowest requests per second
+        :param max_rate: Highest requests per second
+        :param increase: Requests per second added per second of successful requests
+        :param decrease: Factor the rate is multiplied by when throttled
+        :param cooldown: Minimum number of seconds between two decreases
+        :param clock: Function returning a monotonic time in seconds
+        :param sleep: Function sleeping a number of seconds
+        """
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._clock = clock
+        self._bucket = TokenBucket(rate, clock=clock, sleep=sleep)
+        self._last_decrease = None
+        self._lock = Lock()
+        self.throttles = 0
+
+    def __repr__(self):
+        return '<RateLimiter {0:.1f} requests/s>'.format(self.rate)
+
+    @property
+    def rate(self):
+        return self._bucket.rate
+
+    def acquire(self):
+        return self._bucket.acquire()
+
+    def succeeded(self):
+        with self._lock:
+            self._bucket.rate = min(self.max_rate, self._bucket.rate + self.increase / self._bucket.rate)
+
+    def throttled(self):
+        with self._lock:
+            self.throttles += 1
+            now = self._clock()
+            if self._last_decrease is None or now - self._last_decrease >= self.cooldown:
+                self._bucket.rate = max(self.min_rate, self._bucket.rate * self.decrease)
+                self._last_decrease = now
+
+
+class AdaptiveRetry:
+    def __init__(self, max_attempts=10, base_delay=0.05, max_delay=20.0, prefix_depth=1, limiter_factory=RateLimiter,
+                 random=random.random):
+        """
+        Retry policy with full-jitter exponential backoff and AIMD rate limiters per bucket and key prefix.
+
+        Throttles, 5xx responses and connection errors are retried, other errors are raised.
+
+        :param max_attempts: Maximum number of attempts of a request (including the first)
+        :param base_delay: Backoff of the first retry in seconds, doubled for each following one
+        :param max_delay: Maximum backoff in seconds
+        :param prefix_depth: Number of '/' separated key segments identifying a prefix's limiter, 0 for one
+            limiter per bucket
+        :param limiter_factory: Function returning a new RateLimiter
+        :param random: Function returning a float in [0, 1)
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.prefix_depth = prefix_depth
+        self._limiter_factory = limiter_factory
+        self._random = random
+        self._limiters = {}
+        self._lock = Lock()
+
+    def __repr__(self):
+        return '<AdaptiveRetry {0} limiters>'.format(len(self._limiters))
+
+    @property
+    def limiters(self):
+        """Retrieve a dictionary of (bucket, prefix): RateLimiter."""
+        with self._lock:
+            return dict(self._limiters)
+
+    def limiter(self, bucket, key=''):
+        """Retrieve the rate limiter of a bucket and key's prefix, creating it on first use."""
+        prefix = '/'.join(key.split('/')[:self.prefix_depth]) if self.prefix_depth and '/' in key else ''
+        with self._lock:
+            limiter = self._limiters.get((bucket, prefix))
+            if limiter is None:
+                limiter = self._limiters[(bucket, prefix)] = self._limiter_factory()
+        return limiter
+
+    def delay(self, attempt):
+        """Return the (full jitter) backoff in seconds before the retry following an attempt."""
+        return self._random() * min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+
+    def instrument_client(self, client):
+        """
+        Route a botocore client's retries and request rate through this policy.
+
+        botocore's own retries should be disabled on the client (see Backend.get_client)
+        so that only this policy decides, registering the same policy twice is a no-op.
+
+        :param client: botocore S3 client
+        :return: client
+        """
+        events = client.meta.events
+        unique = 'awsutils-s3-retry-{0}-'.format(id(self))
+        events.register('before-parameter-build.s3', self._before_parameter_build,
+                        unique_id=unique + 'before-parameter-build')
+        events.register('before-send.s3', self._before_send, unique_id=unique + 'before-send')
+        events.register_first('needs-retry.s3', self._needs_retry, unique_id=unique + 'needs-retry')
+        return client
+
+    def _before_parameter_build(self, params, context, **kwargs):
+        if 'Bucket' in params:
+            context[_CONTEXT_KEY] = self.limiter(params['Bucket'], _request_key(params))
+
+    def _before_send(self, request, **kwargs):
+        limiter = request.context.get(_CONTEXT_KEY)
+        if limiter is not None:
+            limiter.acquire()
+
+    def _needs_retry(self, attempts, response=None, caught_exception=None, request_dict=None, **kwargs):
+        from botocore.exceptions import ConnectionError, HTTPClientError
+
+        limiter = (request_dict or {}).get('context', {}).get(_CONTEXT_KEY)
+        if caught_exception is not None:
+            retry = isinstance(caught_exception, (ConnectionError, HTTPClientError))
+        else:
+            status = response[0].status_code
+            code = response[1].get('Error', {}).get('Code')
+            throttled = code in THROTTLE_CODES or status in (429, 503)
+            if limiter is not None:
+                limiter.throttled() if throttled else limiter.succeeded()
+            retry = throttled or status >= 500 or code in TRANSIENT_CODES
+        if not retry or attempts >= self.max_attempts:
+            return None
+        return self.delay(attempts)
+
+
+def _request_key(params):
+    """Return the key (or listing prefix) a request's limiter is chosen by, multi-object deletes use their first key."""
+    if 'Key' in params:
+        return params['Key']
+    if 'Delete' in params:
+        objects = params['Delete'].get('Objects') or [{}]
+        return objects[0].get('Key', '')
+    return params.get('Prefix') or ''
+
+
+# Policy shared by the S3 objects created with retry=True
+default_retry = AdaptiveRetry()
+
+
+def load_retry(retry=None):
+    """
+    Resolve the `retry` argument of an S3 object.
+
+    :param retry: None/False for botocore's retries, True for the shared default AdaptiveRetry or an AdaptiveRetry
+    :return: AdaptiveRetry or None
+    """
+    return resolve_option(retry, lambda: default_retry)
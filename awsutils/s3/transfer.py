@@ -0,0 +1,507 @@
+import io
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from queue import Queue
+from threading import Event, Lock
+
+MB = 1024 ** 2
+
+# S3 multipart upload limits
+MIN_PART_SIZE = 5 * MB
+MAX_PART_SIZE = 5 * 1024 * MB
+MAX_PARTS = 10000
+
+# Streams of unknown length double their part size every this many parts, to reach the 5 TiB object limit
+PART_GROWTH_INTERVAL = 1000
+
+# Size of the reads used to stream a response body in to its destination
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+class TransferConfig:
+    def __init__(self, part_size=8 * MB, concurrency=8, max_memory=None, multipart_threshold=None):
+        """
+        Tuning parameters of the multipart transfer engines.
+
+        :param part_size: Size of each part in bytes, increased automatically to stay within 10,000 parts
+        :param concurrency: Maximum number of parts transferred at the same time
+        :param max_memory: Maximum number of bytes of part buffers held at once, limits concurrency
+        :param multipart_threshold: Files smaller than this are transferred with a single request,
+            defaults to part_size
+        """
+        assert part_size >= MIN_PART_SIZE, 'ERROR: part_size must be at least 5 MiB'
+        assert concurrency > 0, 'ERROR: concurrency must be at least 1'
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.max_memory = max_memory
+        self.multipart_threshold = part_size if multipart_threshold is None else multipart_threshold
+
+    def __repr__(self):
+        return '<TransferConfig part_size={0} concurrency={1} max_memory={2}>'.format(self.part_size,
+                                                                                     self.concurrency,
+                                                                                     self.max_memory)
+
+    def part_size_for(self, size):
+        """Return the part size for an object of size bytes, scaled up (in whole MiB) to fit in 10,000 parts."""
+        part_size = max(self.part_size, int(math.ceil(size / MAX_PARTS / MB)) * MB)
+        assert part_size <= MAX_PART_SIZE, 'ERROR: {0} bytes exceeds the maximum object size'.format(size)
+        return part_size
+
+    def workers_for(self, part_size):
+        """Return the number of parts transferred at the same time without exceeding max_memory."""
+        if self.max_memory is None:
+            return self.concurrency
+        return max(1, min(self.concurrency, self.max_memory // part_size))
+
+
+class PartReader(io.RawIOBase):
+    def __init__(self, view):
+        """
+        Seekable, read-only file object over a buffer (without copying it).
+
+        botocore rejects memoryview request bodies, this allows a slice of a reused
+        part buffer to be sent (and re-sent on retries) as-is.
+
+        :param view: memoryview of the part's bytes
+        """
+        super(PartReader, self).__init__()
+        self._view = view
+        self._position = 0
+
+    def __len__(self):
+        return len(self._view)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._position = (0, self._position, len(self._view))[whence] + offset
+        return self._position
+
+    def readinto(self, buffer):
+        size = max(0, min(len(buffer), len(self._view) - self._position))
+        buffer[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        return size
+
+
+class BufferPool:
+    def __init__(self, count, size):
+        """
+        Fixed set of reusable part buffers.
+
+        acquire() blocks until a buffer is released, which bounds memory use to count * size bytes.
+
+        :param count: Number of buffers
+        :param size: Size of each buffer in bytes
+        """
+        self.size = size
+        self.count = count
+        self._surplus = 0
+        self._lock = Lock()
+        self._buffers = Queue()
+        for _ in range(count):
+            self._buffers.put(bytearray(size))
+
+    def acquire(self):
+        buffer = self._buffers.get()
+        return buffer if len(buffer) == self.size else bytearray(self.size)
+
+    def release(self, buffer):
+        with self._lock:
+            if self._surplus:
+                self._surplus -= 1
+                return
+        self._buffers.put(buffer)
+
+    def resize(self, count, size):
+        """
+        Change the size of the buffers (reallocated as they are acquired) and reduce their number.
+
+        :param count: Number of buffers, at most the current number
+        :param size: Size of each buffer in bytes
+        """
+        assert count <= self.count, 'ERROR: BufferPool can not grow from {0} to {1} buffers'.format(self.count, count)
+        with self._lock:
+            self._surplus += self.count - count
+            self.count = count
+            self.size = size
+
+
+class MultipartUpload:
+    def __init__(self, client, bucket, key, extra_args=None):
+        """
+        A single S3 multipart upload: parts are uploaded (from any thread) then completed, or aborted.
+
+        :param client: botocore S3 client
+        :param bucket: Bucket name
+        :param key: Object key
+        :param extra_args: Additional CreateMultipartUpload parameters, e.g. {'ACL': 'private'}
+        """
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.upload_id = client.create_multipart_upload(Bucket=bucket, Key=key, **(extra_args or {}))['UploadId']
+        self.parts = {}
+
+    def upload_part(self, number, view):
+        """Upload a part's bytes (a bytes-like object or memoryview) and record its ETag."""
+        response = self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                           PartNumber=number, Body=PartReader(memoryview(view)))
+        self.parts[number] = response['ETag']
+        return response['ETag']
+
+    def upload_part_copy(self, number, source, start, end, extra_args=None):
+        """Copy bytes start-end (inclusive) of another object in to a part server-side and record its ETag."""
+        response = self.client.upload_part_copy(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                                PartNumber=number, CopySource=source,
+                                                CopySourceRange='bytes={0}-{1}'.format(start, end),
+                                                **(extra_args or {}))
+        self.parts[number] = response['CopyPartResult']['ETag']
+        return self.parts[number]
+
+    def complete(self):
+        parts = [{'PartNumber': number, 'ETag': self.parts[number]} for number in sorted(self.parts)]
+        return self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                                     MultipartUpload={'Parts': parts})
+
+    def abort(self):
+        """Abort the upload so that S3 discards (and stops billing for) the uploaded parts."""
+        return self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+class StreamReader(io.RawIOBase):
+    def __init__(self, source):
+        """
+        Readable file object over a file object without readinto() or an iterable of bytes.
+
+        Chunks are copied straight in to the caller's buffer, str chunks are encoded as UTF-8.
+
+        :param source: File object with a read() method or iterable of bytes/str chunks
+        """
+        super(StreamReader, self).__init__()
+        self._chunks = iter(_read_chunks(source) if hasattr(source, 'read') else source)
+        self._pending = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk.encode('utf-8') if isinstance(chunk, str) else chunk).cast('B')
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def _read_chunks(fileobj):
+    while True:
+        chunk = fileobj.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def as_readable(source):
+    """Return a file object supporting readinto() for a binary file object, a text/read-only file or an iterable."""
+    return source if hasattr(source, 'readinto') and not isinstance(source, io.TextIOBase) else StreamReader(source)
+
+
+def upload_fileobj(client, bucket, key, source, config=None, extra_args=None, size=None):
+    """
+    Upload a file object or an iterable of bytes, of unknown length, with a parallel multipart upload.
+
+    Parts are filled sequentially from the source in to a ring of reused buffers
+    (one per worker) and uploaded on a thread pool, so at most
+    workers * part_size bytes are held in memory whatever the size of the object.
+    Sources shorter than a part are uploaded with a single request.  The multipart
+    upload is aborted if any part fails.  When the size is not known the part size
+    doubles every PART_GROWTH_INTERVAL parts (up to 5 GiB), and the number of buffers
+    shrinks to stay within max_memory, so 10,000 parts cover the largest objects.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param key: Object key
+    :param source: Binary file object, read-only file object or iterable of bytes (e.g. a generator)
+    :param config: TransferConfig, defaults to TransferConfig()
+    :param extra_args: Additional PutObject/CreateMultipartUpload parameters, e.g. {'ACL': 'private'}
+    :param size: Expected size in bytes if known, scales the part size up to stay within 10,000 parts
+        from the start (otherwise the part size grows with the number of parts)
+    :return: Number of bytes uploaded
+    """
+    config = config or TransferConfig()
+    extra_args = extra_args or {}
+    source = as_readable(source)
+    part_size = config.part_size_for(size or 0)
+    workers = config.workers_for(part_size)
+    pool = BufferPool(workers, part_size)
+
+    buffer = pool.acquire()
+    length = read_into(source, buffer)
+    if length < part_size:
+        client.put_object(Bucket=bucket, Key=key, Body=PartReader(memoryview(buffer)[:length]), **extra_args)
+        return length
+
+    upload = MultipartUpload(client, bucket, key, extra_args)
+    failed = Event()
+
+    def upload_part(number, buffer, length):
+        try:
+            upload.upload_part(number, memoryview(buffer)[:length])
+        except BaseException:
+            failed.set()
+            raise
+        finally:
+            pool.release(buffer)
+
+    futures, total = [], 0
+    try:
+        with ThreadPoolExecutor(workers) as executor:
+            for number in count(1):
+                assert number <= MAX_PARTS, 'ERROR: {0} exceeds {1} parts of {2} bytes'.format(key, MAX_PARTS,
+                                                                                               part_size)
+                futures.append(executor.submit(upload_part, number, buffer, length))
+                total += length
+                if length < pool.size:
+                    break
+                if size is None and number % PART_GROWTH_INTERVAL == 0 and part_size < MAX_PART_SIZE:
+                    part_size = min(MAX_PART_SIZE, 2 * part_size)
+                    pool.resize(config.workers_for(part_size), part_size)
+                buffer = pool.acquire()
+                if failed.is_set():
+                    break
+                length = read_into(source, buffer)
+                if not length:
+                    pool.release(buffer)
+                    break
+            for future in futures:
+                future.result()
+        upload.complete()
+    except BaseException:
+        upload.abort()
+        raise
+    return total
+
+
+def upload_file(client, bucket, key, local_path, config=None, extra_args=None):
+    """
+    Upload a local file, using a parallel multipart upload for large files.
+
+    Parts are read sequentially with readinto() in to a fixed pool of reused
+    buffers, one per worker, so at most workers * part_size bytes are held in
+    memory.  The multipart upload is aborted if any part fails.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param key: Object key
+    :param local_path: Path to the local file
+    :param config: TransferConfig, defaults to TransferConfig()
+    :param extra_args: Additional PutObject/CreateMultipartUpload parameters, e.g. {'ACL': 'private'}
+    :return: Number of bytes uploaded
+    """
+    config = config or TransferConfig()
+    extra_args = extra_args or {}
+    size = os.path.getsize(local_path)
+    if size < config.multipart_threshold:
+        with open(local_path, 'rb') as body:
+            client.put_object(Bucket=bucket, Key=key, Body=body, **extra_args)
+        return size
+    with open(local_path, 'rb', buffering=0) as source:
+        return upload_fileobj(client, bucket, key, source, config, extra_args, size)
+
+
+def read_into(source, buffer):
+    """Fill a buffer from a file object with readinto(), retrying short reads, and return the bytes read."""
+    view, total = memoryview(buffer), 0
+    while total < len(view):
+        read = source.readinto(view[total:])
+        if not read:
+            break
+        total += read
+    return total
+
+
+class DownloadError(Exception):
+    """A downloaded file does not match the object it was downloaded from."""
+
+
+class RangeWriter:
+    def __init__(self, fd, size):
+        """
+        Write byte ranges of a preallocated file at their offsets, from any thread.
+
+        Uses os.pwrite() where available and a shared memory map otherwise, so
+        ranges need no file position (or lock) and are never buffered in full.
+
+        :param fd: File descriptor of the destination, opened for reading and writing
+        :param size: Size of the destination file in bytes
+        """
+        self._fd = fd
+        self._map = None
+        if not hasattr(os, 'pwrite') and size:
+            import mmap
+            self._map = mmap.mmap(fd, size)
+
+    def write(self, offset, data):
+        if self._map is not None:
+            self._map[offset:offset + len(data)] = data
+            return len(data)
+        view, written = memoryview(data), 0
+        while written < len(view):
+            written += os.pwrite(self._fd, view[written:], offset + written)
+        return written
+
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+
+
+def preallocate(fd, size):
+    """Allocate a file's blocks up front (sparse fallback) so that ranges can be written in any order."""
+    if size and hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass
+    os.ftruncate(fd, size)
+
+
+def _stream_into(body, writer, offset):
+    """Write a response body at an offset as it streams in and return the bytes written."""
+    start = offset
+    try:
+        for chunk in iter(lambda: body.read(STREAM_CHUNK_SIZE), b''):
+            offset += writer.write(offset, chunk)
+    finally:
+        body.close()
+    return offset - start
+
+
+def _download_range(client, bucket, key, etag, writer, start, end):
+    """Stream bytes start-end (inclusive) of an object straight in to the destination and return the bytes written."""
+    kwargs = {'Bucket': bucket, 'Key': key, 'Range': 'bytes={0}-{1}'.format(start, end)}
+    if etag:
+        # Fail instead of mixing ranges of two versions if the object is overwritten during the download
+        kwargs['IfMatch'] = '"{0}"'.format(etag)
+    return _stream_into(client.get_object(**kwargs)['Body'], writer, start)
+
+
+def _download_ranges(client, bucket, key, local_path, config, size, etag, first=None):
+    """
+    Download the ranges of an object in to a temporary file that replaces local_path once complete.
+
+    :param first: Response to a GET of the object's first range (already requested), if any
+    """
+    temp_path = '{0}.{1}.part'.format(local_path, os.urandom(4).hex())
+    fd = os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        preallocate(fd, size)
+        writer = RangeWriter(fd, size)
+        try:
+            ranges = [(start, min(start + config.part_size, size) - 1) for start in range(0, size, config.part_size)]
+            written = 0
+            if first is not None:
+                written, ranges = _stream_into(first['Body'], writer, 0), ranges[1:]
+            with ThreadPoolExecutor(max(1, min(config.concurrency, len(ranges)))) as executor:
+                written += sum(executor.map(lambda r: _download_range(client, bucket, key, etag, writer, *r), ranges))
+        finally:
+            writer.close()
+        if written != size:
+            raise DownloadError('ERROR: {0} downloaded {1} of {2} bytes'.format(key, written, size))
+        os.close(fd)
+        fd = None
+        os.replace(temp_path, local_path)
+    except BaseException:
+        if fd is not None:
+            os.close(fd)
+        os.remove(temp_path)
+        raise
+    return size
+
+
+def download_file(client, bucket, key, local_path, config=None, size=None, etag=None):
+    """
+    Download an object with concurrent ranged GET requests.
+
+    The destination is preallocated and each range is written straight in to its
+    offset as it streams in.  Every range is requested with If-Match on the
+    object's ETag and the downloaded size is checked against the object's, the file
+    is written to a temporary file that only replaces local_path once complete.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param key: Object key
+    :param local_path: Path of the destination file
+    :param config: TransferConfig (part_size is the size of the ranges), defaults to TransferConfig()
+    :param size: Object size in bytes if known (e.g. from a listing), saves a HEAD request
+    :param etag: Object ETag if known (e.g. from a listing)
+    :return: Number of bytes downloaded
+    """
+    config = config or TransferConfig()
+    if size is None:
+        head = client.head_object(Bucket=bucket, Key=key)
+        size, etag = head['ContentLength'], head.get('ETag', '').strip('"')
+    return _download_ranges(client, bucket, key, local_path, config, size, etag)
+
+
+def _conditional_get(client, kwargs):
+    """GET an object, return the response or None if S3 answered 304 Not Modified."""
+    from botocore.exceptions import ClientError
+
+    try:
+        return client.get_object(**kwargs)
+    except ClientError as e:
+        if e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 304 or \
+                e.response.get('Error', {}).get('Code') in ('304', 'NotModified'):
+            return None
+        # Empty objects have no satisfiable range
+        if e.response.get('Error', {}).get('Code') == 'InvalidRange' and 'Range' in kwargs:
+            return _conditional_get(client, {name: value for name, value in kwargs.items() if name != 'Range'})
+        raise
+
+
+def download_file_if_changed(client, bucket, key, local_path, config=None, etag=None):
+    """
+    Download an object unless its ETag is still etag, with a conditional GET.
+
+    The first range is requested with If-None-Match: S3 answers 304 Not Modified
+    (and nothing is written) or sends the range, whose Content-Range gives the
+    object's size.  Objects larger than a range are completed with concurrent
+    ranged GETs pinned to the new ETag, as with download_file.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param key: Object key
+    :param local_path: Path of the destination file, or a function of the object's size returning it
+    :param config: TransferConfig (part_size is the size of the ranges), defaults to TransferConfig()
+    :param etag: ETag of the copy already held, None to download unconditionally
+    :return: (size, etag) of the downloaded object, or None if it was not modified
+    """
+    config = config or TransferConfig()
+    kwargs = {'Bucket': bucket, 'Key': key, 'Range': 'bytes=0-{0}'.format(config.part_size - 1)}
+    if etag:
+        kwargs['IfNoneMatch'] = '"{0}"'.format(etag)
+    response = _conditional_get(client, kwargs)
+    if response is None:
+        return None
+    content_range = response.get('ContentRange')
+    size = int(content_range.rsplit('/', 1)[1]) if content_range else response['ContentLength']
+    etag = response.get('ETag', '').strip('"')
+    if callable(local_path):
+        local_path = local_path(size)
+    _download_ranges(client, bucket, key, local_path, config, size, etag, first=response)
+    return size, etag
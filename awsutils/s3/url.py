@@ -1,7 +1,43 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
 from urllib.parse import urlparse
 
-from tldextract import extract as url_extract
-from validators import url as url_validator
+# Number of URLs (and hosts) whose parsed form is kept by parse_s3_url
+URL_CACHE_SIZE = 4096
+
+# URI schemes whose 'host' is the bucket name
+S3_SCHEMES = ('s3', 's3a', 's3n', 's3-accelerate')
+
+# Virtual-hosted (bucket.s3...), path-style (s3...), accelerate, dualstack and regional S3 endpoints
+_S3_HOST = re.compile(r'^(?:(?P<bucket>[a-z0-9][a-z0-9.\-_]*)\.)?'
+                      r's3(?P<accelerate>-accelerate)?(?:\.dualstack)?(?:[.-](?P<region>[a-z0-9-]+))?'
+                      r'\.amazonaws\.com(?:\.cn)?$')
+
+
+class S3Url(namedtuple('S3Url', ('bucket', 'key', 'region', 'style'))):
+    """
+    A parsed S3 URL.
+
+    style is 's3' (s3://bucket/key), 'virtual' (https://bucket.s3.amazonaws.com/key), 'accelerate'
+    (https://bucket.s3-accelerate.amazonaws.com/key) or 'path' (https://s3.amazonaws.com/bucket/key, also
+    used for endpoints that are not AWS', e.g. a local S3 stand-in), region is None when not in the host.
+    """
+    __slots__ = ()
+
+
+def url_validator(value):
+    """Validate a URL with the validators package (imported on first use), return True or a falsy failure."""
+    from validators import url
+
+    return url(value)
+
+
+def url_extract(url):
+    """Split a URL's host in to its subdomain, domain and suffix using tldextract (and the Public Suffix List)."""
+    from tldextract import extract
+
+    return extract(url)
 
 
 def url_host(url):
@@ -33,9 +69,72 @@ def bucket_url(bucket, acceleration=False):
     :param acceleration: Use transfer acceleration if the endpoint is available
     :return: Bucket URL
     """
-    url = 'https://{bucket}.s3.amazonaws.com'.format(bucket=bucket)
-    url_accel = 'https://{bucket}.s3-accelerate.amazonaws.com'.format(bucket=bucket)
-    return url_accel if url_validator(url_accel) and acceleration else url
+    return 'https://{bucket}.{endpoint}.amazonaws.com'.format(bucket=bucket,
+                                                              endpoint='s3-accelerate' if acceleration else 's3')
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def _parse_host(host):
+    """Parse an endpoint's host, return (bucket or None, region, style)."""
+    match = _S3_HOST.match(host)
+    if match is None:
+        return None, None, 'path'
+    bucket = match.group('bucket')
+    if bucket is None:
+        return None, match.group('region'), 'path'
+    return bucket, match.group('region'), 'accelerate' if match.group('accelerate') else 'virtual'
+
+
+def _parse(url):
+    """Parse an S3 URL without touching the URL cache, return an S3Url or None when url is not one."""
+    scheme, separator, rest = url.partition('://')
+    if not separator:
+        return None
+    scheme = scheme.lower()
+    if scheme in S3_SCHEMES:
+        bucket, _, key = rest.partition('/')
+        return S3Url(bucket, key, None, 's3') if bucket else None
+    if scheme not in ('https', 'http'):
+        return None
+
+    host, _, path = rest.partition('/')
+    # Query strings (e.g. of presigned URLs) and fragments are not part of the key
+    for delimiter in ('?', '#'):
+        if delimiter in path:
+            path = path.partition(delimiter)[0]
+    host = host.rpartition('@')[2].partition(':')[0].lower()
+    bucket, region, style = _parse_host(host)
+    if bucket is None:
+        bucket, _, path = path.partition('/')
+    return S3Url(bucket, path, region, style) if bucket else None
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def parse_s3_url(url):
+    """
+    Parse an S3 URL offline (no Public Suffix List or network access).
+
+    Handles s3:// URIs and virtual-hosted, path-style, accelerate, dualstack and regional
+    endpoints.  Results are kept in an LRU cache of URL_CACHE_SIZE URLs.
+
+    :param url: URL
+    :return: S3Url (bucket, key, region, style)
+    """
+    parsed = _parse(url)
+    assert parsed is not None, 'ERROR: Invalid S3 URL ({0})'.format(url)
+    return parsed
+
+
+def parse_many(urls):
+    """
+    Lazily parse many S3 URLs (e.g. read from access logs).
+
+    Only the hosts' parsing is cached, so unique URLs don't evict the single URL cache.
+
+    :param urls: Iterable of URLs
+    :return: Iterator of S3Url, or None for URLs that are not S3 URLs, in the order of urls
+    """
+    return map(_parse, urls)
 
 
 def bucket_name(url):
@@ -45,11 +144,7 @@ def bucket_name(url):
     :param url: URL
     :return: Bucket name
     """
-    result = url_extract(url)
-    if result.subdomain == 's3':
-        return url.replace(url_host(url), '').split('/')[0]
-    else:
-        return result.subdomain.replace('.s3-accelerate', '').replace('.s3', '')
+    return parse_s3_url(url).bucket
 
 
 def key_extract(url):
@@ -59,8 +154,4 @@ def key_extract(url):
     :param url: URL
     :return: Object key
     """
-    result = url_extract(url)
-    if result.subdomain == 's3':
-        return url.replace(url_host(url), '').split('/', 1)[-1]
-    else:
-        return url.replace(url_host(url), '')
+    return parse_s3_url(url).key
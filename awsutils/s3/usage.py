@@ -0,0 +1,171 @@
+from bisect import bisect_left
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from awsutils.s3.helpers import human_readable_size
+from awsutils.s3.listing import PAGE_SIZE, Shard, discover_shards, iter_objects, iter_pages
+
+# Upper bounds (inclusive) of the object size histogram buckets, larger objects fall in a last bucket
+SIZE_BUCKETS = (0, 1024, 16 * 1024, 128 * 1024, 1024 ** 2, 8 * 1024 ** 2, 64 * 1024 ** 2, 512 * 1024 ** 2,
+                4 * 1024 ** 3)
+
+# Storage class of the objects listed without one
+DEFAULT_STORAGE_CLASS = 'STANDARD'
+
+
+class PrefixUsage(namedtuple('PrefixUsage', ('prefix', 'count', 'size', 'histogram', 'storage_classes'))):
+    """
+    Storage used by the objects under a prefix.
+
+    histogram counts the objects per SIZE_BUCKETS bucket (plus one for larger objects)
+    and storage_classes maps each storage class to its number of bytes.
+    """
+    __slots__ = ()
+
+
+class Usage:
+    """Running aggregate of the objects under a prefix, its memory does not grow with the number of objects."""
+    __slots__ = ('count', 'size', 'histogram', 'storage_classes')
+
+    def __init__(self):
+        self.count = 0
+        self.size = 0
+        self.histogram = [0] * (len(SIZE_BUCKETS) + 1)
+        self.storage_classes = {}
+
+    def add(self, size, storage_class=None):
+        storage_class = storage_class or DEFAULT_STORAGE_CLASS
+        self.count += 1
+        self.size += size
+        self.histogram[bisect_left(SIZE_BUCKETS, size)] += 1
+        self.storage_classes[storage_class] = self.storage_classes.get(storage_class, 0) + size
+
+    def update(self, other):
+        self.count += other.count
+        self.size += other.size
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+        for storage_class, size in other.storage_classes.items():
+            self.storage_classes[storage_class] = self.storage_classes.get(storage_class, 0) + size
+
+    def result(self, prefix):
+        return PrefixUsage(prefix, self.count, self.size, tuple(self.histogram), dict(self.storage_classes))
+
+
+class UsageAggregator:
+    def __init__(self, prefix='', depth=1):
+        """
+        Aggregate the usage of a prefix and of its 'folders' up to a depth, like `du --max-depth`.
+
+        Every object is added to the prefix's total and to each of its '/' separated
+        folders at most `depth` levels below the prefix's folder, so only one Usage per
+        folder is held.
+        Aggregators of disjoint listings (e.g. shards) are combined with `merge`.
+
+        :param prefix: Key prefix the listing covers
+        :param depth: Number of folder levels below the prefix reported separately
+        """
+        assert depth >= 0, 'ERROR: du depth can not be negative ({0})'.format(depth)
+        self.prefix = prefix
+        self.depth = depth
+        self._base = len(prefix) - len(prefix.rsplit('/', 1)[-1])
+        self._total = Usage()
+        self._usage = {}
+
+    def add(self, key, size, storage_class=None):
+        self._total.add(size, storage_class)
+        start = self._base
+        for _ in range(self.depth):
+            end = key.find('/', start)
+            if end < 0:
+                break
+            prefix = key[:end + 1]
+            self._add(prefix, size, storage_class)
+            start = end + 1
+
+    def _add(self, prefix, size, storage_class):
+        usage = self._usage.get(prefix)
+        if usage is None:
+            usage = self._usage[prefix] = Usage()
+        usage.add(size, storage_class)
+
+    def add_records(self, records):
+        """Add the objects of an iterable of ObjectRecord (common prefixes are skipped)."""
+        for record in records:
+            if not record.is_prefix:
+                self.add(record.key, record.size, record.storage_class)
+        return self
+
+    def merge(self, other):
+        """Add the aggregates of another UsageAggregator (of a disjoint set of objects)."""
+        self._total.update(other._total)
+        for prefix, usage in other._usage.items():
+            if prefix in self._usage:
+                self._usage[prefix].update(usage)
+            else:
+                self._usage[prefix] = usage
+        return self
+
+    def results(self):
+        """
+        Retrieve the usage of the prefix followed by that of its folders.
+
+        :return: List of PrefixUsage in key order, the first one covers the whole prefix
+        """
+        folders = [self._usage[prefix].result(prefix) for prefix in sorted(self._usage)]
+        return [self._total.result(self.prefix)] + folders
+
+
+def _shard_usage(client, bucket, shard, prefix, depth, page_size):
+    """Worker: aggregate the objects of a shard."""
+    aggregator = UsageAggregator(prefix, depth)
+    for page in iter_pages(client, bucket, shard.prefix, None, shard.start_after, page_size):
+        for obj in page.get('Contents', ()):
+            if shard.last is not None and obj['Key'] > shard.last:
+                return aggregator
+            aggregator.add(obj['Key'], obj['Size'], obj.get('StorageClass'))
+    return aggregator
+
+
+def disk_usage(client, bucket, prefix='', depth=1, concurrency=None, strategy='auto', page_size=PAGE_SIZE):
+    """
+    Aggregate the storage used under a prefix while streaming its listing.
+
+    With a concurrency above 1 the key space is sharded (see listing.iter_objects_parallel),
+    each shard is aggregated by a worker and the aggregates are merged, so the keys
+    are never held in memory or funnelled through a single thread.
+
+    :param client: botocore S3 client
+    :param bucket: Bucket name
+    :param prefix: Key prefix
+    :param depth: Number of folder levels below the prefix reported separately
+    :param concurrency: Maximum number of shards listed at the same time
+    :param strategy: Sharding strategy, 'auto', 'prefix' or 'range'
+    :param page_size: Maximum number of keys per request
+    :return: List of PrefixUsage, the first one covers the whole prefix
+    """
+    aggregator = UsageAggregator(prefix, depth)
+    if not concurrency or concurrency <= 1:
+        return aggregator.add_records(iter_objects(client, bucket, prefix, page_size=page_size)).results()
+
+    assert strategy in ('auto', 'prefix', 'range'), 'ERROR: Invalid listing strategy ({0})'.format(strategy)
+    with ThreadPoolExecutor(concurrency) as executor:
+        pending = set()
+        for segment in discover_shards(client, bucket, prefix, strategy, None, page_size, 4 * concurrency):
+            if not isinstance(segment, Shard):
+                aggregator.add(segment.key, segment.size, segment.storage_class)
+                continue
+            # Merge finished shards as we go so at most `concurrency` shard aggregates are held
+            if len(pending) >= concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    aggregator.merge(future.result())
+            pending.add(executor.submit(_shard_usage, client, bucket, segment, prefix, depth, page_size))
+        for future in pending:
+            aggregator.merge(future.result())
+    return aggregator.results()
+
+
+def size_bucket_labels():
+    """Return a label per histogram bucket, e.g. '<= 1.0 KiB' and '> 4.0 GiB'."""
+    return (['<= {0}'.format(human_readable_size(bound)) for bound in SIZE_BUCKETS] +
+            ['> {0}'.format(human_readable_size(SIZE_BUCKETS[-1]))])
@@ -0,0 +1,311 @@
+"""
+Benchmark suite running the S3 class against moto's in-process S3 stand-in (no AWS account or network needed).
+
+    python benchmarks/suite.py [--suites latency listing transfer url] [--keys 1000 10000] [--sizes 8 64]
+                               [--concurrency 1 4 16] [--repeat 5] [--output results.json] [--compare baseline.json]
+
+Suites:
+    latency   Time per call of every S3 method on small objects
+    listing   Listing throughput (keys/s) of synthetic buckets, add 100000 and 1000000 to --keys for the large
+              runs (filling moto with 10^6 keys takes several minutes and a few GB of memory)
+    transfer  Multipart upload and download throughput (MB/s) per object size and concurrency
+    url       S3 URL parsing throughput (see url_parsing.py)
+
+Results are written as JSON: every record has the suite, the benchmark name, its parameters, the
+measured seconds of each repetition and, for throughput benchmarks, the rate of the fastest one.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from awsutils.s3 import S3
+from awsutils.s3._version import __version__
+from awsutils.s3.index import KeyIndex
+from awsutils.s3.transfer import MB, TransferConfig
+
+import url_parsing
+
+BUCKET = 'awsutils-s3-benchmark'
+SMALL_OBJECT = b'awsutils' * 128
+SUITES = ('latency', 'listing', 'transfer', 'url')
+
+
+class Recorder:
+    def __init__(self, repeat):
+        """
+        Collect benchmark measurements.
+
+        :param repeat: Number of timed repetitions of each benchmark
+        """
+        self.repeat = repeat
+        self.results = []
+
+    def measure(self, suite, name, function, setup=None, params=None, count=None, unit=None):
+        """
+        Time a function `repeat` times and record the result.
+
+        :param suite: Suite name
+        :param name: Benchmark name
+        :param function: Function to time
+        :param setup: Function run (untimed) before each repetition
+        :param params: Dictionary of the benchmark's parameters
+        :param count: Number of items (keys, bytes...) processed per call, to report a rate
+        :param unit: Unit of the rate (e.g. 'keys/s')
+        :return: Result dictionary
+        """
+        seconds = []
+        for _ in range(self.repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            function()
+            seconds.append(time.perf_counter() - start)
+        result = {'suite': suite, 'name': name, 'params': params or {}, 'seconds': seconds,
+                  'min': min(seconds), 'median': statistics.median(seconds)}
+        if count is not None:
+            result.update(rate=count / min(seconds), unit=unit)
+        self.results.append(result)
+        print(format_result(result))
+        return result
+
+
+def format_result(result):
+    params = ' '.join('{0}={1}'.format(key, value) for key, value in sorted(result['params'].items()))
+    if 'rate' in result:
+        measure = '{0:>14,.1f} {1}'.format(result['rate'], result['unit'])
+    else:
+        measure = '{0:>11.3f} ms/op'.format(result['median'] * 1000)
+    return '{0:<10} {1:<40} {2}'.format(result['suite'], '{0} {1}'.format(result['name'], params).strip(), measure)
+
+
+def put_keys(s3, keys, body=SMALL_OBJECT, concurrency=8):
+    """Create objects with a thread pool."""
+    with ThreadPoolExecutor(concurrency) as executor:
+        for _ in executor.map(lambda key: s3.client.put_object(Bucket=s3.bucket_name, Key=key, Body=body), keys):
+            pass
+
+
+def write_file(path, size):
+    with open(path, 'wb') as f:
+        for _ in range(0, size, MB):
+            f.write(os.urandom(min(MB, size - f.tell())))
+    return path
+
+
+def bench_latency(recorder, s3, directory):
+    """Time every S3 method on small objects."""
+    keys = ['latency/{0:03d}.txt'.format(i) for i in range(100)]
+    put_keys(s3, keys)
+    s3.client.put_object(Bucket=BUCKET, Key='latency/lines.txt', Body=b'\n'.join(b'line %d' % i for i in range(1000)))
+    local = write_file(os.path.join(directory, 'small.bin'), 64 * 1024)
+    tree = os.path.join(directory, 'tree')
+    for i in range(50):
+        os.makedirs(os.path.join(tree, str(i % 5)), exist_ok=True)
+        write_file(os.path.join(tree, str(i % 5), '{0}.bin'.format(i)), 1024)
+    s3.sync(tree, 'synced')
+
+    def put(*names):
+        return lambda: put_keys(s3, names)
+
+    indexed = S3(BUCKET, quiet=True, cache=False, index=KeyIndex(':memory:'))
+    indexed.build_index('latency/')
+
+    def create_and_delete():
+        bucket = S3(BUCKET + '-created', quiet=True, cache=False)
+        bucket.create_bucket()
+        bucket.delete_bucket()
+
+    cases = (
+        ('buckets', lambda: s3.buckets, None),
+        ('bucket_exists', lambda: s3.bucket_exists, None),
+        ('region', lambda: s3.region, None),
+        ('bucket_uri', lambda: s3.bucket_uri, None),
+        ('bucket_url', lambda: s3.bucket_url, None),
+        ('url', lambda: s3.url(keys[0]), None),
+        ('is_acceleration_enabled', s3.is_acceleration_enabled, None),
+        ('list', lambda: s3.list('latency/'), None),
+        ('iter_list', lambda: list(s3.iter_list('latency/', recursive=True)), None),
+        ('exists', lambda: s3.exists(keys[0]), None),
+        ('glob', lambda: list(s3.glob('latency/0*.txt')), None),
+        ('du', lambda: s3.du('latency/'), None),
+        ('build_index', lambda: indexed.build_index('latency/'), None),
+        ('refresh_index', lambda: indexed.refresh_index(force=True), None),
+        ('indexed exists', lambda: indexed.exists(keys[0]), None),
+        ('indexed iter_list', lambda: list(indexed.iter_list('latency/', recursive=True)), None),
+        ('exists_many', lambda: s3.exists_many(keys), None),
+        ('head_many', lambda: s3.head_many(keys), None),
+        ('copy', lambda: s3.copy(keys[0], 'copied/000.txt'), None),
+        ('move', lambda: s3.move('moving/a.txt', 'moved/a.txt'), put('moving/a.txt')),
+        ('delete', lambda: s3.delete('deleting/a.txt'), put('deleting/a.txt')),
+        ('delete_many', lambda: s3.delete_many(['deleting/{0:03d}'.format(i) for i in range(100)]),
+         put(*('deleting/{0:03d}'.format(i) for i in range(100)))),
+        ('upload', lambda: s3.upload(local, 'uploaded/small.bin'), None),
+        ('upload_stream', lambda: s3.upload_stream(io.BytesIO(SMALL_OBJECT), 'uploaded/stream.bin'), None),
+        ('download', lambda: s3.download(keys[0], os.path.join(directory, 'downloaded.txt')), None),
+        ('read_range', lambda: s3.read_range(keys[0], 0, 100), None),
+        ('open', lambda: s3.open('latency/lines.txt').read(), None),
+        ('iter_lines', lambda: list(s3.iter_lines('latency/lines.txt')), None),
+        ('plan_sync', lambda: list(s3.plan_sync(tree, 'synced')), None),
+        ('sync', lambda: s3.sync(tree, 'synced'), None),
+        ('pre_sign', lambda: s3.pre_sign(keys[0]), None),
+        ('pre_sign_many', lambda: s3.pre_sign_many(keys), None),
+        ('create_bucket + delete_bucket', create_and_delete, None),
+    )
+    for name, function, setup in cases:
+        recorder.measure('latency', name, function, setup)
+
+
+def bench_listing(recorder, s3, key_counts, concurrency_levels):
+    """Measure listing throughput of synthetic buckets."""
+    listed = 0
+    for count in sorted(key_counts):
+        put_keys(s3, ('listing/{0:07d}'.format(i) for i in range(listed, count)), body=b'', concurrency=16)
+        listed = count
+        for concurrency in concurrency_levels:
+            recorder.measure('listing', 'iter_list', lambda: sum(1 for _ in s3.iter_list(
+                'listing/', recursive=True, concurrency=concurrency)),
+                params={'keys': count, 'concurrency': concurrency}, count=count, unit='keys/s')
+            recorder.measure('listing', 'du', lambda: s3.du('listing/', concurrency=concurrency),
+                             params={'keys': count, 'concurrency': concurrency}, count=count, unit='keys/s')
+        recorder.measure('listing', 'list', lambda: s3.list('listing/', recursive=True),
+                         params={'keys': count}, count=count, unit='keys/s')
+
+        # The same queries answered by a key index
+        indexed = S3(BUCKET, quiet=True, cache=False, index=KeyIndex(':memory:'))
+        indexed.build_index('listing/')
+        recorder.measure('listing', 'indexed iter_list', lambda: sum(1 for _ in indexed.iter_list(
+            'listing/', recursive=True)), params={'keys': count}, count=count, unit='keys/s')
+        recorder.measure('listing', 'indexed glob', lambda: sum(1 for _ in indexed.glob('listing/00001*')),
+                         params={'keys': count})
+        recorder.measure('listing', 'indexed exists', lambda: indexed.exists('listing/{0:07d}'.format(count - 1)),
+                         params={'keys': count})
+
+
+def bench_transfer(recorder, s3, directory, sizes, concurrency_levels):
+    """Measure multipart upload and download throughput."""
+    for size in sizes:
+        local = write_file(os.path.join(directory, 'transfer.bin'), size * MB)
+        downloaded = os.path.join(directory, 'transfer.downloaded')
+        for concurrency in concurrency_levels:
+            config = TransferConfig(part_size=8 * MB, concurrency=concurrency)
+            params = {'size_mb': size, 'concurrency': concurrency, 'part_size_mb': 8}
+            recorder.measure('transfer', 'upload', lambda: s3.upload(local, 'transfer.bin', config=config),
+                             params=params, count=size, unit='MB/s')
+            recorder.measure('transfer', 'download', lambda: s3.download('transfer.bin', downloaded, config=config),
+                             params=params, count=size, unit='MB/s')
+        os.remove(local)
+
+
+def bench_url(recorder, count):
+    """Record the URL parsing microbenchmark's rates."""
+    for name, rate in url_parsing.run(count, recorder.repeat).items():
+        recorder.results.append({'suite': 'url', 'name': name, 'params': {'urls': count}, 'seconds': [count / rate],
+                                 'min': count / rate, 'median': count / rate, 'rate': rate, 'unit': 'URLs/s'})
+        print(format_result(recorder.results[-1]))
+
+
+def compare(baseline, results):
+    """
+    Print the change of each benchmark relative to a baseline run.
+
+    :param baseline: Results dictionary of a previous run
+    :param results: Results dictionary of this run
+    """
+    def key(result):
+        return result['suite'], result['name'], json.dumps(result['params'], sort_keys=True)
+
+    previous = {key(result): result for result in baseline['results']}
+    for result in results['results']:
+        before = previous.get(key(result))
+        if before is None:
+            continue
+        # Positive is better: faster calls or higher rates
+        if 'rate' in result:
+            change = result['rate'] / before['rate'] - 1
+        else:
+            change = before['median'] / result['median'] - 1
+        print('{0:<10} {1:<40} {2:+7.1%}'.format(result['suite'], '{0} {1}'.format(result['name'], ' '.join(
+            '{0}={1}'.format(k, v) for k, v in sorted(result['params'].items()))).strip(), change))
+
+
+def run(suites=SUITES, key_counts=(1000, 10000), sizes=(8, 64), concurrency_levels=(1, 4, 16), repeat=5,
+        url_count=100000):
+    """
+    Run benchmark suites against an in-process moto S3 and return the results dictionary.
+
+    :param suites: Names of the suites to run
+    :param key_counts: Numbers of keys of the listing suite's synthetic buckets
+    :param sizes: Object sizes of the transfer suite in MB
+    :param concurrency_levels: Listing and transfer concurrency levels
+    :param repeat: Number of timed repetitions of each benchmark
+    :param url_count: Number of URLs parsed by the url suite
+    :return: Dictionary with the environment and the list of results
+    """
+    from moto import mock_aws
+
+    for variable, value in (('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'),
+                            ('AWS_SESSION_TOKEN', 'testing'), ('AWS_DEFAULT_REGION', 'us-east-1')):
+        os.environ[variable] = value
+
+    recorder = Recorder(repeat)
+    started = time.time()
+    directory = tempfile.mkdtemp()
+    try:
+        with mock_aws():
+            s3 = S3(BUCKET, quiet=True, cache=False)
+            s3.create_bucket()
+            if 'latency' in suites:
+                bench_latency(recorder, s3, directory)
+            if 'listing' in suites:
+                bench_listing(recorder, s3, key_counts, concurrency_levels)
+            if 'transfer' in suites:
+                bench_transfer(recorder, s3, directory, sizes, concurrency_levels)
+        if 'url' in suites:
+            bench_url(recorder, url_count)
+    finally:
+        shutil.rmtree(directory)
+
+    return {
+        'version': __version__,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'started': started,
+        'duration': time.time() - started,
+        'repeat': repeat,
+        'results': recorder.results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=list(SUITES), help='Suites to run')
+    parser.add_argument('--keys', nargs='+', type=int, default=[1000, 10000], help='Listing suite key counts')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[8, 64], help='Transfer suite object sizes in MB')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 16], help='Concurrency levels')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed repetitions of each benchmark')
+    parser.add_argument('--urls', type=int, default=100000, help='Number of URLs parsed by the url suite')
+    parser.add_argument('--output', help='Path of the JSON results file')
+    parser.add_argument('--compare', help='Path of a previous JSON results file to compare with')
+    args = parser.parse_args()
+
+    results = run(args.suites, args.keys, args.sizes, args.concurrency, args.repeat, args.urls)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print('\nChange relative to {0}:'.format(args.compare))
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Microbenchmark of S3 URL parsing: awsutils.s3.url against the tldextract based functions it replaced.
+
+    python benchmarks/url_parsing.py [--urls 100000] [--repeat 3]
+"""
+import argparse
+import random
+import timeit
+
+from tldextract import TLDExtract
+
+from awsutils.s3.url import bucket_name, key_extract, parse_many, parse_s3_url, url_host
+
+# The bundled Public Suffix List snapshot only, so the legacy functions are timed without network access
+_extract = TLDExtract(suffix_list_urls=())
+
+TEMPLATES = (
+    'https://{bucket}.s3.amazonaws.com/{key}',
+    'https://{bucket}.s3.us-west-2.amazonaws.com/{key}',
+    'https://{bucket}.s3-accelerate.amazonaws.com/{key}',
+    'https://s3.amazonaws.com/{bucket}/{key}',
+    'https://s3.dualstack.eu-west-1.amazonaws.com/{bucket}/{key}',
+)
+
+
+def legacy_bucket_name(url):
+    result = _extract(url)
+    if result.subdomain == 's3':
+        return url.replace(url_host(url), '').split('/')[0]
+    return result.subdomain.replace('.s3-accelerate', '').replace('.s3', '')
+
+
+def legacy_key_extract(url):
+    result = _extract(url)
+    if result.subdomain == 's3':
+        return url.replace(url_host(url), '').split('/', 1)[-1]
+    return url.replace(url_host(url), '')
+
+
+def make_urls(count, buckets=20, seed=0):
+    """Generate access log like URLs: a few buckets, mostly unique keys."""
+    rng = random.Random(seed)
+    return [rng.choice(TEMPLATES).format(bucket='bucket-{0}'.format(rng.randrange(buckets)),
+                                         key='logs/{0:08d}.json'.format(rng.randrange(count)))
+            for _ in range(count)]
+
+
+def run(count=100000, repeat=3):
+    """Time each parser over the same URLs, return a dictionary of name: URLs per second."""
+    urls = make_urls(count)
+    cases = {
+        'legacy bucket_name + key_extract': lambda: [(legacy_bucket_name(url), legacy_key_extract(url))
+                                                     for url in urls],
+        'bucket_name + key_extract': lambda: [(bucket_name(url), key_extract(url)) for url in urls],
+        'parse_s3_url': lambda: [parse_s3_url(url) for url in urls],
+        'parse_many': lambda: list(parse_many(urls)),
+    }
+    return {name: count / min(timeit.repeat(case, number=1, repeat=repeat)) for name, case in cases.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--urls', type=int, default=100000, help='Number of URLs parsed per run')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs, the fastest is reported')
+    args = parser.parse_args()
+    for name, rate in run(args.urls, args.repeat).items():
+        print('{0:<36} {1:>12,.0f} URLs/s'.format(name, rate))
+
+
+if __name__ == '__main__':
+    main()
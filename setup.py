@@ -19,10 +19,14 @@ setup(
     namespace_packages=['awsutils'],
     install_requires=[
         'awscli',
+        'botocore',
         'dirutility>=0.7.18',
         'tldextract',
         'validators'
     ],
+    extras_require={
+        'async': ['aiobotocore']
+    },
     url='https://github.com/mrstephenneal/awsutils-s3',
     entry_points={
         'console_scripts': [
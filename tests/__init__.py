@@ -1,4 +1,4 @@
-from tests._testcase import TestCase
+from tests._testcase import SLOW_DOWN, FakeClock, RawBody, TestCase, MockTestCase
 
 from ._config import S3_BUCKET, TEST_PATH, LOCAL_BASE, LOCAL_PATH
 
@@ -8,4 +8,5 @@ def printer(header, body):
     print('\n{0}:\n'.format(header.upper()) + '\n'.join('\t{0}'.format(b) for b in body))
 
 
-__all__ = ['S3_BUCKET', 'TEST_PATH', 'LOCAL_BASE', 'LOCAL_PATH', 'printer', 'TestCase']
+__all__ = ['S3_BUCKET', 'TEST_PATH', 'LOCAL_BASE', 'LOCAL_PATH', 'printer', 'SLOW_DOWN', 'FakeClock', 'RawBody',
+           'TestCase', 'MockTestCase']
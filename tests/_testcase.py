@@ -1,10 +1,37 @@
+import os
 import unittest
+from unittest import mock
 from uuid import uuid4
 
 from awsutils.s3 import S3
 from tests._config import S3_BUCKET
 
 
+# Body of the 503 responses S3 throttles requests with
+SLOW_DOWN = b'<Error><Code>SlowDown</Code><Message>Please reduce your request rate.</Message></Error>'
+
+
+class FakeClock:
+    """Simulated time for the clocks injected in to caches, indexes and rate limiters, sleeping advances it."""
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class RawBody:
+    """Raw HTTP body of a stubbed botocore AWSResponse."""
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
 class TestCase(unittest.TestCase):
     _bucket = S3_BUCKET + '-' + str(uuid4())
     s3 = S3(_bucket, quiet=True)
@@ -17,3 +44,32 @@ class TestCase(unittest.TestCase):
     @classmethod
     def tearDownClass(cls):
         cls.s3.delete_bucket(force=True)
+
+
+class MockTestCase(unittest.TestCase):
+    """Test case running against moto's in-process S3 stand-in instead of a real bucket."""
+    bucket = S3_BUCKET + '-mock'
+    backend = None
+
+    @classmethod
+    def setUpClass(cls):
+        from moto import mock_aws
+
+        # Fake credentials only for the duration of the class, the real AWS test cases must not see them
+        cls.environ = mock.patch.dict(os.environ, AWS_ACCESS_KEY_ID='testing', AWS_SECRET_ACCESS_KEY='testing',
+                                      AWS_SESSION_TOKEN='testing', AWS_DEFAULT_REGION='us-east-1')
+        cls.environ.start()
+        cls.mock = mock_aws()
+        cls.mock.start()
+        cls.s3 = S3(cls.bucket, quiet=True, backend=cls.backend, cache=False)
+        cls.s3.create_bucket()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mock.stop()
+        cls.environ.stop()
+
+    def put(self, *keys, body=b'awsutils'):
+        """Create objects in the mocked bucket."""
+        for key in keys:
+            self.s3.client.put_object(Bucket=self.s3.bucket_name, Key=key, Body=body)
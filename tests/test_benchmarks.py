@@ -0,0 +1,35 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from looptools import Timer
+
+from awsutils.s3 import S3
+
+SUITE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'suite.py')
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    @Timer.decorator
+    def test_latency_suite(self):
+        """Run a short benchmark and check every S3 method is covered by the JSON results."""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            subprocess.run([sys.executable, SUITE, '--suites', 'latency', 'url', '--repeat', '1', '--urls', '100',
+                            '--output', output], stdout=subprocess.DEVNULL, check=True)
+            with open(output) as f:
+                results = json.load(f)
+
+        names = {name for result in results['results'] if result['suite'] == 'latency'
+                 for name in result['name'].split(' + ')}
+        methods = {name for name in dir(S3) if not name.startswith('_')} - {'client', 'invalidate_cache'}
+        self.assertEqual(methods - names, set())
+        self.assertTrue(all(len(result['seconds']) == 1 for result in results['results']))
+        self.assertTrue(any(result['unit'] == 'URLs/s' for result in results['results'] if result['suite'] == 'url'))
+
+
+if __name__ == '__main__':
+    unittest.main()
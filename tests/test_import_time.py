@@ -0,0 +1,76 @@
+import subprocess
+import sys
+import unittest
+
+from looptools import Timer
+
+# Import time budgets in microseconds, generous enough for slow CI machines
+PACKAGE_BUDGET = 50000
+HELP_BUDGET = 100000
+
+# Dependencies that only the code paths needing them may import
+HEAVY_MODULES = ('botocore', 'asyncio', 'validators', 'tldextract', 'dirutility', 'multiprocessing', 'sqlite3')
+
+
+def import_time(*args):
+    """
+    Run Python with `-X importtime` and return the microseconds spent importing after interpreter startup.
+
+    :param args: Arguments following `python -X importtime`
+    :return: Sum of the cumulative times of the top level imports made after `site`
+    """
+    stderr = subprocess.run([sys.executable, '-X', 'importtime'] + list(args), stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+    total, started = 0, False
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('| imported package'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith(' ') or name.startswith('  '):
+            continue
+        if started:
+            total += int(cumulative)
+        started = started or name.strip() == 'site'
+    return total
+
+
+def imported_modules(statement):
+    """Run a statement in a new interpreter and return the names of the modules it imported."""
+    stdout = subprocess.run([sys.executable, '-c', '{0}; import sys; print(" ".join(sys.modules))'.format(statement)],
+                            stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    return set(stdout.split())
+
+
+def heavy_modules(modules):
+    return {name.split('.')[0] for name in modules}.intersection(HEAVY_MODULES)
+
+
+class TestImportTime(unittest.TestCase):
+    @Timer.decorator
+    def test_package_import(self):
+        self.assertLess(min(import_time('-c', 'import awsutils.s3') for _ in range(3)), PACKAGE_BUDGET)
+        modules = imported_modules('import awsutils.s3')
+        self.assertFalse(heavy_modules(modules))
+        self.assertNotIn('awsutils.s3.s3', modules)
+
+    @Timer.decorator
+    def test_cli_help(self):
+        self.assertLess(min(import_time('-m', 'awsutils.s3', '--help') for _ in range(3)), HELP_BUDGET)
+
+    @Timer.decorator
+    def test_s3_import(self):
+        # The S3 class loads botocore on its first request and the rest on the code paths that need them
+        self.assertFalse(heavy_modules(imported_modules('import awsutils.s3.s3')))
+
+    @Timer.decorator
+    def test_lazy_attributes(self):
+        import awsutils.s3
+
+        self.assertIs(awsutils.s3.S3, __import__('awsutils.s3.s3', fromlist=['S3']).S3)
+        self.assertIn('AsyncS3', dir(awsutils.s3))
+        with self.assertRaises(AttributeError):
+            awsutils.s3.missing
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from awsutils.s3 import AsyncS3
+from awsutils.s3.transfer import MIN_PART_SIZE, RangeWriter, TransferConfig
+from tests._config import S3_BUCKET
+
+try:
+    import aiobotocore
+    from moto.server import ThreadedMotoServer
+except ImportError:
+    aiobotocore = None
+
+
+@unittest.skipIf(aiobotocore is None, 'requires aiobotocore and moto[server]')
+class TestAsyncS3(unittest.IsolatedAsyncioTestCase):
+    """AsyncS3 against moto's standalone server (aiobotocore's HTTP client can not be mocked in-process)."""
+    bucket = S3_BUCKET + '-async'
+
+    @classmethod
+    def setUpClass(cls):
+        import botocore.session
+
+        cls.environ = mock.patch.dict(os.environ, AWS_ACCESS_KEY_ID='testing', AWS_SECRET_ACCESS_KEY='testing',
+                                      AWS_DEFAULT_REGION='us-east-1')
+        cls.environ.start()
+        cls.server = ThreadedMotoServer(port=0, verbose=False)
+        cls.server.start()
+        cls.endpoint_url = 'http://{0}:{1}'.format(*cls.server.get_host_and_port())
+        cls.sync_client = botocore.session.get_session().create_client('s3', endpoint_url=cls.endpoint_url)
+        cls.sync_client.create_bucket(Bucket=cls.bucket)
+        cls.directory = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+        cls.server.stop()
+        cls.environ.stop()
+
+    async def asyncSetUp(self):
+        self.s3 = AsyncS3(self.bucket, concurrency=4, endpoint_url=self.endpoint_url,
+                          transfer_config=TransferConfig(part_size=MIN_PART_SIZE, concurrency=2))
+
+    async def asyncTearDown(self):
+        await self.s3.close()
+
+    def put(self, *keys, body=b'awsutils'):
+        for key in keys:
+            self.sync_client.put_object(Bucket=self.bucket, Key=key, Body=body)
+
+    async def test_list(self):
+        self.put('list/a.txt', 'list/b.txt', 'list/sub/c.txt')
+        self.assertEqual(await self.s3.list('list'), ['a.txt', 'b.txt', 'sub/'])
+        self.assertEqual(await self.s3.list('list', recursive=True), ['list/a.txt', 'list/b.txt', 'list/sub/c.txt'])
+        self.assertTrue(await self.s3.exists('list/a.txt'))
+        self.assertFalse(await self.s3.exists('list/missing.txt'))
+
+    async def test_concurrency_limit(self):
+        self.put(*('many/{0}.txt'.format(i) for i in range(20)))
+        client = await self.s3.client()
+        in_flight, peak = 0, 0
+        head_object = client.head_object
+
+        async def counted(**kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            try:
+                await asyncio.sleep(0.01)
+                return await head_object(**kwargs)
+            finally:
+                in_flight -= 1
+
+        with mock.patch.object(client, 'head_object', counted):
+            heads = await asyncio.gather(*(self.s3.head('many/{0}.txt'.format(i)) for i in range(20)))
+        self.assertTrue(all(head is not None for head in heads))
+        self.assertEqual(peak, 4)
+        self.assertIsNone(await self.s3.head('many/missing.txt'))
+
+    async def test_upload_download(self):
+        data = os.urandom(2 * MIN_PART_SIZE + 100)
+        path = os.path.join(self.directory, 'large.bin')
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.assertEqual(await self.s3.upload(path, 'transfer/large.bin'),
+                         ['upload: {0} to s3://{1}/transfer/large.bin'.format(path, self.bucket)])
+        self.assertEqual(self.sync_client.get_object(Bucket=self.bucket, Key='transfer/large.bin')['Body'].read(), data)
+
+        # Ranges are written to disk off the event loop's thread
+        threads, write = set(), RangeWriter.write
+
+        def threaded(writer, offset, chunk):
+            threads.add(threading.get_ident())
+            return write(writer, offset, chunk)
+
+        destination = os.path.join(self.directory, 'downloaded.bin')
+        with mock.patch.object(RangeWriter, 'write', threaded):
+            await self.s3.download('transfer/large.bin', destination)
+        with open(destination, 'rb') as f:
+            self.assertEqual(f.read(), data)
+        self.assertTrue(threads)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    async def test_files_in_progress(self):
+        # Files are opened (and read) only once one of the `concurrency` file slots is free
+        self.put(*('files/{0:02d}.txt'.format(i) for i in range(30)))
+        in_progress, peak = 0, 0
+
+        def counted(function):
+            async def wrapper(*args):
+                nonlocal in_progress, peak
+                in_progress += 1
+                peak = max(peak, in_progress)
+                try:
+                    return await function(*args)
+                finally:
+                    in_progress -= 1
+            return wrapper
+
+        destination = os.path.join(self.directory, 'files')
+        with mock.patch.object(self.s3, '_download_file', counted(self.s3._download_file)):
+            self.assertEqual(len(await self.s3.download('files', destination, recursive=True)), 30)
+        self.assertEqual(peak, 4)
+
+        peak = 0
+        with mock.patch.object(self.s3, '_upload_file', counted(self.s3._upload_file)):
+            self.assertEqual(len(await self.s3.upload(destination, 'uploaded')), 30)
+        self.assertEqual(peak, 4)
+
+    async def test_download_without_etag(self):
+        from datetime import datetime, timezone
+
+        from awsutils.s3.listing import ObjectRecord
+
+        # Listings without ETags must not send an empty If-Match
+        self.put('etag/a.txt')
+        record = ObjectRecord('etag/a.txt', 8, datetime.now(timezone.utc), None, None)
+        destination = os.path.join(self.directory, 'etag.txt')
+        await self.s3._download_file('etag/a.txt', destination, self.s3.transfer_config, record)
+        with open(destination, 'rb') as f:
+            self.assertEqual(f.read(), b'awsutils')
+
+    async def test_copy_delete(self):
+        self.put('copy/a.txt', 'copy/b.txt')
+        self.assertEqual(len(await self.s3.copy('copy', 'copied')), 2)
+        self.assertEqual(await self.s3.list('copied', recursive=True), ['copied/a.txt', 'copied/b.txt'])
+        self.assertEqual(len(await self.s3.delete('copied')), 2)
+        self.assertFalse(await self.s3.exists('copied/'))
+
+    async def test_multipart_copy(self):
+        data = os.urandom(2 * MIN_PART_SIZE + 100)
+        self.sync_client.put_object(Bucket=self.bucket, Key='big/a.bin', Body=data, ContentType='application/x-test')
+        client = await self.s3.client()
+        with mock.patch.object(client, 'upload_part_copy', wraps=client.upload_part_copy) as upload_part_copy:
+            self.assertEqual(await self.s3.copy('big/a.bin', 'big/b.bin', threshold=MIN_PART_SIZE,
+                                                part_size=MIN_PART_SIZE),
+                             ['copy: s3://{0}/big/a.bin to s3://{0}/big/b.bin'.format(self.bucket)])
+        self.assertEqual(upload_part_copy.call_count, 3)
+        response = self.sync_client.get_object(Bucket=self.bucket, Key='big/b.bin')
+        self.assertEqual(response['Body'].read(), data)
+        self.assertEqual(response['ContentType'], 'application/x-test')
+
+    async def test_pre_sign(self):
+        urls = await self.s3.pre_sign_many(['a.txt', 'b.txt'])
+        self.assertEqual(len(urls), 2)
+        self.assertIn('/{0}/a.txt?'.format(self.bucket), urls[0])
+        self.assertIn('X-Amz-Signature=', urls[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from looptools import Timer
+
+from awsutils.s3 import S3
+from awsutils.s3.backends import Backend, BotocoreBackend, CLIBackend, load_backend
+from awsutils.s3.index import KeyIndex
+from tests import MockTestCase, LOCAL_BASE
+
+
+class TestLoadBackend(unittest.TestCase):
+    def test_default(self):
+        self.assertIsInstance(load_backend(), BotocoreBackend)
+
+    def test_name(self):
+        self.assertIsInstance(load_backend('cli'), CLIBackend)
+        self.assertIsInstance(load_backend(CLIBackend), CLIBackend)
+
+    def test_invalid(self):
+        with self.assertRaises(AssertionError):
+            load_backend('boto2')
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            Backend()
+
+
+class TestCLIBackend(unittest.TestCase):
+    def test_unsupported(self):
+        # Operations the `aws` CLI can not carry out fail instead of quietly running on botocore
+        s3 = S3('awsutils-s3-cli', quiet=True, backend='cli', cache=False, index=KeyIndex(':memory:'))
+        calls = {'build_index': (), 'refresh_index': (), 'du': (), 'exists_many': (['a.txt'],),
+                 'head_many': (['a.txt'],), 'delete_many': (['a.txt'],), 'upload_stream': (iter([b'data']), 'a.txt'),
+                 'read_range': ('a.txt',), 'open': ('a.txt',), 'iter_lines': ('a.txt',),
+                 'plan_sync': (LOCAL_BASE, 'remote')}
+        for method, args in calls.items():
+            with self.assertRaisesRegex(NotImplementedError, '{0} is not supported by the cli backend'.format(method)):
+                getattr(s3, method)(*args)
+
+
+class TestBotocoreBackend(MockTestCase):
+    target = os.path.join(LOCAL_BASE, 'awsutils')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.s3.sync(cls.target)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @Timer.decorator
+    def test_shared_client(self):
+        self.assertIs(self.s3.client, self.s3.client)
+
+    @Timer.decorator
+    def test_list(self):
+        local = os.path.join(self.target, 's3')
+        expected = {name + '/' if os.path.isdir(os.path.join(local, name)) else name for name in os.listdir(local)}
+        self.assertEqual(set(self.s3.list('awsutils/s3')), expected)
+
+    @Timer.decorator
+    def test_exists(self):
+        self.assertTrue(self.s3.exists('awsutils/s3/commands.py'))
+        self.assertTrue(self.s3.exists('awsutils/s3'))
+        self.assertFalse(self.s3.exists('awsutils/s4'))
+
+    @Timer.decorator
+    def test_output(self):
+        s3 = S3(self.bucket, quiet=False)
+        self.assertEqual(s3.copy('awsutils/s3/commands.py', 'output/'),
+                         ['copy: s3://{0}/awsutils/s3/commands.py to s3://{0}/output/commands.py'.format(self.bucket)])
+        self.assertEqual(s3.delete('output/commands.py'), ['delete: s3://{0}/output/commands.py'.format(self.bucket)])
+
+    @Timer.decorator
+    def test_quiet(self):
+        self.assertEqual(self.s3.copy('awsutils/s3/commands.py', 'quiet/'), [])
+        self.assertTrue(self.s3.exists('quiet/commands.py'))
+        self.s3.delete('quiet/', recursive=True)
+
+    @Timer.decorator
+    def test_sync_unchanged(self):
+        self.s3.download('awsutils/s3', self.directory, recursive=True)
+        self.s3.sync(self.directory, 'unchanged')
+        self.assertEqual(S3(self.bucket).sync(self.directory, 'unchanged'), [])
+        self.s3.delete('unchanged/')
+
+
+if __name__ == '__main__':
+    unittest.main()
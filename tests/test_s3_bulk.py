@@ -0,0 +1,146 @@
+import unittest
+from unittest import mock
+
+from looptools import Timer
+
+from awsutils.s3 import bulk
+from awsutils.s3.bulk import DeleteBatch, DeleteResult, ObjectHead, delete_many, iter_delete
+from tests import MockTestCase
+
+
+class TestS3ExistsMany(MockTestCase):
+    keys = ['batch/{0:04d}.json'.format(i) for i in range(0, 400, 2)] + ['foo.txt.bak', 'other/file.txt']
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for key in cls.keys:
+            cls.s3.client.put_object(Bucket=cls.bucket, Key=key, Body=b'{}', ContentType='application/json')
+
+    def expected(self, keys):
+        return {key: key in self.keys for key in keys}
+
+    @Timer.decorator
+    def test_exact_keys(self):
+        self.assertEqual(self.s3.exists_many(['foo.txt', 'foo.txt.bak', 'other/']),
+                         {'foo.txt': False, 'foo.txt.bak': True, 'other/': False})
+
+    @Timer.decorator
+    def test_dense_keys_list(self):
+        keys = ['batch/{0:04d}.json'.format(i) for i in range(300)]
+        with mock.patch.object(bulk, 'head_many', wraps=bulk.head_many) as head:
+            self.assertEqual(self.s3.exists_many(keys), self.expected(keys))
+        head.assert_not_called()
+
+    @Timer.decorator
+    def test_scattered_keys_head(self):
+        keys = ['batch/0002.json', 'batch/0003.json', 'other/file.txt', 'missing']
+        with mock.patch.object(bulk, '_exists_by_listing') as listing:
+            self.assertEqual(self.s3.exists_many(keys), self.expected(keys))
+        listing.assert_not_called()
+
+    @Timer.decorator
+    def test_listing_budget(self):
+        keys = ['batch/0000.json', 'batch/0398.json', 'batch/0399.json', 'zzz']
+        results, remaining = bulk._exists_by_listing(self.s3.client, self.bucket, sorted(keys), max_pages=1,
+                                                     page_size=40)
+        self.assertEqual(results, {'batch/0000.json': True})
+        self.assertEqual(remaining, keys[1:])
+
+    @Timer.decorator
+    def test_strategies_agree(self):
+        keys = ['batch/{0:04d}.json'.format(i) for i in range(0, 400, 7)] + ['foo.txt', 'zzz', 'batch/']
+        expected = self.expected(keys)
+        for strategy in ('auto', 'list', 'head'):
+            self.assertEqual(self.s3.exists_many(keys, strategy=strategy), expected)
+
+    @Timer.decorator
+    def test_head_many(self):
+        heads = self.s3.head_many(['batch/0000.json', 'missing.json'])
+        self.assertEqual(list(heads), ['batch/0000.json', 'missing.json'])
+        self.assertIsInstance(heads['batch/0000.json'], ObjectHead)
+        self.assertEqual(heads['batch/0000.json'].size, 2)
+        self.assertEqual(heads['batch/0000.json'].content_type, 'application/json')
+        self.assertIsNone(heads['missing.json'])
+
+
+class TestS3DeleteMany(MockTestCase):
+    def setUp(self):
+        self.keys = ['retention/{0:04d}.log'.format(i) for i in range(250)]
+        self.put(*self.keys)
+
+    def tearDown(self):
+        self.s3.delete('retention/', recursive=True)
+
+    @Timer.decorator
+    def test_delete_many(self):
+        result = self.s3.delete_many(self.keys + ['retention/missing.log'])
+        self.assertIsInstance(result, DeleteResult)
+        self.assertTrue(result.success)
+        self.assertEqual(result.deleted, 251)
+        self.assertEqual(self.s3.list('retention/'), [])
+
+    @Timer.decorator
+    def test_batches(self):
+        with mock.patch.object(self.s3.client, 'delete_objects', wraps=self.s3.client.delete_objects) as request:
+            result = delete_many(self.s3.client, self.bucket, self.keys, concurrency=4, batch_size=100)
+        self.assertEqual(result.deleted, 250)
+        self.assertEqual(sorted(len(call[1]['Delete']['Objects']) for call in request.call_args_list), [50, 100, 100])
+
+    @Timer.decorator
+    def test_stream_listing(self):
+        listing = self.s3.iter_list('retention/', recursive=True)
+        batches = list(self.s3.delete_many(listing, stream=True))
+        self.assertTrue(all(isinstance(batch, DeleteBatch) for batch in batches))
+        self.assertEqual(sorted(key for batch in batches for key in batch.deleted), self.keys)
+        self.assertFalse(self.s3.exists('retention/'))
+
+    @Timer.decorator
+    def test_lazy(self):
+        consumed = []
+
+        def keys():
+            for key in self.keys:
+                consumed.append(key)
+                yield key
+
+        batches = iter_delete(self.s3.client, self.bucket, keys(), concurrency=1, batch_size=10)
+        next(batches)
+        self.assertLess(len(consumed), len(self.keys))
+        batches.close()
+
+    @Timer.decorator
+    def test_errors(self):
+        response = {'Errors': [{'Key': self.keys[0], 'Code': 'AccessDenied', 'Message': 'Access Denied'}]}
+        with mock.patch.object(self.s3.client, 'delete_objects', return_value=response):
+            result = self.s3.delete_many(self.keys[:10])
+        self.assertFalse(result.success)
+        self.assertEqual(result.deleted, 9)
+        self.assertEqual(result.errors[0].key, self.keys[0])
+        self.assertEqual(result.errors[0].code, 'AccessDenied')
+
+    @Timer.decorator
+    def test_request_errors(self):
+        from botocore.exceptions import ClientError, EndpointConnectionError
+
+        delete_objects = self.s3.client.delete_objects
+        denied = ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'Access Denied'}}, 'DeleteObjects')
+
+        def fail_batches(**kwargs):
+            # The other batches are still deleted and reported
+            first = kwargs['Delete']['Objects'][0]['Key']
+            if first == self.keys[0]:
+                raise denied
+            if first == self.keys[100]:
+                raise EndpointConnectionError(endpoint_url='https://s3.amazonaws.com')
+            return delete_objects(**kwargs)
+
+        with mock.patch.object(self.s3.client, 'delete_objects', side_effect=fail_batches):
+            result = delete_many(self.s3.client, self.bucket, self.keys, concurrency=2, batch_size=100)
+        self.assertEqual(result.deleted, 50)
+        self.assertEqual(sorted(error.key for error in result.errors), self.keys[:200])
+        self.assertEqual({error.code for error in result.errors}, {'AccessDenied', 'EndpointConnectionError'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from looptools import Timer
+
+from awsutils.s3 import S3
+from awsutils.s3.cache import MetadataCache, default_cache, load_cache
+from tests import FakeClock, MockTestCase
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = MetadataCache(ttl=10, clock=self.clock)
+
+    def test_ttl(self):
+        self.cache.set(('region', 'bucket'), 'us-east-1')
+        self.clock.now = 9
+        self.assertEqual(self.cache.get(('region', 'bucket')), 'us-east-1')
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get(('region', 'bucket')))
+
+    def test_get_or_set(self):
+        factory = mock.Mock(return_value=True)
+        self.assertTrue(self.cache.get_or_set(('accelerate', 'bucket'), factory))
+        self.assertTrue(self.cache.get_or_set(('accelerate', 'bucket'), factory))
+        self.assertEqual(factory.call_count, 1)
+
+    def test_falsy_values(self):
+        factory = mock.Mock(return_value=False)
+        self.cache.get_or_set(('accelerate', 'bucket'), factory)
+        self.cache.get_or_set(('accelerate', 'bucket'), factory)
+        self.assertEqual(factory.call_count, 1)
+
+    def test_invalidate_bucket(self):
+        self.cache.set(('buckets',), ['bucket', 'other'])
+        self.cache.set(('accelerate', 'bucket'), True)
+        self.cache.set(('accelerate', 'other'), True)
+        self.assertEqual(self.cache.invalidate(bucket='bucket'), 2)
+        self.assertIn(('accelerate', 'other'), self.cache)
+        self.assertEqual(self.cache.invalidate(), 1)
+
+    def test_threads(self):
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(lambda i: self.cache.set(('region', str(i % 10)), i), range(1000)))
+        self.assertEqual(len(self.cache), 10)
+
+    def test_load_cache(self):
+        self.assertIs(load_cache(True), default_cache)
+        self.assertIsNone(load_cache(False))
+        self.assertIs(load_cache(self.cache), self.cache)
+
+
+class TestS3MetadataCache(MockTestCase):
+    @Timer.decorator
+    def test_acceleration_cached(self):
+        cache = MetadataCache()
+        with mock.patch.object(self.s3.backend.__class__, 'is_acceleration_enabled', return_value=True) as status:
+            for _ in range(5):
+                self.assertTrue(S3(self.bucket, accelerate=True, cache=cache).accelerate)
+        self.assertEqual(status.call_count, 1)
+
+    @Timer.decorator
+    def test_cache_disabled(self):
+        with mock.patch.object(self.s3.backend.__class__, 'is_acceleration_enabled', return_value=True) as status:
+            for _ in range(3):
+                S3(self.bucket, accelerate=True, cache=False)
+        self.assertEqual(status.call_count, 3)
+
+    @Timer.decorator
+    def test_bucket_exists(self):
+        s3 = S3(self.bucket, cache=MetadataCache())
+        self.assertTrue(s3.bucket_exists)
+        self.assertIn(('buckets',), s3.cache)
+
+    @Timer.decorator
+    def test_region(self):
+        s3 = S3(self.bucket, cache=MetadataCache())
+        self.assertEqual(s3.region, 'us-east-1')
+        self.assertEqual(s3.cache.get(('region', self.bucket)), 'us-east-1')
+
+    @Timer.decorator
+    def test_create_delete_invalidates(self):
+        s3 = S3(self.bucket + '-created', cache=MetadataCache())
+        self.assertFalse(s3.bucket_exists)
+        s3.create_bucket()
+        self.assertTrue(s3.bucket_exists)
+        s3.delete_bucket()
+        self.assertFalse(s3.bucket_exists)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from looptools import Timer
+
+from awsutils.s3 import S3
+from awsutils.s3.content_cache import ContentCache, load_download_cache
+from awsutils.s3.transfer import MB, TransferConfig
+from tests import FakeClock, MockTestCase
+
+
+class TestContentCache(MockTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.clock = FakeClock(1000.0)
+        self.cache = ContentCache(os.path.join(self.directory.name, 'cache'), max_size=20 * MB, clock=self.clock)
+        self.s3c = S3(self.bucket, quiet=True, cache=False, download_cache=self.cache,
+                      transfer_config=TransferConfig(part_size=5 * MB))
+        self.responses = []
+        self.s3c.client.meta.events.register('after-call.s3.GetObject', self.record)
+        self.s3c.client.meta.events.register('after-call-error.s3.GetObject', self.record_error)
+
+    def tearDown(self):
+        self.s3c.client.meta.events.unregister('after-call.s3.GetObject', self.record)
+        self.s3c.client.meta.events.unregister('after-call-error.s3.GetObject', self.record_error)
+        self.cache.close()
+        self.directory.cleanup()
+
+    def record(self, http_response, **kwargs):
+        self.responses.append(http_response.status_code)
+
+    def record_error(self, context, exception=None, **kwargs):
+        self.responses.append('error')
+
+    def path(self, name):
+        return os.path.join(self.directory.name, 'downloads', name)
+
+    def read(self, name):
+        with open(self.path(name), 'rb') as f:
+            return f.read()
+
+    @Timer.decorator
+    def test_revalidation(self):
+        self.put('cached/model.bin', body=b'weights')
+        self.s3c.download('cached/model.bin', self.path('first.bin'))
+        self.assertEqual(self.read('first.bin'), b'weights')
+
+        # The cached copy is revalidated with a conditional GET answered 304 Not Modified
+        self.s3c.download('cached/model.bin', self.path('second.bin'))
+        self.assertEqual(self.read('second.bin'), b'weights')
+        self.assertEqual(len(self.responses), 2)
+        stats = self.cache.stats()
+        self.assertEqual((stats.hits, stats.revalidated, stats.misses), (0, 1, 1))
+        self.assertEqual(stats.hit_ratio, 0.5)
+
+        # Changed objects are downloaded again
+        self.put('cached/model.bin', body=b'new weights')
+        self.s3c.download('cached/model.bin', self.path('third.bin'))
+        self.assertEqual(self.read('third.bin'), b'new weights')
+        self.assertEqual(self.cache.stats().misses, 2)
+
+    @Timer.decorator
+    def test_freshness(self):
+        self.cache.freshness = 60
+        self.put('cached/table.csv', body=b'a,b\n1,2\n')
+        self.s3c.download('cached/table.csv', self.path('table.csv'))
+        self.s3c.download('cached/table.csv', self.path('table.csv'))
+        self.assertEqual(self.responses, [206])
+        self.assertEqual(self.cache.stats().hits, 1)
+
+        self.clock.now += 60
+        self.s3c.download('cached/table.csv', self.path('table.csv'))
+        self.assertEqual(self.cache.stats().revalidated, 1)
+
+    @Timer.decorator
+    def test_large_and_empty_objects(self):
+        body = os.urandom(12 * MB)
+        self.put('cached/large.bin', body=body)
+        self.put('cached/empty.bin', body=b'')
+        self.s3c.download('cached/large.bin', self.path('large.bin'))
+        self.s3c.download('cached/empty.bin', self.path('empty.bin'))
+        self.assertEqual(self.read('large.bin'), body)
+        self.assertEqual(self.read('empty.bin'), b'')
+        self.assertEqual(self.cache.size(), 12 * MB)
+
+        self.s3c.download('cached/large.bin', self.path('again.bin'))
+        self.assertEqual(self.read('again.bin'), body)
+        self.assertEqual(self.cache.stats().revalidated, 1)
+
+    @Timer.decorator
+    def test_lru_eviction(self):
+        for name in ('a', 'b', 'c'):
+            self.put('lru/' + name, body=b'0' * (8 * MB))
+        for name in ('a', 'b', 'a', 'c'):
+            self.clock.now += 1
+            self.s3c.download('lru/' + name, self.path(name))
+
+        # b was the least recently used object when c pushed the cache over 20 MB
+        self.assertEqual(self.cache.stats().evictions, 1)
+        self.assertEqual(self.cache.size(), 16 * MB)
+        self.assertIsNone(self.cache._entry(self.bucket, 'lru/b'))
+        self.assertIsNotNone(self.cache._entry(self.bucket, 'lru/a'))
+
+        # Objects larger than the cache are downloaded without being cached
+        self.put('lru/huge', body=b'0' * (21 * MB))
+        self.s3c.download('lru/huge', self.path('huge'))
+        self.assertEqual(os.path.getsize(self.path('huge')), 21 * MB)
+        self.assertEqual(self.cache.stats().bypassed, 1)
+        self.assertEqual(self.cache.size(), 16 * MB)
+
+        self.assertEqual(self.cache.clear(), 2)
+        self.assertEqual(self.cache.size(), 0)
+
+    @Timer.decorator
+    def test_bypass_not_filled(self):
+        data = os.path.join(self.cache.directory, 'data')
+        self.put('bypass/grown', body=b'small')
+        self.s3c.download('bypass/grown', self.path('grown'))
+        self.assertEqual(self.cache.size(), 5)
+
+        # Objects larger than the cache are never written in to it, and replace their stale cached copy
+        opened, open_ = [], os.open
+
+        def recorded(path, *args):
+            opened.append(path)
+            return open_(path, *args)
+
+        self.put('bypass/grown', body=b'0' * (21 * MB))
+        with mock.patch('os.open', side_effect=recorded):
+            self.s3c.download('bypass/grown', self.path('grown'))
+        self.assertEqual(os.path.getsize(self.path('grown')), 21 * MB)
+        self.assertEqual([path for path in opened if path.startswith(data)], [])
+        self.assertEqual([name for _, _, names in os.walk(data) for name in names], [])
+        self.assertEqual(self.cache.size(), 0)
+        self.assertEqual(self.cache.stats().bypassed, 1)
+
+    @Timer.decorator
+    def test_concurrent_fills(self):
+        self.cache.freshness = 60
+        self.put('cached/shared.bin', body=b'shared' * 1000)
+
+        # One thread downloads the object, the others wait for it and are served from the cache
+        with ThreadPoolExecutor(8) as executor:
+            sizes = list(executor.map(lambda i: self.s3c.download('cached/shared.bin', self.path(str(i))), range(8)))
+        stats = self.cache.stats()
+        self.assertEqual((stats.misses, stats.hits), (1, 7))
+        self.assertEqual(self.responses, [206])
+        self.assertTrue(all(self.read(str(i)) == b'shared' * 1000 for i in range(8)))
+
+        # Fills and deliveries leave no temporary files behind
+        files = [name for _, _, names in os.walk(self.directory.name) for name in names]
+        self.assertFalse([name for name in files if name.endswith('.part')])
+
+    @Timer.decorator
+    def test_load_download_cache(self):
+        self.assertIsNone(load_download_cache(None))
+        self.assertIs(load_download_cache(self.cache), self.cache)
+        cache = load_download_cache(os.path.join(self.directory.name, 'other'))
+        self.assertEqual(cache.directory, os.path.join(self.directory.name, 'other'))
+        cache.close()
+
+        with self.assertRaises(AssertionError):
+            S3(self.bucket, quiet=True, cache=False, backend='cli', download_cache=self.cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
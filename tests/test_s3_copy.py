@@ -0,0 +1,87 @@
+import os
+import unittest
+from unittest import mock
+
+from botocore.exceptions import ClientError
+from looptools import Timer
+
+from awsutils.s3.copier import copy_object, iter_copy
+from awsutils.s3.transfer import MIN_PART_SIZE
+from tests import MockTestCase
+
+
+class TestS3Copy(MockTestCase):
+    dst_bucket = MockTestCase.bucket + '-dst'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.s3.client.create_bucket(Bucket=cls.dst_bucket)
+
+    def keys(self, prefix, bucket=None):
+        response = self.s3.client.list_objects_v2(Bucket=bucket or self.bucket, Prefix=prefix)
+        return [obj['Key'] for obj in response.get('Contents', ())]
+
+    @Timer.decorator
+    def test_copy_prefix(self):
+        self.put('src/a.txt', 'src/b.txt', 'src/sub/c.txt')
+        self.s3.copy('src', 'dst')
+        self.assertEqual(self.keys('dst/'), ['dst/a.txt', 'dst/b.txt', 'dst/sub/c.txt'])
+
+    @Timer.decorator
+    def test_copy_dst_bucket(self):
+        self.put('cross/a.txt')
+        self.s3.copy('cross/a.txt', 'copied/a.txt', dst_bucket=self.dst_bucket)
+        self.assertEqual(self.keys('copied/', self.dst_bucket), ['copied/a.txt'])
+        self.assertEqual(self.keys('copied/'), [])
+
+    @Timer.decorator
+    def test_multipart_copy(self):
+        data = os.urandom(2 * MIN_PART_SIZE + 10)
+        self.s3.client.put_object(Bucket=self.bucket, Key='large.bin', Body=data, ContentType='application/x-test')
+        with mock.patch.object(self.s3.client, 'copy_object') as single:
+            self.assertEqual(copy_object(self.s3.client, self.bucket, 'large.bin', self.dst_bucket, 'large.bin',
+                                         threshold=MIN_PART_SIZE, part_size=MIN_PART_SIZE), len(data))
+        single.assert_not_called()
+        response = self.s3.client.get_object(Bucket=self.dst_bucket, Key='large.bin')
+        self.assertEqual(response['Body'].read(), data)
+        self.assertEqual(response['ContentType'], 'application/x-test')
+        self.assertTrue(response['ETag'].endswith('-3"'))
+
+    @Timer.decorator
+    def test_iter_copy(self):
+        self.put(*('many/{0:03d}.txt'.format(i) for i in range(50)))
+        pairs = (('many/{0:03d}.txt'.format(i), 'many-copy/{0:03d}.txt'.format(i)) for i in range(50))
+        results = list(iter_copy(self.s3.client, self.bucket, pairs, concurrency=4))
+        self.assertEqual(len(results), 50)
+        self.assertTrue(all(result.error is None and result.size == 8 for result in results))
+        self.assertEqual(len(self.keys('many-copy/')), 50)
+
+    @Timer.decorator
+    def test_move(self):
+        self.put('moving/a.txt', 'moving/b.txt')
+        output = self.s3.move('moving', 'moved')
+        self.assertEqual(len(output), 2)
+        self.assertEqual(self.keys('moving/'), [])
+        self.assertEqual(self.keys('moved/'), ['moved/a.txt', 'moved/b.txt'])
+
+    @Timer.decorator
+    def test_move_failed_copy(self):
+        self.put('failing/a.txt', 'failing/b.txt', 'failing/c.txt')
+        copy = self.s3.client.copy_object
+
+        def flaky(**kwargs):
+            if kwargs['Key'].endswith('b.txt'):
+                raise ClientError({'Error': {'Code': 'InternalError', 'Message': 'failed'}}, 'CopyObject')
+            return copy(**kwargs)
+
+        with mock.patch.object(self.s3.client, 'copy_object', side_effect=flaky):
+            with self.assertRaises(ClientError):
+                self.s3.move('failing', 'failed')
+        # The source of a failed copy is never deleted
+        self.assertEqual(self.keys('failing/'), ['failing/b.txt'])
+        self.assertEqual(self.keys('failed/'), ['failed/a.txt', 'failed/c.txt'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from looptools import Timer
+
+from awsutils.s3 import sync
+from awsutils.s3.commands import S3Commands
+from awsutils.s3.filters import Filters, as_patterns
+from awsutils.s3.sync import iter_local_tree
+from tests import MockTestCase
+
+
+class TestFilters(unittest.TestCase):
+    @Timer.decorator
+    def test_last_match_wins(self):
+        filters = Filters.from_args(('exclude', '*'), ('include', ['*.txt', '*.csv']), ('exclude', 'tmp/*'))
+        self.assertTrue(filters('a.txt'))
+        self.assertTrue(filters('sub/b.csv'))
+        self.assertFalse(filters('c.json'))
+        self.assertFalse(filters('tmp/d.txt'))
+        # Every path is included without filters
+        self.assertTrue(Filters()('anything'))
+        self.assertFalse(Filters())
+
+    @Timer.decorator
+    def test_as_patterns(self):
+        self.assertEqual(as_patterns(None), ())
+        self.assertEqual(as_patterns('*.txt'), ('*.txt',))
+        self.assertEqual(as_patterns(['*.txt', None, '*.csv']), ('*.txt', '*.csv'))
+        with self.assertRaises(AssertionError):
+            Filters([('ignore', '*')])
+
+    @Timer.decorator
+    def test_prefixes(self):
+        self.assertEqual(Filters.from_args(('exclude', 'tmp/*')).prefixes(), ('',))
+        self.assertEqual(Filters.from_args(('exclude', '*'), ('include', ['logs/2024/*', 'logs/*/x', 'logs/2024/01/*']))
+                         .prefixes(), ('logs/',))
+        self.assertEqual(Filters.from_args(('exclude', '*'), ('include', ['logs/2024/*', 'data/*.csv'])).prefixes(),
+                         ('data/', 'logs/2024/'))
+        # Includes before the exclude of everything are overridden
+        self.assertEqual(Filters.from_args(('include', 'a/*'), ('exclude', '*'), ('include', 'b/*')).prefixes(),
+                         ('b/',))
+
+    @Timer.decorator
+    def test_prunes(self):
+        filters = Filters.from_args(('exclude', '*'), ('include', 'logs/2024/*'))
+        self.assertFalse(filters.prunes('logs/'))
+        self.assertFalse(filters.prunes('logs/2024/'))
+        self.assertFalse(filters.prunes('logs/2024/01/'))
+        self.assertTrue(filters.prunes('logs/2023/'))
+        self.assertTrue(filters.prunes('data/'))
+        self.assertTrue(Filters.from_args(('exclude', 'node_modules/*')).prunes('node_modules/'))
+        self.assertFalse(Filters.from_args(('exclude', 'node_modules/*.js')).prunes('node_modules/'))
+
+    @Timer.decorator
+    def test_command_flags(self):
+        cmd = S3Commands.remove('s3://bucket/dir', recursive=True, include=['*.txt', '*.csv'], exclude='*')
+        self.assertTrue(cmd.endswith('--exclude "*" --include "*.txt" --include "*.csv"'))
+
+
+class TestFilteredOperations(MockTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for name in ('logs/2023/a.log', 'logs/2024/b.log', 'logs/2024/01/c.log', 'data/d.csv', 'e.txt'):
+            path = os.path.join(self.directory, *name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write('awsutils')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def keys(self, prefix):
+        response = self.s3.client.list_objects_v2(Bucket=self.bucket, Prefix=prefix)
+        return [obj['Key'] for obj in response.get('Contents', ())]
+
+    @Timer.decorator
+    def test_local_walk_pruned(self):
+        filters = Filters.from_args(('exclude', '*'), ('include', 'logs/2024/*'))
+        with mock.patch.object(sync.os, 'scandir', wraps=os.scandir) as scandir:
+            paths = [path for path, _ in iter_local_tree(self.directory, filters)]
+        self.assertEqual(paths, ['logs/2024/01/c.log', 'logs/2024/b.log'])
+        scanned = {os.path.relpath(call.args[0], self.directory) for call in scandir.call_args_list}
+        self.assertEqual(scanned, {'.', 'logs', os.path.join('logs', '2024'), os.path.join('logs', '2024', '01')})
+
+    @Timer.decorator
+    def test_sync_listing_pruned(self):
+        self.put('filtered/other/x.log', 'filtered/logs/2023/y.log')
+        with mock.patch.object(self.s3.backend, 'iter_list', wraps=self.s3.backend.iter_list) as listing:
+            self.s3.sync(self.directory, 'filtered', exclude='*', include='logs/2024/*', delete=True)
+        self.assertEqual([call.args[0] for call in listing.call_args_list], ['filtered/logs/2024/'])
+        # Objects outside of the filters are neither uploaded nor deleted
+        self.assertEqual(self.keys('filtered/'), ['filtered/logs/2023/y.log', 'filtered/logs/2024/01/c.log',
+                                                  'filtered/logs/2024/b.log', 'filtered/other/x.log'])
+
+    @Timer.decorator
+    def test_delete_patterns(self):
+        self.put('patterns/a.txt', 'patterns/b.csv', 'patterns/c.json')
+        self.s3.delete('patterns', recursive=True, exclude='*', include=['*.txt', '*.csv'])
+        self.assertEqual(self.keys('patterns/'), ['patterns/c.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from looptools import Timer
+
+from awsutils.s3 import hashing
+from awsutils.s3.hashing import HashCache, etag_part_size, file_etag, load_hash_cache
+from awsutils.s3.sync import LocalFile
+from awsutils.s3.transfer import MB, MIN_PART_SIZE, TransferConfig, upload_file
+from tests import MockTestCase
+
+
+class TestFileEtag(MockTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def etag(self, key):
+        return self.s3.client.head_object(Bucket=self.bucket, Key=key)['ETag'].strip('"')
+
+    @Timer.decorator
+    def test_single_part(self):
+        for name, data in (('empty.bin', b''), ('small.bin', os.urandom(1000))):
+            path = self.write(name, data)
+            self.s3.client.put_object(Bucket=self.bucket, Key='hash/' + name, Body=data)
+            self.assertEqual(file_etag(path), self.etag('hash/' + name))
+
+    @Timer.decorator
+    def test_multipart(self):
+        path = self.write('large.bin', os.urandom(2 * MIN_PART_SIZE + 10))
+        config = TransferConfig(part_size=MIN_PART_SIZE)
+        upload_file(self.s3.client, self.bucket, 'hash/large.bin', path, config)
+        etag = self.etag('hash/large.bin')
+        self.assertTrue(etag.endswith('-3'))
+        self.assertEqual(etag_part_size(os.path.getsize(path), etag, config), MIN_PART_SIZE)
+        self.assertEqual(file_etag(path, MIN_PART_SIZE), etag)
+
+    @Timer.decorator
+    def test_etag_part_size(self):
+        config = TransferConfig()
+        self.assertEqual(etag_part_size(10, 'd41d8cd98f00b204e9800998ecf8427e', config), 0)
+        self.assertIsNone(etag_part_size(10, 'not-an-md5', config))
+        # Parts of another size than the config's are assumed to be whole MiB
+        self.assertEqual(etag_part_size(100 * MB, 'd41d8cd98f00b204e9800998ecf8427e-7', config), 15 * MB)
+
+
+class TestHashCache(unittest.TestCase):
+    @Timer.decorator
+    def test_cache(self):
+        cache = load_hash_cache(None)
+        local = LocalFile('a.txt', 1, 2.0, 3)
+        self.assertIsNone(cache.get(local, 0))
+        cache.set(local, 0, 'etag')
+        self.assertEqual(cache.get(local, 0), 'etag')
+        # Modified (or another part size) means another key
+        self.assertIsNone(cache.get(local._replace(mtime=4.0), 0))
+        self.assertIsNone(cache.get(local, MB))
+        self.assertIs(load_hash_cache(cache), cache)
+        cache.close()
+
+
+class TestContentSync(MockTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.local = os.path.join(self.directory, 'local')
+        os.mkdir(self.local)
+        self.cache = HashCache(os.path.join(self.directory, 'hashes.sqlite'))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, body='awsutils'):
+        path = os.path.join(self.local, name)
+        with open(path, 'w') as f:
+            f.write(body)
+        return path
+
+    def touch(self, path):
+        os.utime(path, (os.stat(path).st_atime, os.stat(path).st_mtime + 60))
+
+    @Timer.decorator
+    def test_touched_files_are_skipped(self):
+        touched = self.write('touched.txt')
+        edited = self.write('edited.txt', 'original')
+        self.s3.sync(self.local, 'content')
+        self.touch(touched)
+        self.write('edited.txt', 'modified')
+        self.touch(edited)
+
+        plan = {action.path: action for action in self.s3.plan_sync(self.local, 'content', compare='content',
+                                                                     hash_cache=self.cache)}
+        self.assertEqual((plan['touched.txt'].action, plan['touched.txt'].reason), ('skip', 'same content'))
+        self.assertEqual(plan['edited.txt'].action, 'upload')
+
+        # Cached hashes are not computed again
+        with mock.patch.object(hashing, 'file_etag', side_effect=AssertionError), \
+                mock.patch.object(self.s3.client, 'put_object', wraps=self.s3.client.put_object) as put:
+            self.s3.sync(self.local, 'content', compare='content', hash_cache=self.cache)
+        self.assertEqual([call.kwargs['Key'] for call in put.call_args_list], ['content/edited.txt'])
+
+    @Timer.decorator
+    def test_invalid_compare(self):
+        with self.assertRaises(AssertionError):
+            self.s3.sync(self.local, 'content', compare='checksum')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+import io
+import time
+import unittest
+
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+
+from looptools import Timer
+
+from awsutils.s3 import S3
+from awsutils.s3.index import KeyIndex, load_index, prefix_end
+from awsutils.s3.listing import ObjectRecord
+from awsutils.s3.transfer import MB, TransferConfig
+from tests import FakeClock, MockTestCase, RawBody
+
+ACCESS_DENIED = b'<Error><Code>AccessDenied</Code><Message>Access Denied</Message></Error>'
+
+
+class RequestCounter:
+    """botocore before-send handler counting the requests of each operation."""
+    def __init__(self):
+        self.counts = {}
+
+    def __call__(self, event_name, **kwargs):
+        operation = event_name.rsplit('.', 1)[-1]
+        self.counts[operation] = self.counts.get(operation, 0) + 1
+
+    def __getitem__(self, operation):
+        return self.counts.get(operation, 0)
+
+
+def deny(request, **kwargs):
+    """botocore before-send handler answering every request with 403 AccessDenied."""
+    return AWSResponse(request.url, 403, {}, RawBody(ACCESS_DENIED))
+
+
+class TestKeyIndexQueries(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.index = KeyIndex(':memory:')
+        cls.index._connection.execute('INSERT INTO roots VALUES (?, ?, ?)', ('bucket', '', time.time()))
+        cls.keys = ['logs/{0:03d}/{1:04d}.gz'.format(day, part) for day in range(100) for part in range(1000)]
+        for key in cls.keys + ['top.txt']:
+            cls.index.put('bucket', key, 1, 'etag', 0)
+
+    @Timer.decorator
+    def test_prefix_end(self):
+        self.assertEqual(prefix_end('logs/'), 'logs0')
+        self.assertIsNone(prefix_end(''))
+
+    @Timer.decorator
+    def test_get_and_exists(self):
+        self.assertEqual(self.index.get('bucket', 'top.txt').size, 1)
+        self.assertIsNone(self.index.get('bucket', 'missing.txt'))
+        self.assertTrue(self.index.exists('bucket', 'logs/050/'))
+        self.assertTrue(self.index.exists('bucket', 'top'))
+        self.assertFalse(self.index.exists('bucket', 'logs/100/'))
+        self.assertFalse(self.index.exists('other', 'top'))
+
+    @Timer.decorator
+    def test_iter_list(self):
+        self.assertEqual([record.key for record in self.index.iter_list('bucket', 'logs/099/')],
+                         self.keys[-1000:])
+        records = list(self.index.iter_list('bucket', '', '/'))
+        self.assertEqual(records, [ObjectRecord('logs/', None, None, None, None), self.index.get('bucket', 'top.txt')])
+        self.assertEqual(len(list(self.index.iter_list('bucket', 'logs/', '/'))), 100)
+        self.assertEqual([record.key for record in self.index.iter_list('bucket', 'logs/', '/', 'logs/097/')],
+                         ['logs/098/', 'logs/099/'])
+
+    @Timer.decorator
+    def test_queries_are_fast(self):
+        # 100,000 keys, prefix, delimited and glob queries are index range scans
+        start = time.perf_counter()
+        self.assertTrue(self.index.exists('bucket', 'logs/099/0999'))
+        self.assertEqual(len(list(self.index.iter_list('bucket', 'logs/', '/'))), 100)
+        self.assertEqual(len(list(self.index.glob('bucket', 'logs/042/*7.gz'))), 100)
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    @Timer.decorator
+    def test_glob(self):
+        self.assertEqual([record.key for record in self.index.glob('bucket', 'logs/00[12]/000[0-1].gz')],
+                         ['logs/001/0000.gz', 'logs/001/0001.gz', 'logs/002/0000.gz', 'logs/002/0001.gz'])
+        self.assertEqual(len(list(self.index.glob('bucket', '*/0000.gz'))), 100)
+        self.assertEqual([record.key for record in self.index.glob('bucket', 'top.txt')], ['top.txt'])
+
+    @Timer.decorator
+    def test_load_index(self):
+        self.assertIsNone(load_index(None))
+        self.assertIsNone(load_index(False))
+        self.assertIs(load_index(self.index), self.index)
+        self.assertEqual(load_index(':memory:').path, ':memory:')
+
+
+class TestKeyIndex(MockTestCase):
+    def setUp(self):
+        self.clock = FakeClock(1000.0)
+        self.index = KeyIndex(':memory:', max_age=60, clock=self.clock)
+        self.s3i = S3(self.bucket, quiet=True, cache=False, index=self.index,
+                      transfer_config=TransferConfig(multipart_threshold=5 * MB, part_size=5 * MB))
+        self.s3.delete_many(record.key for record in self.s3.iter_list('', recursive=True))
+        self.put('indexed/a.txt', 'indexed/b.txt', 'indexed/sub/c.txt', 'other/d.txt')
+        self.requests = RequestCounter()
+        self.s3i.client.meta.events.register('before-send.s3', self.requests)
+
+    def tearDown(self):
+        self.s3i.client.meta.events.unregister('before-send.s3', self.requests)
+
+    def key(self, key):
+        return self.index.get(self.bucket, key)
+
+    @Timer.decorator
+    def test_served_locally(self):
+        self.assertEqual(self.s3i.build_index('indexed/').upserted, 3)
+        self.assertEqual(self.requests['ListObjectsV2'], 1)
+
+        self.assertTrue(self.s3i.exists('indexed/a.txt'))
+        self.assertFalse(self.s3i.exists('indexed/missing.txt'))
+        self.assertEqual(self.s3i.list('indexed/'), ['a.txt', 'b.txt', 'sub/'])
+        self.assertEqual([record.key for record in self.s3i.iter_list('indexed/', recursive=True)],
+                         ['indexed/a.txt', 'indexed/b.txt', 'indexed/sub/c.txt'])
+        self.assertEqual([record.key for record in self.s3i.glob('indexed/*.txt')],
+                         ['indexed/a.txt', 'indexed/b.txt', 'indexed/sub/c.txt'])
+        self.assertEqual(self.requests['ListObjectsV2'], 1)
+
+        # Prefixes that were not indexed are listed
+        self.assertTrue(self.s3i.exists('other/d.txt'))
+        self.assertEqual(self.requests['ListObjectsV2'], 2)
+
+    @Timer.decorator
+    def test_incremental_updates(self):
+        self.s3i.build_index()
+        self.s3i.upload_stream(io.BytesIO(b'0123456789'), 'indexed/new.txt')
+        self.assertEqual(self.key('indexed/new.txt').size, 10)
+
+        self.s3i.upload_stream(io.BytesIO(b'0' * (11 * MB)), 'indexed/large.bin')
+        self.assertEqual(self.key('indexed/large.bin').size, 11 * MB)
+        self.assertTrue(self.key('indexed/large.bin').etag.endswith('-3'))
+
+        self.s3i.copy('indexed/new.txt', 'copied/new.txt')
+        self.assertEqual(self.key('copied/new.txt').etag, self.key('indexed/new.txt').etag)
+
+        self.s3i.move('indexed/a.txt', 'moved/a.txt')
+        self.assertIsNone(self.key('indexed/a.txt'))
+        self.assertEqual(self.key('moved/a.txt').size, 8)
+
+        self.s3i.delete('indexed/b.txt')
+        self.s3i.delete_many(['indexed/large.bin'])
+        self.assertIsNone(self.key('indexed/b.txt'))
+        self.assertIsNone(self.key('indexed/large.bin'))
+
+        # The index matches a fresh listing of the bucket
+        self.assertEqual(self.index.stale_prefixes(self.bucket), [])
+        self.assertEqual(self.s3i.refresh_index(force=True).removed, 0)
+        self.assertEqual([record.key for record in self.s3i.iter_list(recursive=True)],
+                         [record.key for record in self.s3.iter_list(recursive=True)])
+
+    @Timer.decorator
+    def test_failed_writes(self):
+        self.s3i.build_index()
+        client = self.s3i.client
+        writes = (
+            ('delete_object', {'Key': 'indexed/a.txt'}),
+            ('delete_objects', {'Delete': {'Objects': [{'Key': 'indexed/a.txt'}, {'Key': 'indexed/b.txt'}]}}),
+            ('put_object', {'Key': 'indexed/new.txt', 'Body': b'0'}),
+            ('copy_object', {'Key': 'indexed/copy.txt', 'CopySource': {'Bucket': self.bucket, 'Key': 'other/d.txt'}}),
+        )
+        client.meta.events.register_first('before-send.s3', deny)
+        try:
+            for operation, kwargs in writes:
+                with self.assertRaises(ClientError):
+                    getattr(client, operation)(Bucket=self.bucket, **kwargs)
+        finally:
+            self.s3i.client.meta.events.unregister('before-send.s3', deny)
+
+        # Failed requests leave the index as it was
+        self.assertTrue(self.s3i.exists('indexed/a.txt'))
+        self.assertTrue(self.s3i.exists('indexed/b.txt'))
+        self.assertIsNone(self.key('indexed/new.txt'))
+        self.assertIsNone(self.key('indexed/copy.txt'))
+        self.assertEqual(self.index.stale_prefixes(self.bucket), [])
+
+    @Timer.decorator
+    def test_staleness(self):
+        self.s3i.build_index()
+        self.put('indexed/external.txt')
+        self.assertFalse(self.s3i.exists('indexed/external.txt'))
+
+        # Expired prefixes are answered by S3 until they are refreshed
+        self.clock.now += 60
+        self.assertTrue(self.s3i.exists('indexed/external.txt'))
+        result = self.s3i.refresh_index()
+        self.assertEqual((result.prefixes, result.upserted, result.removed), ([''], 1, 0))
+        requests = self.requests['ListObjectsV2']
+        self.assertTrue(self.s3i.exists('indexed/external.txt'))
+        self.assertEqual(self.requests['ListObjectsV2'], requests)
+        self.assertEqual(self.s3i.refresh_index().prefixes, [])
+
+    @Timer.decorator
+    def test_refresh_stale_prefixes(self):
+        self.s3i.build_index()
+        self.s3.client.delete_object(Bucket=self.bucket, Key='indexed/sub/c.txt')
+        self.index.invalidate(self.bucket, 'indexed/sub/')
+        self.assertFalse(self.s3i.exists('indexed/sub/'))
+        self.assertTrue(self.s3i.exists('other/'))
+
+        # Only the stale prefix is re-listed
+        result = self.s3i.refresh_index()
+        self.assertEqual((result.prefixes, result.upserted, result.removed), (['indexed/sub/'], 0, 1))
+        self.assertEqual(self.index.stale_prefixes(self.bucket), [])
+
+    @Timer.decorator
+    def test_persistent(self):
+        import os
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index.sqlite')
+            S3(self.bucket, quiet=True, cache=False, index=path).build_index('indexed/')
+            index = KeyIndex(path)
+            self.assertTrue(index.is_fresh(self.bucket, 'indexed/sub/'))
+            self.assertFalse(index.is_fresh(self.bucket, 'other/'))
+            self.assertEqual(index.get(self.bucket, 'indexed/a.txt').size, 8)
+            index.close()
+
+    @Timer.decorator
+    def test_requires_index(self):
+        with self.assertRaises(AssertionError):
+            self.s3.build_index()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,12 @@
 import os
+import threading
 import unittest
+from unittest import mock
 
 from looptools import Timer
 
-from tests import TEST_PATH, LOCAL_PATH, TestCase
+from awsutils.s3.listing import ObjectRecord, Shard, discover_shards, iter_objects, iter_objects_parallel, range_shards
+from tests import TEST_PATH, LOCAL_PATH, TestCase, MockTestCase
 
 
 class TestS3List(TestCase):
@@ -33,5 +36,135 @@ class TestS3List(TestCase):
         self.assertEqual(set(s3_files), set(local_files))
 
 
+class TestS3IterList(MockTestCase):
+    keys = ['logs/a.txt', 'logs/b c.txt', 'logs/sub/d.txt', 'logs/sub/e f/g.txt', 'logs-old/h.txt', 'top.txt']
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for key in cls.keys:
+            cls.s3.client.put_object(Bucket=cls.bucket, Key=key, Body=key.encode())
+
+    @Timer.decorator
+    def test_recursive(self):
+        records = list(self.s3.iter_list('logs/', recursive=True))
+        self.assertEqual([r.key for r in records], sorted(k for k in self.keys if k.startswith('logs/')))
+        self.assertTrue(all(isinstance(r, ObjectRecord) and r.size == len(r.key) and r.etag for r in records))
+        self.assertEqual(records[0].storage_class, 'STANDARD')
+
+    @Timer.decorator
+    def test_delimiter(self):
+        records = list(self.s3.iter_list('logs/'))
+        self.assertEqual([r.key for r in records], ['logs/a.txt', 'logs/b c.txt', 'logs/sub/'])
+        self.assertTrue(records[-1].is_prefix)
+
+    @Timer.decorator
+    def test_start_after(self):
+        self.assertEqual([r.key for r in self.s3.iter_list(recursive=True, start_after='logs/sub/d.txt')],
+                         ['logs/sub/e f/g.txt', 'top.txt'])
+
+    @Timer.decorator
+    def test_paging(self):
+        records = iter_objects(self.s3.client, self.bucket, page_size=2)
+        self.assertEqual([r.key for r in records], sorted(self.keys))
+
+    @Timer.decorator
+    def test_lazy(self):
+        records = self.s3.iter_list(recursive=True)
+        self.assertEqual(next(records).key, 'logs-old/h.txt')
+
+    @Timer.decorator
+    def test_list_spaces(self):
+        self.assertEqual(self.s3.list('logs/sub'), ['d.txt', 'e f/'])
+        self.assertEqual(self.s3.list('logs', summarize=True), ['a.txt', 'b c.txt', 'sub/', '', '2', '22'])
+
+
+class TestS3ParallelList(MockTestCase):
+    """Parallel listing of a synthetic bucket with 'folders', flat keys and awkward characters."""
+    keys = sorted(['logs/{0:02d}/{1:04d}.gz'.format(day, i) for day in range(12) for i in range(60)] +
+                  ['flat/{0}{1:03d}'.format(c, i) for c in '-07AZaz~' for i in range(40)] +
+                  ['logs/readme.txt', 'logs-old.txt', 'top.txt', 'flat/0', 'flat/'])
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for key in cls.keys:
+            cls.s3.client.put_object(Bucket=cls.bucket, Key=key)
+
+    def parallel(self, prefix='', **kwargs):
+        return [r.key for r in iter_objects_parallel(self.s3.client, self.bucket, prefix, page_size=50, **kwargs)]
+
+    @Timer.decorator
+    def test_prefix_strategy(self):
+        expected = [key for key in self.keys if key.startswith('logs/')]
+        self.assertEqual(self.parallel('logs/', strategy='prefix', concurrency=4), expected)
+
+    @Timer.decorator
+    def test_range_strategy(self):
+        expected = [key for key in self.keys if key.startswith('flat/')]
+        self.assertEqual(self.parallel('flat/', strategy='range', concurrency=4), expected)
+        self.assertEqual(self.parallel('flat/', strategy='range', concurrency=3, shards=100), expected)
+
+    @Timer.decorator
+    def test_auto(self):
+        self.assertEqual(self.parallel(concurrency=8), self.keys)
+        self.assertEqual(self.parallel('flat/', concurrency=2), [key for key in self.keys if key.startswith('flat/')])
+
+    @Timer.decorator
+    def test_start_after(self):
+        expected = [key for key in self.keys if key > 'logs/05/0030.gz']
+        self.assertEqual(self.parallel(start_after='logs/05/0030.gz', concurrency=4), expected)
+        self.assertEqual(self.parallel(start_after='logs/05/0030.gz', strategy='range', concurrency=4), expected)
+
+    @Timer.decorator
+    def test_concurrency_limit(self):
+        active, peak, lock = [0], [0], threading.Lock()
+        list_objects_v2 = self.s3.client.list_objects_v2
+
+        def counted(**kwargs):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            try:
+                return list_objects_v2(**kwargs)
+            finally:
+                with lock:
+                    active[0] -= 1
+
+        with mock.patch.object(self.s3.client, 'list_objects_v2', side_effect=counted):
+            self.assertEqual(self.parallel(concurrency=3), self.keys)
+        self.assertLessEqual(peak[0], 3)
+
+    @Timer.decorator
+    def test_early_close(self):
+        records = iter_objects_parallel(self.s3.client, self.bucket, concurrency=4, page_size=10, buffer_pages=1)
+        self.assertEqual(next(records).key, self.keys[0])
+        records.close()
+
+    @Timer.decorator
+    def test_s3_list(self):
+        self.assertEqual(self.s3.list(recursive=True, concurrency=4), self.keys)
+        self.assertEqual([r.key for r in self.s3.iter_list('logs/', recursive=True, concurrency=4)],
+                         [key for key in self.keys if key.startswith('logs/')])
+
+    @Timer.decorator
+    def test_discover_shards(self):
+        segments = list(discover_shards(self.s3.client, self.bucket, 'logs/', strategy='prefix'))
+        self.assertEqual([segment.prefix for segment in segments[:-1]],
+                         ['logs/{0:02d}/'.format(day) for day in range(12)])
+        self.assertTrue(all(isinstance(segment, Shard) for segment in segments[:-1]))
+        self.assertEqual(segments[-1].key, 'logs/readme.txt')
+        self.assertEqual(len(list(discover_shards(self.s3.client, self.bucket, 'flat/', 'range', shards=5))), 5)
+        with self.assertRaises(AssertionError):
+            next(discover_shards(self.s3.client, self.bucket, strategy='folders'))
+
+    def test_range_shards(self):
+        shards = range_shards('p/', shards=4)
+        self.assertEqual(len(shards), 4)
+        self.assertIsNone(shards[0].start_after)
+        self.assertIsNone(shards[-1].last)
+        self.assertTrue(all(a.last == b.start_after for a, b in zip(shards, shards[1:])))
+
+
 if __name__ == '__main__':
     unittest.main()
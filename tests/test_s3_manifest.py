@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from looptools import Timer
+
+from awsutils.s3.manifest import ManifestEntry, SyncManifest, load_manifest, sync_pair
+from tests import MockTestCase
+
+
+class TestSyncManifest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.manifest = SyncManifest(':memory:', reconcile_interval=60, clock=lambda: self.now)
+
+    def tearDown(self):
+        self.manifest.close()
+
+    @Timer.decorator
+    def test_reconcile_interval(self):
+        self.assertTrue(self.manifest.needs_reconcile('pair'))
+        self.manifest.replace('pair', [ManifestEntry('a.txt', 1, 2.0, 'etag')])
+        self.assertFalse(self.manifest.needs_reconcile('pair'))
+        self.now += 60
+        self.assertTrue(self.manifest.needs_reconcile('pair'))
+
+    @Timer.decorator
+    def test_update(self):
+        self.manifest.replace('pair', [ManifestEntry('b.txt', 1, 2.0, None), ManifestEntry('a.txt', 1, 2.0, None)])
+        self.manifest.update('pair', [ManifestEntry('c.txt', 3, 4.0, 'etag')], removed=['b.txt'])
+        self.assertEqual([entry.path for entry in self.manifest.iter_entries('pair')], ['a.txt', 'c.txt'])
+        self.assertEqual(self.manifest.entries('other'), {})
+        self.manifest.forget('pair')
+        self.assertTrue(self.manifest.needs_reconcile('pair'))
+
+    @Timer.decorator
+    def test_load_manifest(self):
+        self.assertIsNone(load_manifest(None))
+        self.assertIsNone(load_manifest(False))
+        self.assertIs(load_manifest(self.manifest), self.manifest)
+        self.assertNotEqual(sync_pair('dir', 'bucket', 'path'), sync_pair('dir', 'bucket', 'path', remote_source=True))
+
+
+class TestManifestSync(MockTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.manifest = SyncManifest(os.path.join(self.directory, 'manifest.sqlite'))
+        self.local = os.path.join(self.directory, 'local')
+        os.mkdir(self.local)
+
+    def tearDown(self):
+        self.manifest.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, body='awsutils'):
+        path = os.path.join(self.local, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(body)
+        return path
+
+    def keys(self, prefix):
+        response = self.s3.client.list_objects_v2(Bucket=self.bucket, Prefix=prefix)
+        return [obj['Key'] for obj in response.get('Contents', ())]
+
+    @Timer.decorator
+    def test_upload_incremental(self):
+        self.write('a.txt')
+        self.write('sub/b.txt')
+        self.s3.sync(self.local, 'up', manifest=self.manifest)
+        self.assertEqual(self.keys('up/'), ['up/a.txt', 'up/sub/b.txt'])
+
+        # Incremental syncs do not list the bucket and only upload changed files
+        self.write('c.txt')
+        path = self.write('a.txt', 'changed')
+        os.utime(path, (os.stat(path).st_atime, os.stat(path).st_mtime + 10))
+        os.remove(os.path.join(self.local, 'sub', 'b.txt'))
+        with mock.patch.object(self.s3.client, 'list_objects_v2') as listing, \
+                mock.patch.object(self.s3.client, 'put_object', wraps=self.s3.client.put_object) as put:
+            self.s3.sync(self.local, 'up', delete=True, manifest=self.manifest)
+        listing.assert_not_called()
+        self.assertEqual(sorted(call.kwargs['Key'] for call in put.call_args_list), ['up/a.txt', 'up/c.txt'])
+        self.assertEqual(self.keys('up/'), ['up/a.txt', 'up/c.txt'])
+        self.assertEqual(sorted(self.manifest.entries(sync_pair(self.local, self.bucket, 'up'))), ['a.txt', 'c.txt'])
+
+    @Timer.decorator
+    def test_keep_undeleted(self):
+        self.write('a.txt')
+        self.write('b.txt')
+        self.s3.sync(self.local, 'keep', manifest=self.manifest)
+        pair = sync_pair(self.local, self.bucket, 'keep')
+
+        # Without delete the object remains, so its entry is kept for a later deleting sync
+        os.remove(os.path.join(self.local, 'b.txt'))
+        self.s3.sync(self.local, 'keep', manifest=self.manifest)
+        self.assertEqual(sorted(self.manifest.entries(pair)), ['a.txt', 'b.txt'])
+        self.assertEqual(self.keys('keep/'), ['keep/a.txt', 'keep/b.txt'])
+
+        with mock.patch.object(self.s3.client, 'list_objects_v2') as listing:
+            self.s3.sync(self.local, 'keep', delete=True, manifest=self.manifest)
+        listing.assert_not_called()
+        self.assertEqual(self.keys('keep/'), ['keep/a.txt'])
+        self.assertEqual(sorted(self.manifest.entries(pair)), ['a.txt'])
+
+    @Timer.decorator
+    def test_download_incremental(self):
+        self.put('down/a.txt', 'down/b.txt')
+        self.s3.sync(self.local, 'down', remote_source=True, manifest=self.manifest)
+        self.assertEqual(sorted(os.listdir(self.local)), ['a.txt', 'b.txt'])
+
+        self.put('down/a.txt', body=b'changed')
+        self.s3.client.delete_object(Bucket=self.bucket, Key='down/b.txt')
+        with mock.patch.object(self.s3.client, 'get_object', wraps=self.s3.client.get_object) as get:
+            self.s3.sync(self.local, 'down', delete=True, remote_source=True, manifest=self.manifest)
+        self.assertEqual([call.kwargs['Key'] for call in get.call_args_list], ['down/a.txt'])
+        self.assertEqual(os.listdir(self.local), ['a.txt'])
+        with open(os.path.join(self.local, 'a.txt')) as f:
+            self.assertEqual(f.read(), 'changed')
+
+    @Timer.decorator
+    def test_reconcile(self):
+        self.write('a.txt')
+        self.s3.sync(self.local, 'drift', manifest=self.manifest)
+        # An object removed outside of sync is only noticed by a full reconcile
+        self.s3.client.delete_object(Bucket=self.bucket, Key='drift/a.txt')
+        self.s3.sync(self.local, 'drift', manifest=self.manifest)
+        self.assertEqual(self.keys('drift/'), [])
+        self.manifest.reconcile_interval = 0
+        self.s3.sync(self.local, 'drift', manifest=self.manifest)
+        self.assertEqual(self.keys('drift/'), ['drift/a.txt'])
+
+
+if __name__ == '__main__':
+    unittest.main()
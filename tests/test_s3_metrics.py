@@ -0,0 +1,142 @@
+import io
+import unittest
+from unittest import mock
+from urllib.request import urlopen
+
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError, EndpointConnectionError
+from looptools import Timer
+
+from awsutils.s3 import S3
+from awsutils.s3.metrics import Histogram, Metrics, load_metrics, profiled, serve_prometheus
+from tests import SLOW_DOWN, MockTestCase, RawBody
+
+
+class TestHistogram(unittest.TestCase):
+    @Timer.decorator
+    def test_cumulative(self):
+        histogram = Histogram((0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [(0.1, 2), (1, 3), (float('inf'), 4)])
+        self.assertEqual(histogram.count, 4)
+
+    @Timer.decorator
+    def test_load_metrics(self):
+        self.assertIsNone(load_metrics(None))
+        self.assertIs(load_metrics(True), load_metrics(True))
+        metrics = Metrics()
+        self.assertIs(load_metrics(metrics), metrics)
+
+
+class TestMetrics(MockTestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+        self.events = []
+        self.metrics.add_listener(self.events.append)
+        self.s3m = S3(self.bucket, quiet=True, cache=False, metrics=self.metrics)
+
+    @Timer.decorator
+    def test_disabled(self):
+        # Without metrics the class' methods are used as they are
+        self.assertIsNone(self.s3.metrics)
+        self.assertNotIn('upload', vars(self.s3))
+        self.assertIn('upload', vars(self.s3m))
+
+    @Timer.decorator
+    def test_operations(self):
+        self.s3m.upload_stream(io.BytesIO(b'0123456789'), 'metrics/a.txt')
+        self.assertEqual(self.s3m.read_range('metrics/a.txt', 2, 5), b'234')
+        self.assertEqual(len(list(self.s3m.iter_list('metrics/', recursive=True))), 1)
+
+        self.assertEqual(self.metrics.latency['upload_stream'].count, 1)
+        self.assertEqual(self.metrics.latency['iter_list'].count, 1)
+        self.assertEqual(self.metrics.requests['PutObject'], 1)
+        self.assertEqual(self.metrics.bytes_sent['PutObject'], 10)
+        self.assertEqual(self.metrics.bytes_received['GetObject'], 3)
+        self.assertEqual(self.metrics.requests_in_flight, 0)
+        self.assertEqual(sum(self.metrics.in_flight.values()), 0)
+        self.assertIn('read_range', [event.method for event in self.events])
+
+    @Timer.decorator
+    def test_errors(self):
+        with self.assertRaises(ClientError):
+            self.s3m.read_range('metrics/missing.txt')
+        self.assertEqual(self.metrics.errors['read_range'], 1)
+        self.assertIsInstance(self.events[-1].error, ClientError)
+
+    @Timer.decorator
+    def test_throttles_and_retries(self):
+        attempts = []
+
+        def throttle(request, **kwargs):
+            attempts.append(request)
+            if len(attempts) == 1:
+                return AWSResponse(request.url, 503, {}, RawBody(SLOW_DOWN))
+
+        self.put('metrics/throttled.txt')
+        self.s3m.client.meta.events.register_first('before-send.s3.HeadObject', throttle)
+        try:
+            self.s3m.head_many(['metrics/throttled.txt'])
+        finally:
+            self.s3m.client.meta.events.unregister('before-send.s3.HeadObject', throttle)
+        self.assertEqual(self.metrics.throttles['HeadObject'], 1)
+        self.assertEqual(self.metrics.retries['HeadObject'], 1)
+        self.assertEqual(self.metrics.requests['HeadObject'], 2)
+
+    @Timer.decorator
+    def test_requests_in_flight(self):
+        endpoint = self.s3m.client._endpoint
+
+        def unanswered(request, operation_model, context):
+            # A request that fails without a response-received event
+            self.s3m.client.meta.events.emit('before-send.s3.HeadObject', request=request)
+            raise EndpointConnectionError(endpoint_url=request.url)
+
+        with mock.patch.object(endpoint, '_get_response', unanswered):
+            with self.assertRaises(EndpointConnectionError):
+                self.s3m.client.head_object(Bucket=self.bucket, Key='metrics/a.txt')
+        self.assertEqual(self.metrics.requests['HeadObject'], 1)
+        self.assertEqual(self.metrics.requests_in_flight, 0)
+
+        self.s3m.exists('metrics/')
+        self.metrics.reset()
+        self.assertEqual(dict(self.metrics.in_flight), {})
+        self.assertEqual(dict(self.metrics.requests), {})
+
+    @Timer.decorator
+    def test_closed_generator(self):
+        self.put('closed/a.txt', 'closed/b.txt')
+        records = self.s3m.iter_list('closed/', recursive=True)
+        next(records)
+        records.close()
+        self.assertEqual(self.events[-1].method, 'iter_list')
+        self.assertIsNone(self.events[-1].error)
+
+    @Timer.decorator
+    def test_prometheus(self):
+        self.s3m.exists('metrics/')
+        text = self.metrics.to_prometheus()
+        self.assertIn('# TYPE awsutils_s3_operation_seconds histogram', text)
+        self.assertIn('awsutils_s3_operation_seconds_bucket{method="exists",le="+Inf"} 1', text)
+        self.assertIn('awsutils_s3_operation_seconds_count{method="exists"} 1', text)
+        self.assertIn('awsutils_s3_requests_total{operation="ListObjectsV2"} 1', text)
+
+        server = serve_prometheus(self.metrics, port=0, address='127.0.0.1')
+        try:
+            with urlopen('http://127.0.0.1:{0}/metrics'.format(server.server_address[1])) as response:
+                self.assertEqual(response.read().decode('utf-8'), self.metrics.to_prometheus())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    @Timer.decorator
+    def test_profiled(self):
+        with profiled() as profile:
+            self.s3m.exists('metrics/')
+        self.assertIsNotNone(profile.stats)
+        self.assertGreater(profile.stats.total_calls, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
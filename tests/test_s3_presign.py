@@ -1,11 +1,27 @@
 import os
 import unittest
+from datetime import datetime
+from unittest import mock
 
+import botocore.auth
+import botocore.session
+from botocore.config import Config
 from looptools import Timer
 
 from awsutils.s3 import url_validator
+from awsutils.s3.presign import Presigner
 from tests import TestCase
 
+NOW = datetime(2024, 3, 1, 12, 30, 45)
+KEYS = ['tests/20160273_fp.1.png', 'a b/c~d+e.txt', 'unicode/ü/ñ.png', 'x//y?z#w&=']
+
+
+def frozen_time():
+    """Freeze the signing time used by botocore's signers."""
+    if hasattr(botocore.auth, 'get_current_datetime'):
+        return mock.patch('botocore.auth.get_current_datetime', return_value=NOW)
+    return mock.patch('botocore.auth.datetime.datetime', **{'utcnow.return_value': NOW})
+
 
 class TestS3PreSign(TestCase):
     target = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'awsutils')
@@ -33,5 +49,42 @@ class TestS3PreSign(TestCase):
         self.assertTrue(url_validator(self.s3.url('awsutils/s3/helpers.py')))
 
 
+class TestPresigner(unittest.TestCase):
+    """Compare local presigned URLs with botocore's presigner using fixed credentials (offline)."""
+    def client(self, region, token=None):
+        session = botocore.session.get_session()
+        session.set_credentials('AKIDEXAMPLE', 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY', token)
+        return session.create_client('s3', region_name=region, config=Config(signature_version='s3v4'))
+
+    def assertBotocoreEqual(self, client, bucket, expiration=900):
+        urls = Presigner(client, bucket).pre_sign_many(KEYS, expiration, now=NOW)
+        with frozen_time():
+            expected = [client.generate_presigned_url('get_object', Params={'Bucket': bucket, 'Key': key},
+                                                      ExpiresIn=expiration) for key in KEYS]
+        self.assertEqual(urls, expected)
+
+    def test_virtual_host(self):
+        self.assertBotocoreEqual(self.client('us-east-1'), 'hpadesign-projects')
+
+    def test_path_style(self):
+        self.assertBotocoreEqual(self.client('us-west-2'), 'hpadesign.projects')
+
+    def test_session_token(self):
+        self.assertBotocoreEqual(self.client('eu-central-1', token='session/token+='), 'hpadesign-projects', 60)
+
+    def test_signing_key_cache(self):
+        presigner = Presigner(self.client('us-east-1'), 'hpadesign-projects')
+        presigner.pre_sign(KEYS[0], now=NOW)
+        presigner.pre_sign(KEYS[1], now=NOW)
+        self.assertEqual(len(presigner._signing_keys), 1)
+
+    @Timer.decorator
+    def test_pre_sign_many(self):
+        keys = ['images/{0}.png'.format(i) for i in range(5000)]
+        urls = Presigner(self.client('us-east-1'), 'hpadesign-projects').pre_sign_many(keys, 10)
+        self.assertEqual(len(urls), len(keys))
+        self.assertTrue(urls[-1].startswith('https://hpadesign-projects.s3.amazonaws.com/images/4999.png?'))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,94 @@
+import io
+import os
+import unittest
+from unittest import mock
+
+from looptools import Timer
+
+from awsutils.s3.reader import range_header
+from tests import MockTestCase
+
+
+class TestRangeHeader(unittest.TestCase):
+    @Timer.decorator
+    def test_range_header(self):
+        self.assertEqual(range_header(0, 100), 'bytes=0-99')
+        self.assertEqual(range_header(100), 'bytes=100-')
+        self.assertEqual(range_header(-100), 'bytes=-100')
+
+
+class TestS3Reader(MockTestCase):
+    data = os.urandom(3 * 1024 ** 2 + 17)
+    lines = ['{{"id": {0}}}'.format(i) for i in range(1000)]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.s3.client.put_object(Bucket=cls.bucket, Key='data.bin', Body=cls.data)
+        cls.s3.client.put_object(Bucket=cls.bucket, Key='rows.jsonl', Body='\r\n'.join(cls.lines).encode('utf-8'))
+
+    @Timer.decorator
+    def test_read_range(self):
+        self.assertEqual(self.s3.read_range('data.bin', 0, 4), self.data[:4])
+        self.assertEqual(self.s3.read_range('data.bin', 1000, 3000), self.data[1000:3000])
+        self.assertEqual(self.s3.read_range('data.bin', -10), self.data[-10:])
+        self.assertEqual(self.s3.read_range('data.bin', len(self.data) - 5), self.data[-5:])
+        self.assertEqual(self.s3.read_range('data.bin', len(self.data) + 5), b'')
+
+    @Timer.decorator
+    def test_read_range_buffer(self):
+        buffer = bytearray(100)
+        self.assertEqual(self.s3.read_range('data.bin', 50, buffer=buffer), 100)
+        self.assertEqual(bytes(buffer), self.data[50:150])
+        self.assertEqual(self.s3.read_range('data.bin', len(self.data) - 10, buffer=buffer), 10)
+        self.assertEqual(bytes(buffer[:10]), self.data[-10:])
+
+        # A negative start reads the whole tail, which must fit in the buffer
+        self.assertEqual(self.s3.read_range('data.bin', -40, buffer=buffer), 40)
+        self.assertEqual(bytes(buffer[:40]), self.data[-40:])
+        with self.assertRaises(AssertionError):
+            self.s3.read_range('data.bin', -200, buffer=buffer)
+
+    @Timer.decorator
+    def test_open_invalid_range(self):
+        with self.s3.open('data.bin') as f:
+            with mock.patch('awsutils.s3.reader._get_range', return_value=None):
+                with self.assertRaises(IOError):
+                    f.read(10)
+
+    @Timer.decorator
+    def test_open(self):
+        with self.s3.open('data.bin', read_ahead=1024 ** 2) as f:
+            self.assertEqual(f.read(10), self.data[:10])
+            self.assertEqual(f.read(1000), self.data[10:1010])
+            # Consecutive reads and short forward seeks share the same request
+            f.seek(5000, io.SEEK_CUR)
+            self.assertEqual(f.read(10), self.data[6010:6020])
+            self.assertEqual(f.raw.requests, 1)
+
+            f.seek(-20, io.SEEK_END)
+            self.assertEqual(f.read(), self.data[-20:])
+            f.seek(0)
+            self.assertEqual(f.read(), self.data)
+            self.assertLessEqual(f.raw.requests, 6)
+
+    @Timer.decorator
+    def test_open_text(self):
+        with self.s3.open('rows.jsonl', 'r') as f:
+            self.assertEqual(f.readline(), self.lines[0] + '\n')
+
+    @Timer.decorator
+    def test_open_mode(self):
+        with self.assertRaises(AssertionError):
+            self.s3.open('data.bin', 'wb')
+
+    @Timer.decorator
+    def test_iter_lines(self):
+        self.assertEqual(list(self.s3.iter_lines('rows.jsonl', chunk_size=7, encoding='utf-8')), self.lines)
+        lines = list(self.s3.iter_lines('rows.jsonl', chunk_size=64, keepends=True))
+        self.assertEqual(b''.join(lines), '\r\n'.join(self.lines).encode('utf-8'))
+        self.assertEqual(len(lines), len(self.lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
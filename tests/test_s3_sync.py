@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+from looptools import Timer
+
+from awsutils.s3.listing import ObjectRecord
+from awsutils.s3.sync import LocalFile, compare_upload, execute, iter_local_tree, merge_join, plan
+from tests import MockTestCase
+
+
+class TestSyncPlanner(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for name in ('a.txt', 'a/b.txt', 'a-b/c.txt', 'a.b', 'z/y/x.txt', 'B.txt'):
+            path = os.path.join(self.directory, *name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(name)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @Timer.decorator
+    def test_key_order(self):
+        paths = [path for path, _ in iter_local_tree(self.directory)]
+        # The same order as a bucket listing, which sorts 'a-b/' and 'a.txt' before 'a/'
+        self.assertEqual(paths, sorted(paths))
+        self.assertEqual(paths, ['B.txt', 'a-b/c.txt', 'a.b', 'a.txt', 'a/b.txt', 'z/y/x.txt'])
+        self.assertEqual(list(iter_local_tree(os.path.join(self.directory, 'missing'))), [])
+
+    @Timer.decorator
+    def test_merge_join(self):
+        joined = list(merge_join([('a', 1), ('c', 3)], iter([('b', 2), ('c', 4), ('d', 5)])))
+        self.assertEqual(joined, [('a', 1, None), ('b', None, 2), ('c', 3, 4), ('d', None, 5)])
+
+    @Timer.decorator
+    def test_plan(self):
+        old = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        local = [('new.txt', LocalFile('new.txt', 1, 0, 0)), ('same.txt', LocalFile('same.txt', 1, 0, 0)),
+                 ('size.txt', LocalFile('size.txt', 2, 0, 0)), ('touched.txt', LocalFile('touched.txt', 1, 2e9, 0))]
+        remote = [(name, ObjectRecord(name, 1, old, 'etag', 'STANDARD'))
+                  for name in ('gone.txt', 'same.txt', 'size.txt', 'touched.txt')]
+        actions = {action.path: (action.action, action.reason)
+                   for action in plan(local, remote, 'upload', compare_upload, delete=True)}
+        self.assertEqual(actions, {'gone.txt': ('delete', 'not at source'),
+                                   'new.txt': ('upload', 'missing at destination'),
+                                   'same.txt': ('skip', 'unchanged'),
+                                   'size.txt': ('upload', 'size differs'),
+                                   'touched.txt': ('upload', 'source is newer')})
+        self.assertEqual(next(plan([], remote, 'upload', compare_upload)).action, 'skip')
+
+    @Timer.decorator
+    def test_execute(self):
+        results = list(execute(range(100), lambda i: i * 2, concurrency=4, inline=lambda i: i % 10 == 0))
+        self.assertEqual(sorted(results), [i * 2 for i in range(100)])
+
+
+class TestPlanSync(MockTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for name in ('a.txt', 'sub/b.txt'):
+            path = os.path.join(self.directory, *name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(name)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @Timer.decorator
+    def test_dry_run(self):
+        self.put('planned/sub/b.txt', 'planned/stale.txt')
+        actions = list(self.s3.plan_sync(self.directory, 'planned', delete=True))
+        self.assertEqual([(action.action, action.path) for action in actions],
+                         [('upload', 'a.txt'), ('delete', 'stale.txt'), ('upload', 'sub/b.txt')])
+        # Nothing is transferred
+        self.assertEqual(len(self.s3.client.list_objects_v2(Bucket=self.bucket, Prefix='planned/')['Contents']), 2)
+
+    @Timer.decorator
+    def test_sync_executes_plan(self):
+        self.put('executed/stale.txt')
+        self.s3.sync(self.directory, 'executed', delete=True)
+        self.assertEqual([action.action for action in self.s3.plan_sync(self.directory, 'executed', delete=True)],
+                         ['skip', 'skip'])
+        destination = os.path.join(self.directory, 'downloaded')
+        self.s3.sync(destination, 'executed', remote_source=True)
+        self.assertEqual([path for path, _ in iter_local_tree(destination)], ['a.txt', 'sub/b.txt'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,216 @@
+import unittest
+
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+from looptools import Timer
+
+from awsutils.s3 import S3
+from awsutils.s3.throttle import AdaptiveRetry, RateLimiter, TokenBucket, load_retry
+from tests import SLOW_DOWN, FakeClock, MockTestCase, RawBody
+
+
+class ThrottlingEndpoint:
+    """Simulated endpoint accepting `capacity` requests per second (with a burst of as many) and throttling the rest."""
+    def __init__(self, capacity, clock):
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self.accepted = 0
+        self.throttled = 0
+
+    def accept(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.accepted += 1
+            return True
+        self.throttled += 1
+        return False
+
+
+class SlowDownInjector:
+    """botocore before-send handler answering SlowDown to the first `count` requests for keys under a prefix."""
+    def __init__(self, prefix, count):
+        self.prefix = prefix
+        self.count = count
+        self.requests = 0
+        self.throttled = 0
+
+    def __call__(self, request, **kwargs):
+        body = request.body if isinstance(request.body, bytes) else b''
+        if '/' + self.prefix in request.url.split('?')[0] or self.prefix.encode('utf-8') in body:
+            self.requests += 1
+            if self.throttled < self.count:
+                self.throttled += 1
+                return AWSResponse(request.url, 503, {}, RawBody(SLOW_DOWN))
+
+
+class TestTokenBucket(unittest.TestCase):
+    @Timer.decorator
+    def test_acquire(self):
+        clock = FakeClock()
+        bucket = TokenBucket(10, burst=2, clock=clock, sleep=clock.sleep)
+        self.assertEqual([bucket.acquire() for _ in range(2)], [0, 0])
+
+        # Once the burst is spent requests are spaced by 1 / rate
+        self.assertAlmostEqual(bucket.acquire(), 0.1)
+        self.assertAlmostEqual(bucket.acquire(), 0.1)
+        self.assertAlmostEqual(clock.now, 0.2)
+
+
+class TestRateLimiter(unittest.TestCase):
+    @Timer.decorator
+    def test_aimd(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=100, min_rate=10, increase=5, cooldown=1, clock=clock, sleep=clock.sleep)
+
+        # Throttles of the requests already in flight only decrease the rate once per cooldown
+        for _ in range(3):
+            limiter.throttled()
+        self.assertEqual(limiter.rate, 50)
+        self.assertEqual(limiter.throttles, 3)
+        clock.sleep(1)
+        limiter.throttled()
+        self.assertEqual(limiter.rate, 25)
+
+        # About `increase` requests per second are added per second of successes
+        for _ in range(25):
+            limiter.succeeded()
+        self.assertAlmostEqual(limiter.rate, 30, delta=0.5)
+
+        for _ in range(10):
+            clock.sleep(1)
+            limiter.throttled()
+        self.assertEqual(limiter.rate, 10)
+
+    @Timer.decorator
+    def test_sustainable_throughput(self):
+        clock = FakeClock()
+        endpoint = ThrottlingEndpoint(200, clock)
+        limiter = RateLimiter(rate=3500, increase=20, clock=clock, sleep=clock.sleep)
+
+        # Ramp down from the initial rate, then hold close to the endpoint's capacity
+        while clock.now < 10:
+            limiter.acquire()
+            limiter.succeeded() if endpoint.accept() else limiter.throttled()
+        accepted, throttled = endpoint.accepted, endpoint.throttled
+        while clock.now < 70:
+            limiter.acquire()
+            limiter.succeeded() if endpoint.accept() else limiter.throttled()
+
+        throughput = (endpoint.accepted - accepted) / 60.0
+        self.assertGreater(throughput, 0.6 * endpoint.capacity)
+        self.assertLessEqual(throughput, endpoint.capacity + 1)
+        self.assertLess(endpoint.throttled - throttled, 0.05 * (endpoint.accepted - accepted))
+
+
+class TestAdaptiveRetry(unittest.TestCase):
+    @Timer.decorator
+    def test_limiters(self):
+        retry = AdaptiveRetry(prefix_depth=1)
+        self.assertIs(retry.limiter('bucket', 'logs/2024/a.txt'), retry.limiter('bucket', 'logs/2025/b.txt'))
+        self.assertIsNot(retry.limiter('bucket', 'logs/a.txt'), retry.limiter('bucket', 'data/a.txt'))
+        self.assertIsNot(retry.limiter('bucket', 'logs/a.txt'), retry.limiter('other', 'logs/a.txt'))
+        self.assertIs(retry.limiter('bucket', 'a.txt'), retry.limiter('bucket'))
+        self.assertEqual(set(retry.limiters), {('bucket', 'logs'), ('bucket', 'data'), ('other', 'logs'),
+                                               ('bucket', '')})
+
+        retry = AdaptiveRetry(prefix_depth=0)
+        self.assertIs(retry.limiter('bucket', 'logs/a.txt'), retry.limiter('bucket', 'data/a.txt'))
+
+    @Timer.decorator
+    def test_delay(self):
+        self.assertEqual(AdaptiveRetry(base_delay=0.1, random=lambda: 0.5).delay(1), 0.05)
+        self.assertEqual(AdaptiveRetry(base_delay=0.1, random=lambda: 0.5).delay(4), 0.4)
+        self.assertEqual(AdaptiveRetry(base_delay=0.1, max_delay=1, random=lambda: 0.5).delay(20), 0.5)
+        delays = [AdaptiveRetry(base_delay=0.1).delay(3) for _ in range(100)]
+        self.assertTrue(all(0 <= delay < 0.4 for delay in delays))
+
+    @Timer.decorator
+    def test_load_retry(self):
+        self.assertIsNone(load_retry(None))
+        self.assertIsNone(load_retry(False))
+        self.assertIs(load_retry(True), load_retry(True))
+        retry = AdaptiveRetry()
+        self.assertIs(load_retry(retry), retry)
+
+
+class TestAdaptiveRetryClient(MockTestCase):
+    def setUp(self):
+        self.retry = AdaptiveRetry(base_delay=0.001, max_attempts=5)
+        self.s3r = S3(self.bucket, quiet=True, cache=False, retry=self.retry)
+        self.injector = None
+
+    def tearDown(self):
+        if self.injector is not None:
+            self.s3r.client.meta.events.unregister('before-send.s3', self.injector)
+
+    def throttle(self, prefix, count):
+        self.injector = SlowDownInjector(prefix, count)
+        self.s3r.client.meta.events.register_first('before-send.s3', self.injector)
+        return self.injector
+
+    @Timer.decorator
+    def test_client_config(self):
+        # botocore's own retries are disabled, the policy decides
+        self.assertEqual(self.s3r.client.meta.config.retries['total_max_attempts'], 1)
+        self.assertIsNone(self.s3.retry)
+
+    @Timer.decorator
+    def test_throttled_bulk_operations(self):
+        keys = ['hot/{0}.txt'.format(index) for index in range(20)]
+        self.put(*keys + ['cold/a.txt'])
+        injector = self.throttle('hot/', 10)
+
+        self.assertTrue(all(self.s3r.exists_many(keys).values()))
+        self.assertEqual(injector.requests, 30)
+        self.assertEqual(self.s3r.delete_many(keys).deleted, 20)
+        self.assertFalse(any(self.s3r.exists_many(keys).values()))
+
+        # Only the throttled prefix slowed down
+        self.assertEqual(self.retry.limiter(self.bucket, 'hot/').throttles, 10)
+        self.assertLess(self.retry.limiter(self.bucket, 'hot/').rate, 3500)
+        self.assertTrue(self.s3r.exists('cold/a.txt'))
+        self.assertEqual(self.retry.limiter(self.bucket, 'cold/').throttles, 0)
+
+    @Timer.decorator
+    def test_throttled_delete_objects(self):
+        keys = ['batch/{0}.txt'.format(index) for index in range(5)]
+        self.put(*keys)
+        injector = self.throttle('batch/', 2)
+        self.assertEqual(self.s3r.delete_many(keys).deleted, 5)
+        self.assertEqual(injector.requests, 3)
+        self.assertEqual(self.retry.limiter(self.bucket, 'batch/').throttles, 2)
+
+    @Timer.decorator
+    def test_max_attempts(self):
+        self.put('hot/a.txt')
+        injector = self.throttle('hot/', 100)
+        with self.assertRaises(ClientError) as context:
+            self.s3r.read_range('hot/a.txt')
+        self.assertEqual(context.exception.response['Error']['Code'], 'SlowDown')
+        self.assertEqual(injector.requests, 5)
+
+    @Timer.decorator
+    def test_client_errors_not_retried(self):
+        injector = self.throttle('missing/', 0)
+        with self.assertRaises(ClientError):
+            self.s3r.read_range('missing/a.txt')
+        self.assertEqual(injector.requests, 1)
+
+    @Timer.decorator
+    def test_shared_policy(self):
+        first = S3(self.bucket, quiet=True, cache=False, retry=True)
+        second = S3(self.bucket, quiet=True, cache=False, retry=True)
+        self.assertIs(first.retry, second.retry)
+        self.put('shared/a.txt')
+        self.assertTrue(first.exists('shared/a.txt'))
+        self.assertIs(first.retry.limiter(self.bucket, 'shared/a.txt'),
+                      second.retry.limiters[(self.bucket, 'shared')])
+
+
+if __name__ == '__main__':
+    unittest.main()
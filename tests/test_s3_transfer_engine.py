@@ -0,0 +1,215 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from looptools import Timer
+
+from awsutils.s3 import transfer
+from awsutils.s3.transfer import (MB, MAX_PARTS, MIN_PART_SIZE, DownloadError, TransferConfig, download_file,
+                                  upload_file)
+from tests import MockTestCase
+
+
+class TestTransferConfig(unittest.TestCase):
+    @Timer.decorator
+    def test_part_size_scaled(self):
+        config = TransferConfig()
+        self.assertEqual(config.part_size_for(100 * MB), 8 * MB)
+        part_size = config.part_size_for(100 * 1024 ** 3)
+        self.assertLessEqual(100 * 1024 ** 3 / part_size, MAX_PARTS)
+        self.assertEqual(part_size % MB, 0)
+
+    @Timer.decorator
+    def test_memory_cap(self):
+        self.assertEqual(TransferConfig(concurrency=8).workers_for(8 * MB), 8)
+        self.assertEqual(TransferConfig(concurrency=8, max_memory=20 * MB).workers_for(8 * MB), 2)
+        self.assertEqual(TransferConfig(concurrency=8, max_memory=MB).workers_for(8 * MB), 1)
+
+    @Timer.decorator
+    def test_minimum_part_size(self):
+        with self.assertRaises(AssertionError):
+            TransferConfig(part_size=MB)
+
+
+class TestMultipartUpload(MockTestCase):
+    config = TransferConfig(part_size=MIN_PART_SIZE, concurrency=4)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, 'large.bin')
+        with open(cls.path, 'wb') as f:
+            f.write(os.urandom(2 * MIN_PART_SIZE + 1234))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def content(self, key):
+        return self.s3.client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+
+    @Timer.decorator
+    def test_multipart(self):
+        self.assertEqual(upload_file(self.s3.client, self.bucket, 'large.bin', self.path, self.config),
+                         os.path.getsize(self.path))
+        with open(self.path, 'rb') as f:
+            self.assertEqual(self.content('large.bin'), f.read())
+        self.assertTrue(self.s3.client.head_object(Bucket=self.bucket, Key='large.bin')['ETag'].endswith('-3"'))
+
+    @Timer.decorator
+    def test_single_request(self):
+        config = TransferConfig(part_size=MIN_PART_SIZE, multipart_threshold=10 * MIN_PART_SIZE)
+        with mock.patch.object(self.s3.client, 'create_multipart_upload') as create:
+            upload_file(self.s3.client, self.bucket, 'single.bin', self.path, config)
+        create.assert_not_called()
+        self.assertEqual(len(self.content('single.bin')), os.path.getsize(self.path))
+
+    @Timer.decorator
+    def test_abort_on_failure(self):
+        with mock.patch.object(self.s3.client, 'upload_part', side_effect=RuntimeError('part failed')), \
+                mock.patch.object(self.s3.client, 'abort_multipart_upload',
+                                  wraps=self.s3.client.abort_multipart_upload) as abort:
+            with self.assertRaises(RuntimeError):
+                upload_file(self.s3.client, self.bucket, 'failed.bin', self.path, self.config)
+        abort.assert_called_once()
+        self.assertFalse(self.s3.client.list_multipart_uploads(Bucket=self.bucket).get('Uploads'))
+        self.assertFalse(self.s3.exists('failed.bin'))
+
+    @Timer.decorator
+    def test_upload_config(self):
+        self.s3.upload(self.path, 'configured/large.bin', config=self.config)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(self.content('configured/large.bin'), f.read())
+
+
+class TestUploadStream(MockTestCase):
+    config = TransferConfig(part_size=MIN_PART_SIZE, concurrency=2)
+
+    def content(self, key):
+        return self.s3.client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+
+    @Timer.decorator
+    def test_generator(self):
+        chunks = [os.urandom(MB + 7) for _ in range(12)]
+        with mock.patch.object(transfer, 'BufferPool', wraps=transfer.BufferPool) as pool:
+            self.assertEqual(self.s3.upload_stream(iter(chunks), 'stream/generated.bin', config=self.config),
+                             sum(len(chunk) for chunk in chunks))
+        # Memory is bounded by concurrency * part_size, not by the size of the stream
+        pool.assert_called_once_with(2, MIN_PART_SIZE)
+        self.assertEqual(self.content('stream/generated.bin'), b''.join(chunks))
+
+    @Timer.decorator
+    def test_part_size_growth(self):
+        sizes, upload_part = [], transfer.MultipartUpload.upload_part
+
+        def record(upload, number, view):
+            sizes.append(len(view))
+            return upload_part(upload, number, view)
+
+        body = os.urandom(33 * MB)
+        config = TransferConfig(part_size=MIN_PART_SIZE, concurrency=2, max_memory=2 * MIN_PART_SIZE)
+        with mock.patch.object(transfer, 'PART_GROWTH_INTERVAL', 2), \
+                mock.patch.object(transfer.MultipartUpload, 'upload_part', autospec=True, side_effect=record):
+            self.s3.upload_stream(io.BytesIO(body), 'stream/growing.bin', config=config)
+
+        # Streams of unknown length double their part size every PART_GROWTH_INTERVAL parts
+        self.assertEqual(sorted(sizes, reverse=True), [10 * MB, 10 * MB, 5 * MB, 5 * MB, 3 * MB])
+        self.assertEqual(self.content('stream/growing.bin'), body)
+
+    @Timer.decorator
+    def test_buffer_pool_resize(self):
+        pool = transfer.BufferPool(2, 4)
+        first, second = pool.acquire(), pool.acquire()
+        pool.resize(1, 8)
+        pool.release(first)
+        pool.release(second)
+        self.assertEqual(len(pool.acquire()), 8)
+        self.assertTrue(pool._buffers.empty())
+
+    @Timer.decorator
+    def test_fileobj(self):
+        self.s3.upload_stream(io.BytesIO(b'awsutils' * 10), 'stream/small.txt', config=self.config)
+        self.assertEqual(self.content('stream/small.txt'), b'awsutils' * 10)
+
+    @Timer.decorator
+    def test_text(self):
+        self.s3.upload_stream(('{0},{1}\n'.format(i, i * i) for i in range(3)), 'stream/rows.csv')
+        self.assertEqual(self.content('stream/rows.csv'), b'0,0\n1,1\n2,4\n')
+        self.s3.upload_stream(io.StringIO('text'), 'stream/text.txt')
+        self.assertEqual(self.content('stream/text.txt'), b'text')
+
+    @Timer.decorator
+    def test_abort_on_failure(self):
+        def generate():
+            yield os.urandom(MIN_PART_SIZE)
+            raise ValueError('exporter failed')
+
+        with mock.patch.object(self.s3.client, 'abort_multipart_upload',
+                               wraps=self.s3.client.abort_multipart_upload) as abort:
+            with self.assertRaises(ValueError):
+                self.s3.upload_stream(generate(), 'stream/failed.bin', config=self.config)
+        abort.assert_called_once()
+        self.assertFalse(self.s3.client.list_multipart_uploads(Bucket=self.bucket).get('Uploads'))
+
+
+class TestRangedDownload(MockTestCase):
+    config = TransferConfig(part_size=MIN_PART_SIZE, concurrency=4)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.data = os.urandom(2 * MIN_PART_SIZE + 1234)
+        cls.s3.client.put_object(Bucket=cls.bucket, Key='large.bin', Body=cls.data)
+        cls.s3.client.put_object(Bucket=cls.bucket, Key='empty.bin', Body=b'')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    @Timer.decorator
+    def test_ranges(self):
+        path = os.path.join(self.directory, 'large.bin')
+        with mock.patch.object(self.s3.client, 'get_object', wraps=self.s3.client.get_object) as get:
+            self.assertEqual(download_file(self.s3.client, self.bucket, 'large.bin', path, self.config),
+                             len(self.data))
+        self.assertEqual(self.read(path), self.data)
+        self.assertEqual(get.call_count, 3)
+        self.assertTrue(all('IfMatch' in call.kwargs for call in get.call_args_list))
+        self.assertEqual(os.listdir(self.directory), ['large.bin'])
+        os.remove(path)
+
+    @Timer.decorator
+    def test_empty(self):
+        path = os.path.join(self.directory, 'empty.bin')
+        self.assertEqual(download_file(self.s3.client, self.bucket, 'empty.bin', path, self.config), 0)
+        self.assertEqual(self.read(path), b'')
+        os.remove(path)
+
+    @Timer.decorator
+    def test_size_mismatch(self):
+        path = os.path.join(self.directory, 'mismatch.bin')
+        with self.assertRaises(DownloadError):
+            download_file(self.s3.client, self.bucket, 'large.bin', path, self.config, size=len(self.data) + 1)
+        self.assertFalse(os.listdir(self.directory))
+
+    @Timer.decorator
+    def test_download(self):
+        path = os.path.join(self.directory, 'downloaded.bin')
+        self.s3.download('large.bin', path, config=self.config)
+        self.assertEqual(self.read(path), self.data)
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,7 @@ import unittest
 
 from looptools import Timer
 
-from awsutils.s3.url import url_host, bucket_name, key_extract
+from awsutils.s3.url import S3Url, bucket_url, url_host, bucket_name, key_extract, parse_many, parse_s3_url
 from tests import TestCase
 
 URL1 = 'https://hpadesign-projects.s3.amazonaws.com/tests/20160273_fp.1.png'
@@ -30,5 +30,38 @@ class TestS3URL(TestCase):
         self.assertEqual(key_extract(URL2), 'tests/20160273_fp.1.png')
 
 
+class TestS3URLParser(unittest.TestCase):
+    @Timer.decorator
+    def test_parse_s3_url(self):
+        """Parse every S3 endpoint form offline."""
+        for url, expected in (
+                (URL1, S3Url(BUCKET_NAME, 'tests/20160273_fp.1.png', None, 'virtual')),
+                (URL2, S3Url(BUCKET_NAME, 'tests/20160273_fp.1.png', None, 'path')),
+                ('s3://{0}/a/b.txt'.format(BUCKET_NAME), S3Url(BUCKET_NAME, 'a/b.txt', None, 's3')),
+                ('https://my.bucket.s3.us-west-2.amazonaws.com/a.txt?X-Amz-Expires=10',
+                 S3Url('my.bucket', 'a.txt', 'us-west-2', 'virtual')),
+                ('https://bucket.s3-eu-west-1.amazonaws.com/a.txt', S3Url('bucket', 'a.txt', 'eu-west-1', 'virtual')),
+                ('https://bucket.s3-accelerate.dualstack.amazonaws.com/a.txt',
+                 S3Url('bucket', 'a.txt', None, 'accelerate')),
+                ('https://s3.dualstack.ap-south-1.amazonaws.com/bucket/a/b.txt',
+                 S3Url('bucket', 'a/b.txt', 'ap-south-1', 'path')),
+                ('http://localhost:9000/bucket/a.txt', S3Url('bucket', 'a.txt', None, 'path'))):
+            self.assertEqual(parse_s3_url(url), expected)
+
+    @Timer.decorator
+    def test_parse_invalid(self):
+        """Reject URLs without a bucket."""
+        with self.assertRaises(AssertionError):
+            parse_s3_url('https://s3.amazonaws.com/')
+        self.assertEqual(list(parse_many(['bucket/key', 'ftp://host/key', URL1])),
+                         [None, None, parse_s3_url(URL1)])
+
+    @Timer.decorator
+    def test_bucket_url(self):
+        """Build a bucket's (accelerated) URL and parse it back."""
+        self.assertEqual(bucket_url(BUCKET_NAME), 'https://hpadesign-projects.s3.amazonaws.com')
+        self.assertEqual(bucket_name(bucket_url(BUCKET_NAME, acceleration=True) + '/key'), BUCKET_NAME)
+
+
 if __name__ == '__main__':
     unittest.main()
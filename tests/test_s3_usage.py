@@ -0,0 +1,115 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+
+from looptools import Timer
+
+from awsutils.s3 import S3
+from awsutils.s3.__main__ import du
+from awsutils.s3.index import KeyIndex
+from awsutils.s3.usage import SIZE_BUCKETS, UsageAggregator, disk_usage, size_bucket_labels
+from tests import MockTestCase
+
+
+class TestUsageAggregator(unittest.TestCase):
+    objects = [('logs/2024/a.gz', 10, None), ('logs/2024/b.gz', 2048, 'STANDARD_IA'), ('logs/2025/c.gz', 0, None),
+               ('logs/top.txt', 5, None), ('data/x.bin', 10 * 1024 ** 3, 'GLACIER'), ('readme.txt', 1, None)]
+
+    def aggregate(self, prefix='', depth=1, objects=None):
+        aggregator = UsageAggregator(prefix, depth)
+        for key, size, storage_class in objects or self.objects:
+            aggregator.add(key, size, storage_class)
+        return aggregator
+
+    @Timer.decorator
+    def test_depth(self):
+        usage = self.aggregate().results()
+        self.assertEqual([(prefix.prefix, prefix.count, prefix.size) for prefix in usage],
+                         [('', 6, 10 * 1024 ** 3 + 2064), ('data/', 1, 10 * 1024 ** 3), ('logs/', 4, 2063)])
+
+        usage = self.aggregate(depth=2).results()
+        self.assertEqual([prefix.prefix for prefix in usage], ['', 'data/', 'logs/', 'logs/2024/', 'logs/2025/'])
+        self.assertEqual([prefix.prefix for prefix in self.aggregate(depth=0).results()], [''])
+
+        # Folders are counted from the prefix's folder
+        usage = self.aggregate('logs/', objects=self.objects[:4]).results()
+        self.assertEqual([(prefix.prefix, prefix.count) for prefix in usage],
+                         [('logs/', 4), ('logs/2024/', 2), ('logs/2025/', 1)])
+
+    @Timer.decorator
+    def test_histogram_and_storage_classes(self):
+        total = self.aggregate().results()[0]
+        self.assertEqual(len(total.histogram), len(SIZE_BUCKETS) + 1)
+        self.assertEqual(total.histogram[0], 1)
+        self.assertEqual(total.histogram[1], 3)
+        self.assertEqual(total.histogram[2], 1)
+        self.assertEqual(total.histogram[-1], 1)
+        self.assertEqual(total.storage_classes, {'STANDARD': 16, 'STANDARD_IA': 2048, 'GLACIER': 10 * 1024 ** 3})
+        self.assertEqual(len(size_bucket_labels()), len(total.histogram))
+        self.assertEqual(size_bucket_labels()[1], '<= 1.0 KiB')
+
+    @Timer.decorator
+    def test_merge(self):
+        merged = self.aggregate(objects=self.objects[:3]).merge(self.aggregate(objects=self.objects[3:]))
+        self.assertEqual(merged.results(), self.aggregate(depth=1).results())
+
+    @Timer.decorator
+    def test_depth_validation(self):
+        with self.assertRaises(AssertionError):
+            UsageAggregator(depth=-1)
+
+
+class TestS3Du(MockTestCase):
+    keys = ['usage/{0:02d}/{1:03d}.gz'.format(day, i) for day in range(6) for i in range(40)] + \
+           ['usage/flat-{0}'.format(c) for c in '-09AZaz~'] + ['usage/top.txt']
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for index, key in enumerate(cls.keys):
+            cls.s3.client.put_object(Bucket=cls.bucket, Key=key, Body=b'0' * (index % 7))
+        cls.s3.client.put_object(Bucket=cls.bucket, Key='usage/archive/old.gz', Body=b'0' * 4096,
+                                 StorageClass='STANDARD_IA')
+
+    @Timer.decorator
+    def test_du(self):
+        usage = self.s3.du('usage', depth=1)
+        self.assertEqual(usage[0].prefix, 'usage/')
+        self.assertEqual(usage[0].count, len(self.keys) + 1)
+        self.assertEqual(usage[0].size, sum(index % 7 for index in range(len(self.keys))) + 4096)
+        self.assertEqual(usage[0].storage_classes['STANDARD_IA'], 4096)
+        self.assertEqual([prefix.prefix for prefix in usage[1:]],
+                         ['usage/00/', 'usage/01/', 'usage/02/', 'usage/03/', 'usage/04/', 'usage/05/',
+                          'usage/archive/'])
+        self.assertEqual(usage[1].count, 40)
+        self.assertEqual(self.s3.du('usage/00/', depth=0)[0], usage[1])
+
+    @Timer.decorator
+    def test_parallel(self):
+        expected = self.s3.du('usage/', depth=2)
+        for strategy in ('auto', 'prefix', 'range'):
+            self.assertEqual(disk_usage(self.s3.client, self.bucket, 'usage/', 2, concurrency=4, strategy=strategy,
+                                        page_size=7), expected)
+        self.assertEqual(self.s3.du('usage/', depth=2, concurrency=8), expected)
+
+    @Timer.decorator
+    def test_indexed(self):
+        indexed = S3(self.bucket, quiet=True, cache=False, index=KeyIndex(':memory:'))
+        indexed.build_index('usage/')
+        requests = []
+        indexed.client.meta.events.register('before-send.s3', lambda **kwargs: requests.append(1))
+        self.assertEqual(indexed.du('usage/'), self.s3.du('usage/'))
+        self.assertEqual(requests, [])
+
+    @Timer.decorator
+    def test_cli(self):
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            du(self.bucket, 'usage/archive/', depth=0, human_readable=True, detail=True)
+        self.assertEqual(stdout.getvalue().splitlines(),
+                         ['4.0 KiB\t1\ts3://{0}/usage/archive/'.format(self.bucket), '\tSTANDARD_IA: 4.0 KiB',
+                          '\t<= 16.0 KiB: 1'])
+
+
+if __name__ == '__main__':
+    unittest.main()